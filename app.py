@@ -14,5 +14,53 @@ migrate = Migrate(app, db)
 manager = Manager(app)
 manager.add_command('db', MigrateCommand)
 
+
+@manager.command
+def backfill_languages():
+    """ Identify the language of documents that don't have one. """
+    from dexter.processing import DocumentProcessor
+    DocumentProcessor().backfill_languages()
+
+
+@manager.command
+def rebuild_reporting_tables():
+    """ Rebuild the reporting tables from the views. """
+    from dexter.models import reporting
+    reporting.rebuild()
+
+
+@manager.command
+def rebuild_rollups():
+    """ Rebuild the daily rollups used by the feeds. """
+    from dexter.models import rollups
+    rollups.rebuild()
+
+
+@manager.command
+def rebuild_person_stats():
+    """ Rebuild the per-person daily statistics. """
+    from dexter.models import person_stats
+    person_stats.rebuild()
+
+
+@manager.command
+def rebuild_document_features():
+    """ Rebuild the feature vectors of all documents. """
+    from dexter.models import document_features
+    document_features.rebuild()
+
+
+@manager.option('--rebuild', action='store_true', help='fit a new model to all documents')
+def update_topic_model(rebuild=False):
+    """ Update the topic model with new documents, and assign them topics. """
+    from dexter.analysis.topic_model import update_topic_model
+    update_topic_model(rebuild=rebuild)
+
+
 if __name__ == '__main__':
     manager.run()
+else:
+    # we're being served by gunicorn, start building the similarity
+    # index as the worker starts, rather than in the first request
+    from dexter.analysis.similarity import index
+    index.start()
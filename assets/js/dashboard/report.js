@@ -0,0 +1,49 @@
+(function($, exports) {
+  if (typeof exports.Dexter == 'undefined') exports.Dexter = {};
+  var Dexter = exports.Dexter;
+
+  // view when waiting for a report to be built
+  Dexter.ReportView = function() {
+    var self = this;
+
+    self.init = function() {
+      self.$status = $('.report-status');
+
+      if (self.$status.data('status') == 'pending' || self.$status.data('status') == 'running') {
+        self.poll();
+      }
+    };
+
+    // reports are built in the background, so poll until they're ready
+    self.poll = function() {
+      $.getJSON(self.$status.data('url'))
+        .done(function(data) {
+          var report = data.report;
+
+          self.$status.find('.progress-bar').css('width', report.progress + '%');
+
+          if (report.status == 'done') {
+            self.$status.find('.building').addClass('hidden');
+            self.$status.find('.done').removeClass('hidden');
+            window.location = self.$status.data('download');
+
+          } else if (report.status == 'failed') {
+            self.$status.find('.building').addClass('hidden');
+            self.$status.find('.failed').removeClass('hidden');
+
+          } else {
+            setTimeout(self.poll, 3000);
+          }
+        })
+        .fail(function() {
+          setTimeout(self.poll, 10000);
+        });
+    };
+  };
+})(jQuery, window);
+
+$(function() {
+  if ($('.report-status').length > 0) {
+    new Dexter.ReportView().init();
+  }
+});
@@ -11,13 +11,29 @@
       self.dirn = 1;
 
       $('.topics-container')
-        .on('change', '.sort-buttons input', self.sortButtonClick)
-        .load('/activity/topics/detail' + window.location.search, function(text, status, req) {
-          if (status === 'error') {
-            $('.topics-container .loading-indicator').html("<h3>Something went wrong :(</h3><h3>We can't yet find topics for more than about 8000 documents at a time.</h3>");
+        .on('change', '.sort-buttons input', self.sortButtonClick);
+
+      self.loadTopics(false);
+    };
+
+    // topics are found in the background, so poll until they're ready
+    self.loadTopics = function(poll) {
+      var url = '/activity/topics/detail' + window.location.search;
+      if (poll) {
+        url += (window.location.search ? '&' : '?') + 'poll=1';
+      }
+
+      $.ajax(url)
+        .done(function(html, status, req) {
+          if (req.status == 202) {
+            setTimeout(function() { self.loadTopics(true); }, 3000);
           } else {
+            $('.topics-container').html(html);
             $('*[data-sparkline]').sparkline();
           }
+        })
+        .fail(function() {
+          $('.topics-container .loading-indicator').html("<h3>Something went wrong :(</h3><h3>We can't yet find topics for more than about 8000 documents at a time.</h3>");
         });
     };
 
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark for the vectorised analysis helpers, comparing them
+with one-at-a-time Python loops on random data of a realistic size.
+
+    python bin/benchmark-analysis.py [series] [days]
+"""
+from __future__ import division
+
+import os
+import sys
+import math
+import random
+import timeit
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy
+
+from dexter.analysis.utils import calculate_entropy, column_entropy
+from dexter.analysis.base import moving_weighted_avg_zscore, moving_weighted_avg_zscores, DailyCounts, top_k
+
+
+def loop_entropy(table):
+    """ calculate_entropy as it was before it was vectorised, for comparison. """
+    col_labels = table.keys()
+    row_labels = set()
+    for d in table.itervalues():
+        row_labels.update(d.keys())
+    row_labels = list(row_labels)
+
+    col_sums = {}
+    row_sums = defaultdict(int)
+    total = 0
+
+    for col in col_labels:
+        col_sums[col] = sum(table[col].itervalues())
+        for row, n in table[col].iteritems():
+            row_sums[row] += n
+            total += n
+
+    entropy = {}
+    for col in col_labels:
+        col_total = col_sums[col]
+        if col_total == 0:
+            entropy[col] = 0
+            continue
+
+        row_coverage = defaultdict(int)
+        col_coverage = 0
+        for row in row_labels:
+            row_fraction = row_sums[row] / total
+            if row_fraction > 0:
+                row_coverage[row] = table[col].get(row, 0) / col_total / row_fraction
+            else:
+                row_coverage[row] = 0
+            col_coverage += row_coverage[row]
+
+        k = 1 / col_coverage
+
+        total_p = 0
+        for row in row_labels:
+            p = k * row_coverage[row]
+            if p > 0:
+                p = p * math.log(p)
+            total_p += p
+
+        if len(row_labels) == 1:
+            log = 1
+        else:
+            log = 1 / math.log(len(row_labels))
+
+        entropy[col] = -log * total_p
+
+    return entropy
+
+
+def bench(label, func, number=20):
+    secs = min(timeit.repeat(func, number=number, repeat=3)) / number
+    print "%-40s %10.3f ms" % (label, secs * 1000)
+    return secs
+
+
+def main(n_series=2000, n_days=30):
+    random.seed(42)
+
+    # entropy: media (columns) by affiliations (rows)
+    table = dict(('medium %d' % c, dict(('party %d' % r, random.randint(0, 50)) for r in xrange(60)))
+                 for c in xrange(40))
+    rows = sorted(set(r for col in table.itervalues() for r in col))
+    counts = numpy.array([[table[c].get(r, 0) for c in sorted(table)] for r in rows])
+
+    expected = loop_entropy(table)
+    actual = calculate_entropy(table)
+    assert all(abs(expected[k] - actual[k]) < 1e-9 for k in expected)
+
+    print "Entropy, %d columns by %d rows" % (counts.shape[1], counts.shape[0])
+    bench("python loops", lambda: loop_entropy(table))
+    bench("calculate_entropy (dict)", lambda: calculate_entropy(table))
+    bench("column_entropy (matrix)", lambda: column_entropy(counts))
+    print
+
+    # trends: one series per person, one observation per day
+    series = numpy.array([[random.randint(0, 10) for d in xrange(n_days)] for s in xrange(n_series)], dtype=float)
+
+    zscores = moving_weighted_avg_zscores(series, 0.8)
+    for obs, z in zip(series[:100], zscores):
+        assert abs(moving_weighted_avg_zscore(list(obs), 0.8) - z) < 1e-6
+
+    print "Trends, %d series of %d days" % (n_series, n_days)
+    rows = series.tolist()
+    bench("moving_weighted_avg_zscore per series", lambda: [moving_weighted_avg_zscore(r, 0.8) for r in rows], 5)
+    bench("moving_weighted_avg_zscores", lambda: moving_weighted_avg_zscores(series, 0.8), 5)
+    print
+
+    # the whole people analysis, from (person, day, count) rows
+    rows = [(random.randint(0, n_series), random.randint(0, n_days - 1), random.randint(1, 5))
+            for i in xrange(n_series * 10)]
+
+    def analyse():
+        counts = DailyCounts(xrange(n_series), n_days)
+        counts.add(rows)
+        totals = counts.totals()
+        trends = counts.trends()
+        shares = counts.shares()
+        series = [shares[i].tolist() for i in xrange(n_series)]
+        return top_k(totals, 20), top_k(trends, 10), top_k(-trends, 10)
+
+    print "People analysis, %d rows" % len(rows)
+    bench("DailyCounts", analyse, 5)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
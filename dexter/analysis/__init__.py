@@ -1,6 +1,7 @@
 from bias import BiasCalculator
-from sources import SourceAnalyser
+from sources import SourceAnalyser, analyse_person_sources
 from media import MediaAnalyser
 from topics import TopicAnalyser
 from xlsx_export import XLSXExportBuilder
 from ratings import ChildrenRatingExport, MediaDiversityRatingExport
+from bulk_export import BulkExportBuilder
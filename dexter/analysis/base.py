@@ -1,7 +1,9 @@
 from math import sqrt
 from datetime import datetime
 
-from dexter.models import db, Document, Person
+import numpy
+
+from dexter.models import db, Document, Person, DocumentSet
 
 from sqlalchemy.sql import func
 from sqlalchemy.orm import joinedload
@@ -10,15 +12,15 @@ from sqlalchemy.orm import joinedload
 class BaseAnalyser(object):
     """
     Base for analyser objects that handles a collection of
-    documents to analyse, based on either document ids
-    or start and end dates.
+    documents to analyse, based on either a DocumentSet (or a list
+    of document ids) or start and end dates.
     """
 
     TREND_UP = 0.5
     TREND_DOWN = -0.5
 
     def __init__(self, doc_ids=None, start_date=None, end_date=None):
-        self.doc_ids = doc_ids
+        self.docs = DocumentSet.coerce(doc_ids)
         self.start_date = start_date
         self.end_date = end_date
 
@@ -27,7 +29,14 @@ class BaseAnalyser(object):
         self._calculate_date_range()
         self._fetch_doc_ids()
 
-        self.n_documents = len(self.doc_ids)
+        self.n_documents = len(self.docs)
+
+    def __getstate__(self):
+        # the document set can't be pickled, and isn't needed once
+        # the analysis is done
+        state = self.__dict__.copy()
+        state.pop('docs', None)
+        return state
 
     def _calculate_date_range(self):
         """
@@ -35,13 +44,13 @@ class BaseAnalyser(object):
         documents.
         """
         if not self.start_date or not self.end_date:
-            if self.doc_ids is None:
+            if self.docs is None:
                 raise ValueError("Need either doc_ids, or both start_date and end_date")
 
             row = db.session.query(
                 func.min(Document.published_at),
                 func.max(Document.published_at))\
-                .filter(Document.id.in_(self.doc_ids))\
+                .filter(self.docs.contains(Document.id))\
                 .first()
 
             if row and row[0]:
@@ -53,12 +62,15 @@ class BaseAnalyser(object):
         self.days = max((self.end_date - self.start_date).days, 1)
 
     def _fetch_doc_ids(self):
-        if self.doc_ids is None:
-            rows = db.session.query(Document.id)\
-                .filter(Document.published_at >= self.start_date.strftime('%Y-%m-%d 00:00:00'))\
-                .filter(Document.published_at <= self.end_date.strftime('%Y-%m-%d 23:59:59'))\
-                .all()
-            self.doc_ids = [r[0] for r in rows]
+        if self.docs is None:
+            self.docs = DocumentSet(db.session.query(Document.id)
+                .filter(Document.published_at >= self.start_date.strftime('%Y-%m-%d 00:00:00'))
+                .filter(Document.published_at <= self.end_date.strftime('%Y-%m-%d 23:59:59')))
+
+    def day_index(self, column):
+        """ An SQL expression for the day of the analysis period that
+        +column+, a date or datetime, falls on. The first day is 0. """
+        return func.datediff(column, self.start_date)
 
     def _lookup_people(self, ids):
         query = Person.query \
@@ -98,4 +110,100 @@ def moving_weighted_avg_zscore(obs, decay=0.8):
         else:
             # fold it in
             avg = avg * decay + (1.0-decay) * x
-            sq_avg = sq_avg * decay + (1.0-decay) * (x ** 2)
\ No newline at end of file
+            sq_avg = sq_avg * decay + (1.0-decay) * (x ** 2)
+
+def moving_weighted_avg_zscores(obs, decay=0.8):
+    """
+    Calculate the moving-weighted average z-score for many series at once,
+    where +obs+ is a matrix (or list of lists) with one row of observations
+    per series. Returns an array with a z-score per series.
+
+    This gives the same results as calling moving_weighted_avg_zscore
+    for each row, except that a variance which rounding has made slightly
+    negative is treated as zero.
+    """
+    obs = numpy.asarray(obs, dtype=float)
+    if obs.ndim != 2 or obs.shape[1] < 2:
+        return numpy.array([None] * len(obs))
+
+    # all but the last observation are folded into the averages, the first
+    # with weight decay^(n-1) and the rest with (1-decay) * decay^(n-1-i)
+    n = obs.shape[1] - 1
+    weights = (1.0 - decay) * decay ** numpy.arange(n - 1, -1, -1, dtype=float)
+    weights[0] = decay ** (n - 1)
+
+    history = obs[:, :n]
+    avg = history.dot(weights)
+    sq_avg = (history ** 2).dot(weights)
+    std = numpy.sqrt(numpy.maximum(sq_avg - avg ** 2, 0))
+
+    diff = obs[:, n] - avg
+    return numpy.where(std == 0, diff, diff / numpy.where(std == 0, 1, std))
+
+
+def daily_shares(counts, totals=None):
+    """
+    Given a matrix of +counts+ with a row per series and a column per
+    day, return each count as a percentage of that day's total. The totals
+    are the sums of the columns, unless +totals+ is given.
+    """
+    counts = numpy.asarray(counts, dtype=float)
+    if totals is None:
+        totals = counts.sum(axis=0)
+    else:
+        totals = numpy.asarray(totals, dtype=float)
+    return numpy.where(totals == 0, 0, 100.0 * counts / numpy.where(totals == 0, 1, totals))
+
+
+def top_k(values, k):
+    """
+    Return the indexes of the +k+ largest +values+, largest first.
+    """
+    values = numpy.asarray(values)
+    if len(values) > k:
+        indexes = numpy.argpartition(-values, k)[:k]
+    else:
+        indexes = numpy.arange(len(values))
+    return indexes[numpy.argsort(-values[indexes], kind='mergesort')]
+
+
+class DailyCounts(object):
+    """
+    Counts of something, such as how often people are quoted, for each day
+    of an analysis period. The counts are a matrix with a row for each id
+    and a column for each day.
+
+        counts = DailyCounts(person_ids, days)
+        counts.add(query.all())  # (person_id, day, count) rows
+        counts.trends()
+    """
+
+    def __init__(self, ids, days):
+        # sorted, so rows can be found with a binary search
+        self.ids = numpy.array(sorted(ids), dtype=numpy.int64)
+        self.counts = numpy.zeros((len(self.ids), days), dtype=float)
+
+    def add(self, rows):
+        """ Add (id, day, count) rows to the counts. Rows for unknown ids
+        or days outside the period are ignored. """
+        rows = numpy.array(rows, dtype=numpy.int64).reshape(-1, 3)
+        if not len(rows) or not len(self.ids):
+            return
+
+        ids, days, counts = rows[:, 0], rows[:, 1], rows[:, 2]
+        index = numpy.minimum(numpy.searchsorted(self.ids, ids), len(self.ids) - 1)
+        valid = (self.ids[index] == ids) & (days >= 0) & (days < self.counts.shape[1])
+
+        numpy.add.at(self.counts, (index[valid], days[valid]), counts[valid])
+
+    def totals(self):
+        """ The total count for each id. """
+        return self.counts.sum(axis=1)
+
+    def shares(self):
+        """ The counts as a percentage of each day's total. """
+        return daily_shares(self.counts)
+
+    def trends(self, decay=0.8):
+        """ The moving-weighted average z-score of each id's daily shares. """
+        return moving_weighted_avg_zscores(self.shares(), decay)
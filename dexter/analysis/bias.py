@@ -4,8 +4,9 @@ from itertools import groupby
 import logging
 
 from sqlalchemy.orm import joinedload, lazyload
+from sqlalchemy.sql import func, case, and_, or_
 
-from ..models import Document
+from ..models import db, Document, DocumentFairness, Fairness, DocumentSource, Affiliation, Medium
 from dexter.analysis.utils import calculate_entropy
 
 class BiasCalculator:
@@ -81,6 +82,79 @@ class BiasCalculator:
         return counts
 
 
+    def calculate_grouped_bias_scores(self, docs, groups):
+        """
+        Return a list of BiasScore instances for the documents in +docs+, a DocumentSet,
+        grouped by +groups+, a list of SQL expressions over Document and Medium.
+
+        The scores are the same as those from calculate_bias_scores, but the counting
+        is done in the database, so the documents are never loaded.
+        """
+        n = len(groups)
+
+        def key(values):
+            return tuple(values) if n > 1 else values[0]
+
+        # for each document: how many fairness entries it has, how many of those are fair,
+        # and how many favour or oppose someone
+        per_doc = db.session.query(
+                func.count(DocumentFairness.id).label('n_fairness'),
+                func.sum(case([(Fairness.name == 'Fair', 1)], else_=0)).label('n_fair'),
+                func.count(DocumentFairness.bias_favour_affiliation_id).label('favour'),
+                func.count(DocumentFairness.bias_oppose_affiliation_id).label('oppose'),
+                *[g.label('group_%d' % i) for i, g in enumerate(groups)])\
+            .select_from(Document)\
+            .join(Medium, Document.medium_id == Medium.id)\
+            .outerjoin(DocumentFairness, DocumentFairness.doc_id == Document.id)\
+            .outerjoin(Fairness, DocumentFairness.fairness_id == Fairness.id)\
+            .filter(docs.contains(Document.id))\
+            .group_by(Document.id, *groups)\
+            .subquery()
+
+        # see Document.is_fair
+        is_fair = or_(per_doc.c.n_fairness == 0,
+                      and_(per_doc.c.n_fairness == 1, per_doc.c.n_fair == 1))
+        group_cols = [per_doc.c['group_%d' % i] for i in xrange(n)]
+
+        rows = db.session.query(
+                func.count(),
+                func.sum(case([(is_fair, 1)], else_=0)),
+                func.sum(per_doc.c.favour),
+                func.sum(per_doc.c.oppose),
+                *group_cols)\
+            .group_by(*group_cols)\
+            .all()
+
+        # party affiliations of sources, see count_sources
+        counts = defaultdict(lambda: defaultdict(int))
+        parties = db.session.query(Affiliation.name, func.count(), *groups)\
+            .select_from(DocumentSource)\
+            .join(Affiliation, DocumentSource.affiliation_id == Affiliation.id)\
+            .join(Document, DocumentSource.doc_id == Document.id)\
+            .join(Medium, Document.medium_id == Medium.id)\
+            .filter(Affiliation.code.like('4.%'))\
+            .filter(docs.contains(Document.id))\
+            .group_by(Affiliation.name, *groups)
+
+        for row in parties:
+            counts[key(row[2:])][row[0]] += int(row[1])
+
+        entropy = calculate_entropy(counts)
+
+        scores = []
+        for row in sorted(rows, key=lambda r: key(r[4:])):
+            score = BiasScore()
+            score.group = key(row[4:])
+            score.count = int(row[0])
+            score.parties = entropy.get(score.group, 0)
+            score.fair = int(row[1])/score.count
+            score.favour = int(row[2])
+            score.oppose = int(row[3])
+            scores.append(score)
+
+        return scores
+
+
 class BiasScore:
     parties     = 0
     fair        = 0
@@ -0,0 +1,203 @@
+from collections import OrderedDict
+
+import csv
+import json
+import tempfile
+import zlib
+from array import array
+from cStringIO import StringIO
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy
+from sqlalchemy.types import Integer, Float, Numeric, Date, DateTime
+
+from .xlsx_export import XLSXExportBuilder, stream_rows
+
+
+class BulkExportBuilder:
+    """
+    Exports the raw data of one of the XLSX export's merged tables,
+    `everything` or `sources`, in a form that's quicker to write and read
+    in bulk than a spreadsheet.
+
+    `stream` produces gzip-compressed CSV or NDJSON a chunk at a time, straight
+    from a server-side cursor, so that big exports start downloading
+    immediately and use constant memory.
+
+    `build` writes a typed, columnar numpy .npz file. Numbers and dates are
+    stored as numpy arrays and other columns are dictionary encoded as
+    `<column>.codes` and `<column>.labels` arrays, with -1 for NULL. The
+    `columns` array lists the columns in order.
+    """
+
+    TABLES = ['everything', 'sources']
+
+    # compress this many bytes of output at a time
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, form, table):
+        if table not in self.TABLES:
+            raise ValueError("Unknown table: %s" % table)
+
+        self.table = table
+        self.xlsx = XLSXExportBuilder(form)
+
+    def query(self):
+        return getattr(self.xlsx, '%s_queries' % self.table)()[0]
+
+    def stream(self, format):
+        """ Yield chunks of the gzipped table, as 'csv' or 'ndjson'. """
+        query = self.query()
+        keys = [c['name'] for c in query.column_descriptions]
+        rows = stream_rows(query)
+
+        if format == 'csv':
+            lines = csv_lines(keys, rows)
+        elif format == 'ndjson':
+            lines = ndjson_lines(keys, rows)
+        else:
+            raise ValueError("Unknown format: %s" % format)
+
+        # wbits of 16 + MAX_WBITS produces a gzip header and trailer
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        buf = []
+        size = 0
+
+        for line in lines:
+            buf.append(line)
+            size += len(line)
+
+            if size >= self.CHUNK_SIZE:
+                chunk = compressor.compress(''.join(buf))
+                buf = []
+                size = 0
+                if chunk:
+                    yield chunk
+
+        yield compressor.compress(''.join(buf)) + compressor.flush()
+
+    def build(self, progress=None):
+        """
+        Write the table as a columnar .npz file to a temporary file and return
+        the file, open and at the start. Closing the file deletes it.
+
+        If given, +progress+ is called with the percent complete.
+        """
+        query = self.query()
+        columns = [Column(c['name'], c['type']) for c in query.column_descriptions]
+
+        for row in stream_rows(query):
+            for column, value in zip(columns, row):
+                column.append(value)
+
+        if progress:
+            progress(80)
+
+        arrays = {'columns': numpy.array([c.name for c in columns], dtype=unicode)}
+        for column in columns:
+            arrays.update(column.arrays())
+
+        output = tempfile.TemporaryFile()
+        numpy.savez_compressed(output, **arrays)
+        output.seek(0)
+
+        if progress:
+            progress(100)
+
+        return output
+
+
+class Column(object):
+    """ The values of a column of a columnar export, see BulkExportBuilder. """
+
+    def __init__(self, name, type_):
+        self.name = name
+
+        if isinstance(type_, (Date, DateTime)):
+            self.kind = 'date'
+            self.values = []
+        elif isinstance(type_, (Integer, Float, Numeric)):
+            # stored as floats while reading, so that NULLs can be NaN
+            self.kind = 'number'
+            self.integer = isinstance(type_, Integer)
+            self.values = array('d')
+        else:
+            self.kind = 'category'
+            self.values = array('i')
+            self.lookup = {}
+
+    def append(self, value):
+        if self.kind == 'category':
+            if value is None:
+                code = -1
+            else:
+                value = to_unicode(value)
+                code = self.lookup.get(value)
+                if code is None:
+                    code = self.lookup[value] = len(self.lookup)
+            self.values.append(code)
+
+        elif self.kind == 'number':
+            self.values.append(numpy.nan if value is None else float(value))
+
+        else:
+            self.values.append(value)
+
+    def arrays(self):
+        """ The column as a dict of numpy arrays, by name. """
+        if self.kind == 'category':
+            labels = [None] * len(self.lookup)
+            for label, code in self.lookup.iteritems():
+                labels[code] = label
+
+            return {
+                self.name + '.codes': numpy.frombuffer(self.values, dtype=numpy.int32),
+                self.name + '.labels': numpy.array(labels, dtype=unicode),
+            }
+
+        if self.kind == 'number':
+            values = numpy.frombuffer(self.values, dtype=numpy.float64)
+            if self.integer and not numpy.isnan(values).any():
+                values = values.astype(numpy.int64)
+            return {self.name: values}
+
+        return {self.name: numpy.array([v or 'NaT' for v in self.values], dtype='datetime64[s]')}
+
+
+def to_unicode(value):
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    return unicode(value)
+
+
+def csv_lines(keys, rows):
+    """ Yield +rows+ as lines of UTF-8 CSV, after a header of +keys+. """
+    buf = StringIO()
+    writer = csv.writer(buf)
+
+    def line(values):
+        writer.writerow(values)
+        s = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return s
+
+    yield line(keys)
+
+    for row in rows:
+        yield line(['' if v is None else v.encode('utf-8') if isinstance(v, unicode) else v for v in row])
+
+
+def ndjson_lines(keys, rows):
+    """ Yield +rows+ as lines of JSON objects keyed by +keys+. """
+    for row in rows:
+        yield json.dumps(OrderedDict(zip(keys, row)), default=json_default, encoding='utf-8') + '\n'
+
+
+def json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(repr(value) + " is not JSON serializable")
@@ -0,0 +1,116 @@
+import numpy
+
+
+class FactTable(object):
+    """
+    An in-memory, columnar table of facts, such as an attribute of each
+    of a set of documents or sources, which can be filtered and grouped
+    with numpy rather than by running a GROUP BY query for each breakdown.
+
+    Every column is dictionary encoded: the distinct values of a column
+    are kept in `labels[name]`, in the order they were first seen, and the
+    column itself is an array of integer codes into those labels. NULLs
+    are a label like any other (None).
+
+        facts = FactTable(['medium', 'topic'], rows)
+        facts.count(['medium', 'topic'], where=facts.isin('topic', ['Health']))
+    """
+
+    def __init__(self, names, rows):
+        """
+        :param names: list of column names
+        :param rows: iterable of tuples, one value for each column
+        """
+        self.names = list(names)
+        self.labels = {}
+        self.codes = {}
+
+        lookups = [{} for name in self.names]
+        codes = [[] for name in self.names]
+
+        for row in rows:
+            for i, value in enumerate(row):
+                lookup = lookups[i]
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup[value] = len(lookup)
+                codes[i].append(code)
+
+        self.size = len(codes[0]) if codes else 0
+        for i, name in enumerate(self.names):
+            labels = [None] * len(lookups[i])
+            for value, code in lookups[i].iteritems():
+                labels[code] = value
+            self.labels[name] = labels
+            self.codes[name] = numpy.array(codes[i], dtype=int)
+
+    def __len__(self):
+        return self.size
+
+    def isin(self, name, values):
+        """ A boolean mask of the rows whose +name+ is one of +values+. """
+        values = set(values)
+        wanted = [code for code, label in enumerate(self.labels[name]) if label in values]
+        return numpy.in1d(self.codes[name], wanted)
+
+    def eq(self, name, value):
+        """ A boolean mask of the rows whose +name+ is +value+. """
+        return self.isin(name, [value])
+
+    def group(self, by, where=None, nulls=False):
+        """
+        Group the rows matching the boolean mask +where+ by the columns +by+.
+        Rows that have a NULL in one of +by+ are ignored unless +nulls+ is True,
+        which is like joining to the table of each column.
+
+        :return: (keys, group) where +keys+ is a list of the code arrays of the
+                 rows' columns, and +group+ is an array of each row's group
+                 number: the index of its codes in an array of shape(by).
+        """
+        mask = numpy.ones(self.size, dtype=bool) if where is None else numpy.array(where, dtype=bool)
+        if not nulls:
+            for name in by:
+                if None in self.labels[name]:
+                    mask &= self.codes[name] != self.labels[name].index(None)
+
+        keys = [self.codes[name][mask] for name in by]
+        shape = self.shape(by)
+        if not keys or not len(keys[0]):
+            return keys, numpy.zeros(0, dtype=int)
+
+        return keys, numpy.ravel_multi_index(keys, shape)
+
+    def shape(self, by):
+        """ The shape of an array with an axis for each of the columns +by+. """
+        return tuple(max(len(self.labels[name]), 1) for name in by)
+
+    def counts(self, by, where=None, distinct=None, nulls=False):
+        """
+        The number of rows matching +where+ for each combination of
+        the values of the columns +by+, as an array with an axis for each
+        column, indexed by their codes. If +distinct+ is given, the
+        distinct values of that column are counted instead of rows.
+        """
+        shape = self.shape(by)
+        keys, group = self.group(by + ([distinct] if distinct else []), where, nulls)
+
+        if distinct and len(group):
+            # one entry for each distinct (group, value) pair
+            n_values = self.shape([distinct])[0]
+            group = numpy.unique(group) // n_values
+
+        return numpy.bincount(group, minlength=int(numpy.prod(shape))).reshape(shape)
+
+    def count(self, by, where=None, distinct=None, nulls=False):
+        """
+        Like +counts+, but returns a list of rows like a GROUP BY query would:
+        a tuple of each combination of the values of +by+, followed by its
+        count. Combinations with no rows are left out.
+        """
+        counts = self.counts(by, where, distinct, nulls)
+
+        rows = []
+        for index in numpy.argwhere(counts):
+            index = tuple(index)
+            rows.append(tuple(self.labels[name][i] for name, i in zip(by, index)) + (int(counts[index]),))
+        return rows
@@ -30,7 +30,7 @@ class MediaAnalyser(BaseAnalyser):
                     func.count(Document.id))\
                     .join(Document)\
                     .group_by(Medium.id)\
-                    .filter(Document.id.in_(self.doc_ids)).all()
+                    .filter(self.docs.contains(Document.id)).all()
 
         self.media = []
         for id, count in rows:
@@ -1,11 +1,14 @@
 from collections import defaultdict
 
+import tempfile
+import numpy
 import xlsxwriter
 from xlsxwriter.utility import xl_rowcol_to_cell, xl_col_to_name
-import StringIO
 
+from sqlalchemy.orm import aliased
 from sqlalchemy.sql import func
 
+from .facts import FactTable
 from .utils import calculate_entropy
 from ..models import *  # noqa
 
@@ -44,8 +47,21 @@ class ChildrenRatingExport:
 
     A score for each rating is calculated based on the content and
     analysis of all the documents for a medium.
+
+    The scores are calculated from FactTables of the documents and
+    their sources, which are loaded with one query each, rather than
+    running a query for each score.
     """
 
+    quality_indicators = [
+        'quality_self_help',
+        'quality_consequences',
+        'quality_solutions',
+        'quality_policies',
+        'quality_causes',
+        'quality_basic_context',
+    ]
+
     ratings = [[1.0, 'Final rating', [
         [0.500, 'Are Childrens Rights Respected', [
             [0.123, 'Diversity of Roles'],
@@ -108,10 +124,10 @@ class ChildrenRatingExport:
             [0.126, 'Diversity of Races']]],
     ]]]
 
-    def __init__(self, doc_ids):
+    def __init__(self, docs):
         # we use these to filter our queries, rather than trying to pull
         # complex filter logic into our view queries
-        self.doc_ids = doc_ids
+        self.docs = DocumentSet.coerce(docs)
         self.formats = {}
 
         # map from a score name to its row in the score sheet
@@ -139,11 +155,19 @@ class ChildrenRatingExport:
         # the column at which the ratings for each medium starts
         self.rating_col_start = (max(depth(self.ratings)) - 1) * 2
 
-    def build(self):
+    def build(self, progress=None):
         """
-        Generate an Excel spreadsheet and return it as a string.
+        Generate an Excel spreadsheet in a temporary file and return the
+        file, open and at the start. Closing the file deletes it.
+
+        The ratings only have a row per score, so unlike the full export
+        they aren't written in constant memory mode, which would need
+        the rows of each worksheet to be written in order.
+
+        If given, +progress+ is called with the percent complete after
+        the facts are loaded and after each worksheet is written.
         """
-        output = StringIO.StringIO()
+        output = tempfile.TemporaryFile()
 
         workbook = xlsxwriter.Workbook(output)
 
@@ -154,13 +178,20 @@ class ChildrenRatingExport:
         self.rating_ws = workbook.add_worksheet('Rating')
         self.scores_ws = workbook.add_worksheet('Raw')
 
+        self.load_facts()
+        if progress:
+            progress(25)
         self.build_scores_worksheet()
+        if progress:
+            progress(50)
         self.build_rating_worksheet()
+        if progress:
+            progress(100)
 
         workbook.close()
         output.seek(0)
 
-        return output.read()
+        return output
 
     def build_scores_worksheet(self):
         """ Build up the scores worksheet. """
@@ -182,30 +213,74 @@ class ChildrenRatingExport:
         row = self.topic_scores(row) + 2
         row = self.type_scores(row) + 2
 
+    def load_facts(self):
+        """ Load the facts about the documents and their sources that
+        the scores are calculated from. """
+        from dexter.models.views import DocumentSourcesView
+
+        supported = aliased(Principle)
+        violated = aliased(Principle)
+
+        self.documents = FactTable(
+            ['doc_id', 'medium', 'topic', 'topic_group', 'type', 'origin',
+             'principle_supported', 'principle_violated', 'abuse_victim', 'abuse_source'] + self.quality_indicators,
+            self.filter(
+                db.session.query(
+                    Document.id,
+                    Medium.name,
+                    Topic.name,
+                    Topic.group,
+                    DocumentType.name,
+                    Location.name,
+                    supported.name,
+                    violated.name,
+                    Document.abuse_victim,
+                    Document.abuse_source,
+                    *[getattr(Document, attr) for attr in self.quality_indicators])
+                .join(Medium, Document.medium_id == Medium.id)
+                .outerjoin(Topic, Document.topic_id == Topic.id)
+                .outerjoin(DocumentType, Document.document_type_id == DocumentType.id)
+                .outerjoin(Location, Document.origin_location_id == Location.id)
+                .outerjoin(supported, Document.principle_supported_id == supported.id)
+                .outerjoin(violated, Document.principle_violated_id == violated.id)))
+
+        # gender and race are those of unnamed sources, while the view's
+        # gender is also that of the source's person
+        self.sources = FactTable(
+            ['doc_id', 'medium', 'origin', 'source_type', 'quoted', 'unnamed_gender', 'unnamed_race',
+             'age', 'role', 'role_indication', 'gender', 'affiliation_group'],
+            self.filter(
+                db.session.query(
+                    DocumentSource.doc_id,
+                    Medium.name,
+                    Location.name,
+                    DocumentSource.source_type,
+                    DocumentSource.quoted,
+                    Gender.name,
+                    Race.name,
+                    SourceAge.name,
+                    SourceRole.name,
+                    SourceRole.indication,
+                    DocumentSourcesView.c.gender,
+                    DocumentSourcesView.c.affiliation_group)
+                .join(Document, DocumentSource.doc_id == Document.id)
+                .join(Medium, Document.medium_id == Medium.id)
+                .outerjoin(Location, Document.origin_location_id == Location.id)
+                .outerjoin(Gender, DocumentSource.unnamed_gender_id == Gender.id)
+                .outerjoin(Race, DocumentSource.unnamed_race_id == Race.id)
+                .outerjoin(SourceAge, DocumentSource.source_age_id == SourceAge.id)
+                .outerjoin(SourceRole, DocumentSource.source_role_id == SourceRole.id)
+                .outerjoin(DocumentSourcesView, DocumentSourcesView.c.document_source_id == DocumentSource.id)))
+
     def totals(self, row):
         """ Counts of articles and sources """
         self.scores_ws.write(row, 0, 'Articles')
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                func.count(1).label('freq'))
-            .join(Document)
-            .group_by(Medium.name)
-        ).all()
-        self.write_simple_score_row('Total articles', rows, row)
+        self.write_simple_score_row('Total articles', self.documents.count(['medium']), row)
 
         row += 2
 
         self.scores_ws.write(row, 0, 'Sources')
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                func.count(1).label('freq'))
-            .join(Document)
-            .join(DocumentSource)
-            .group_by(Medium.name)
-        ).all()
-        self.write_simple_score_row('Total sources', rows, row)
+        self.write_simple_score_row('Total sources', self.sources.count(['medium']), row)
 
         return row
 
@@ -222,24 +297,12 @@ class ChildrenRatingExport:
 
     def child_gender_scores(self, row):
         """ Counts of genders of child sources """
-        from dexter.models.views import DocumentSourcesView
+        child = self.sources.eq('source_type', 'child')
 
         # QUOTED child genders
         self.scores_ws.write(row, 0, 'Quoted Child Genders')
 
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                DocumentSourcesView.c.gender,
-                func.count(1).label('freq'))
-            .select_from(DocumentSourcesView)
-            .join(Document, DocumentSourcesView.c.document_id == Document.id)
-            .join(Medium)
-            .filter(DocumentSourcesView.c.source_type == 'child')
-            .filter(DocumentSourcesView.c.quoted == 'quoted')
-            .group_by(Medium.name, DocumentSourcesView.c.gender)
-            .order_by(Medium.name)
-        ).all()
+        rows = self.sources.count(['medium', 'gender'], where=child & self.sources.eq('quoted', True), nulls=True)
 
         rows = [[m, g or 'Unknown', c] for m, g, c in rows]
         genders = set(r[1] for r in rows)
@@ -261,18 +324,7 @@ class ChildrenRatingExport:
         # ALL child genders
         self.scores_ws.write(row, 0, 'All Child Genders')
 
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                DocumentSourcesView.c.gender,
-                func.count(1).label('freq'))
-            .select_from(DocumentSourcesView)
-            .join(Document, DocumentSourcesView.c.document_id == Document.id)
-            .join(Medium)
-            .filter(DocumentSourcesView.c.source_type == 'child')
-            .group_by(Medium.name, DocumentSourcesView.c.gender)
-            .order_by(Medium.name)
-        ).all()
+        rows = self.sources.count(['medium', 'gender'], where=child, nulls=True)
 
         rows = [[m, g or 'Unknown', c] for m, g, c in rows]
         genders = set(r[1] for r in rows)
@@ -301,32 +353,18 @@ class ChildrenRatingExport:
         """ Counts of children sources, how many speak, etc. """
         self.scores_ws.write(row, 0, 'Child Sources')
 
+        child = self.sources.eq('source_type', 'child')
+        quoted = child & self.sources.eq('quoted', True)
+
         # all child sources
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                func.count(1).label('freq'))
-            .join(Document)
-            .join(DocumentSource)
-            .filter(DocumentSource.source_type == 'child')
-            .group_by(Medium.name)
-        ).all()
+        rows = self.sources.count(['medium'], where=child)
         self.write_simple_score_row('Total child sources', rows, row)
         row += 1
         self.write_percent_row('Child sources', self.score_row['Total sources'], row - 1, row)
         row += 1
 
         # quoted child sources
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                func.count(1).label('freq'))
-            .join(Document)
-            .join(DocumentSource)
-            .filter(DocumentSource.source_type == 'child')
-            .filter(DocumentSource.quoted == True)
-            .group_by(Medium.name)
-        ).all()  # noqa
+        rows = self.sources.count(['medium'], where=quoted)
         self.write_simple_score_row('Quoted child sources', rows, row)
         row += 1
 
@@ -345,18 +383,7 @@ class ChildrenRatingExport:
 
         # origin of documents with quoted children
         self.scores_ws.write(row, 0, 'Origins of Quoted Children')
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                Location.name,
-                func.count(func.distinct(Document.id)).label('freq'))
-            .join(Document)
-            .join(DocumentSource)
-            .join(Location)
-            .filter(DocumentSource.source_type == 'child')
-            .filter(DocumentSource.quoted == True)
-            .group_by(Medium.name)  # noqa
-        ).all()
+        rows = self.sources.count(['medium', 'origin'], where=quoted, distinct='doc_id')
         origins = list(set(r[1] for r in rows))
         row = self.write_score_table(origins, rows, row)
         # entropy
@@ -369,18 +396,8 @@ class ChildrenRatingExport:
         """ Counts of source roles per medium, and their entropy. """
         self.scores_ws.write(row, 0, 'Child Roles')
 
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                SourceRole.name,
-                func.count(1).label('freq'))
-            .join(Document)
-            .join(DocumentSource)
-            .join(SourceRole)
-            .filter(DocumentSource.source_type == 'child')
-            .group_by(Medium.name, SourceRole.name)
-            .order_by(Medium.name)
-        ).all()
+        child = self.sources.eq('source_type', 'child')
+        rows = self.sources.count(['medium', 'role'], where=child)
 
         roles = list(set(r[1] for r in rows))
         roles.sort()
@@ -397,18 +414,8 @@ class ChildrenRatingExport:
             title = indication.capitalize() + ' Roles'
             self.scores_ws.write(row, 0, title)
 
-            rows = self.filter(
-                db.session.query(
-                    Medium.name,
-                    SourceRole.name,
-                    func.count(1).label('freq'))
-                .join(Document)
-                .join(DocumentSource)
-                .join(SourceRole)
-                .filter(SourceRole.indication == indication)
-                .filter(DocumentSource.source_type == 'child')
-                .group_by(Medium.name, SourceRole.name)
-            ).all()
+            indicated = child & self.sources.eq('role_indication', indication)
+            rows = self.sources.count(['medium', 'role'], where=indicated)
 
             row = self.write_score_table(roles, rows, row) + 1
             formula = '=SUM({col}%s:{col}%s)' % (row - len(roles), row - 1)
@@ -423,20 +430,7 @@ class ChildrenRatingExport:
             for gender in ['Male', 'Female']:
                 self.scores_ws.write(row, 0, gender + ' ' + title)
 
-                rows = self.filter(
-                    db.session.query(
-                        Medium.name,
-                        SourceRole.name,
-                        func.count(1).label('freq'))
-                    .join(Document)
-                    .join(DocumentSource)
-                    .join(SourceRole)
-                    .join(Gender)
-                    .filter(SourceRole.indication == indication)
-                    .filter(DocumentSource.source_type == 'child')
-                    .filter(Gender.name == gender)
-                    .group_by(Medium.name, SourceRole.name)
-                ).all()
+                rows = self.sources.count(['medium', 'role'], where=indicated & self.sources.eq('unnamed_gender', gender))
 
                 row = self.write_score_table(roles, rows, row) + 1
                 formula = '=SUM({col}%s:{col}%s)' % (row - len(roles), row - 1)
@@ -459,18 +453,7 @@ class ChildrenRatingExport:
         """ Counts of source ages per medium, and their entropy. """
         self.scores_ws.write(row, 0, 'Child Ages')
 
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                SourceAge.name,
-                func.count(1).label('freq'))
-            .join(Document)
-            .join(DocumentSource)
-            .join(SourceAge)
-            .filter(DocumentSource.source_type == 'child')
-            .group_by(Medium.name, SourceAge.name)
-            .order_by(Medium.name)
-        ).all()
+        rows = self.sources.count(['medium', 'age'], where=self.sources.eq('source_type', 'child'))
 
         ages = list(set(r[1] for r in rows))
         ages.sort()
@@ -484,18 +467,7 @@ class ChildrenRatingExport:
         """ Counts of source races per medium, and their entropy. """
         self.scores_ws.write(row, 0, 'Races')
 
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                Race.name,
-                func.count(1).label('freq'))
-            .join(Document)
-            .join(DocumentSource)
-            .join(Race)
-            .filter(DocumentSource.source_type == 'child')
-            .group_by(Medium.name, Race.name)
-            .order_by(Medium.name)
-        ).all()
+        rows = self.sources.count(['medium', 'unnamed_race'], where=self.sources.eq('source_type', 'child'))
 
         races = list(set(r[1] for r in rows))
         races.sort()
@@ -509,15 +481,7 @@ class ChildrenRatingExport:
         """ Counts of document topics per medium, and their entropy. """
         self.scores_ws.write(row, 0, 'Topics')
 
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                Topic.name,
-                func.count(1).label('freq'))
-            .join(Document)
-            .join(Topic)
-            .group_by(Medium.name, Topic.name)
-        ).all()
+        rows = self.documents.count(['medium', 'topic'])
         roles = list(set(r[1] for r in rows))
         roles.sort()
 
@@ -526,15 +490,7 @@ class ChildrenRatingExport:
         row += 1
 
         # 2. Child Abuse
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                func.count(1).label('freq'))
-            .join(Document)
-            .join(Topic)
-            .filter(Topic.group == '2. Child Abuse')
-            .group_by(Medium.name, Topic.name)
-        ).all()
+        rows = self.documents.count(['medium'], where=self.documents.eq('topic_group', '2. Child Abuse'))
 
         self.write_simple_score_row('Child Abuse', rows, row)
         row += 1
@@ -550,16 +506,7 @@ class ChildrenRatingExport:
         types = ['News story', 'Editorial', 'Opinion piece', 'Feature/news analysis', 'Business', 'Sport']
         types.sort()
 
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                DocumentType.name,
-                func.count(1).label('freq'))
-            .join(Document)
-            .join(DocumentType)
-            .filter(DocumentType.name.in_(types))
-            .group_by(Medium.name, DocumentType.name)
-        ).all()
+        rows = self.documents.count(['medium', 'type'], where=self.documents.isin('type', types))
 
         row = self.write_score_table(types, rows, row) + 1
 
@@ -574,15 +521,7 @@ class ChildrenRatingExport:
         """ Counts of document origins per medium, and their entropy. """
         self.scores_ws.write(row, 0, 'Origins')
 
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                Location.name,
-                func.count(1).label('freq'))
-            .join(Document)
-            .join(Location)
-            .group_by(Medium.name, Location.name)
-        ).all()
+        rows = self.documents.count(['medium', 'origin'])
         origins = list(set(r[1] for r in rows))
         origins.sort()
 
@@ -615,29 +554,12 @@ class ChildrenRatingExport:
 
         rows = []
         names = []
-        indicators = [
-            'quality_self_help',
-            'quality_consequences',
-            'quality_solutions',
-            'quality_policies',
-            'quality_causes',
-            'quality_basic_context',
-        ]
-
-        for attr in indicators:
+
+        for attr in self.quality_indicators:
             # count documents with this quality
             name = attr.replace('quality_', '').replace('_', ' ').title()
             names.append(name)
-            for medium, count in self.filter(
-                db.session.query(
-                    Medium.name,
-                    func.count(1).label('freq'))
-                .join(Document)
-                .filter(getattr(Document, attr) == True)
-                .group_by(Medium.name)
-                .order_by(Medium.name)
-                ).all():  # noqa
-
+            for medium, count in self.documents.count(['medium'], where=self.documents.eq(attr, True)):
                 rows.append([medium, name, count])
 
         starting_row = row
@@ -663,16 +585,7 @@ class ChildrenRatingExport:
 
         # number of documents with both a child source, and an
         # abuse victim (secondary victimisation)
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                func.count(1).label('freq'))
-            .join(Document)
-            .filter(Document.abuse_victim == True)
-            .filter(Document.abuse_source == True)
-            .group_by(Medium.name)
-            .order_by(Medium.name)
-        ).all()  # noqa
+        rows = self.documents.count(['medium'], where=self.documents.eq('abuse_victim', True) & self.documents.eq('abuse_source', True))
 
         self.write_simple_score_row('Abused sources', rows, row)
         row += 1
@@ -692,15 +605,7 @@ class ChildrenRatingExport:
         principles = Principle.query.all()
 
         self.scores_ws.write(row, 0, 'Principles supported')
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                Principle.name,
-                func.count(1).label('freq'))
-            .join(Document)
-            .join(Principle, Document.principle_supported_id == Principle.id)
-            .group_by(Medium.name, Principle.name)
-        ).all()
+        rows = self.documents.count(['medium', 'principle_supported'])
         rows = [[r[0], 'S. ' + r[1], r[2]] for r in rows]
         names = ['S. ' + p.name for p in principles]
         row = self.write_score_table(names, rows, row) + 1
@@ -721,15 +626,7 @@ class ChildrenRatingExport:
         row = self.write_formula_table(names, formula, row) + 1
 
         self.scores_ws.write(row, 0, 'Principles violated')
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                Principle.name,
-                func.count(1).label('freq'))
-            .join(Document)
-            .join(Principle, Document.principle_violated_id == Principle.id)
-            .group_by(Medium.name, Principle.name)
-        ).all()
+        rows = self.documents.count(['medium', 'principle_violated'])
         rows = [[r[0], 'V. ' + r[1], r[2]] for r in rows]
         names = ['V. ' + p.name for p in principles]
         row = self.write_score_table(names, rows, row)
@@ -853,28 +750,22 @@ class ChildrenRatingExport:
         return rating_rows, row
 
     def source_counts(self, children=False, limit=4):
-        # source counts per document
-        subq = db.session\
-            .query(
-                Medium.name.label('medium'),
-                func.count(1).label('n_sources'))\
-            .join(Document)\
-            .join(DocumentSource)\
-            .group_by(Medium.name, DocumentSource.doc_id)
-
-        if children:
-            subq = subq.filter(DocumentSource.source_type == 'child')
-
-        subq = self.filter(subq).subquery()
-
-        return db.session\
-            .query(
-                subq.c.medium,
-                func.if_(subq.c.n_sources > limit, ">%s" % limit, subq.c.n_sources).label('bucket'),
-                func.count(1))\
-            .select_from(subq)\
-            .group_by(subq.c.medium, 'bucket')\
-            .all()
+        """ The number of documents with each number of sources per medium,
+        as (medium, bucket, count) rows. Documents with more than +limit+ sources
+        are in the same bucket, and those without any are left out. """
+        where = self.sources.eq('source_type', 'child') if children else None
+
+        # sources per document
+        keys, group = self.sources.group(['medium', 'doc_id'], where)
+        groups, n_sources = numpy.unique(group, return_counts=True)
+        media = numpy.unravel_index(groups, self.sources.shape(['medium', 'doc_id']))[0]
+
+        counts = numpy.zeros((self.sources.shape(['medium'])[0], limit + 2), dtype=int)
+        numpy.add.at(counts, (media, numpy.minimum(n_sources, limit + 1)), 1)
+
+        labels = self.sources.labels['medium']
+        return [[labels[m], str(n) if n <= limit else '>%s' % limit, int(counts[m, n])]
+                for m, n in numpy.argwhere(counts)]
 
     def score_col(self, i):
         """ The index of the score for the i-th medium """
@@ -885,7 +776,7 @@ class ChildrenRatingExport:
         return self.rating_col_start + i
 
     def filter(self, query):
-        return query.filter(Document.id.in_(self.doc_ids))
+        return query.filter(self.docs.contains(Document.id))
 
 
 class MediaDiversityRatingExport(ChildrenRatingExport):
@@ -918,23 +809,39 @@ class MediaDiversityRatingExport(ChildrenRatingExport):
 
         return row
 
+    def load_facts(self):
+        """ Also load the documents' taxonomies and places. """
+        from dexter.models.views import DocumentTaxonomiesView, DocumentPlacesView
+
+        super(MediaDiversityRatingExport, self).load_facts()
+
+        self.taxonomies = FactTable(
+            ['doc_id', 'medium', 'label'],
+            self.filter(
+                db.session.query(
+                    DocumentTaxonomiesView.c.document_id,
+                    Medium.name,
+                    DocumentTaxonomiesView.c.label)
+                .select_from(DocumentTaxonomiesView)
+                .join(Document)
+                .join(Medium)))
+
+        self.places = FactTable(
+            ['doc_id', 'medium', 'province'],
+            self.filter(
+                db.session.query(
+                    DocumentPlacesView.c.document_id,
+                    Medium.name,
+                    DocumentPlacesView.c.province_name)
+                .select_from(DocumentPlacesView)
+                .join(Document)
+                .join(Medium)))
+
     def taxonomy_scores(self, row):
         """ Counts of document taxonomies per medium, and their entropy. """
-        from dexter.models.views import DocumentTaxonomiesView
-
         self.scores_ws.write(row, 0, 'Topic')
 
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                DocumentTaxonomiesView.c.label,
-                func.count(DocumentTaxonomiesView.c.document_id).label('freq')
-            )
-            .select_from(DocumentTaxonomiesView)
-            .join(Document)
-            .join(Medium)
-            .group_by(Medium.name, 'label')
-        ).all()
+        rows = self.taxonomies.count(['medium', 'label'], nulls=True)
         taxonomies = list(set(r[1] for r in rows))
         taxonomies.sort()
 
@@ -944,18 +851,7 @@ class MediaDiversityRatingExport(ChildrenRatingExport):
 
         # social justice focus bonus
         focus = ['Education', 'Environment', 'Health', 'Labour', 'Social Issues']
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                DocumentTaxonomiesView.c.label,
-                func.count(DocumentTaxonomiesView.c.document_id).label('freq')
-            )
-            .select_from(DocumentTaxonomiesView)
-            .join(Document)
-            .join(Medium)
-            .filter(DocumentTaxonomiesView.c.label.in_(focus))
-            .group_by(Medium.name, 'label')
-        ).all()
+        rows = self.taxonomies.count(['medium', 'label'], where=self.taxonomies.isin('label', focus))
 
         taxonomies = list(set(r[1] for r in rows))
         taxonomies.sort()
@@ -972,21 +868,9 @@ class MediaDiversityRatingExport(ChildrenRatingExport):
 
     def region_scores(self, row):
         """ Counts of document regions per medium, and their entropy. """
-        from dexter.models.views import DocumentPlacesView
-
         self.scores_ws.write(row, 0, 'Region')
 
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                DocumentPlacesView.c.province_name,
-                func.count(1).label('freq')
-            )
-            .select_from(DocumentPlacesView)
-            .join(Document)
-            .join(Medium)
-            .group_by(Medium.name, DocumentPlacesView.c.province_name)
-        ).all()
+        rows = self.places.count(['medium', 'province'], nulls=True)
         regions = list(set(r[1] for r in rows))
         regions.sort()
 
@@ -998,21 +882,10 @@ class MediaDiversityRatingExport(ChildrenRatingExport):
 
     def sources_scores(self, row):
         """ Counts of genders of sources """
-        from dexter.models.views import DocumentSourcesView
         self.scores_ws.write(row, 0, 'Sources')
 
         # source affiliations
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                DocumentSourcesView.c.affiliation_group.label('affiliation'),
-                func.count(1).label('freq'))
-            .select_from(DocumentSourcesView)
-            .join(Document)
-            .join(Medium)
-            .group_by(Medium.name, DocumentSourcesView.c.affiliation_group)
-            .order_by(Medium.name)
-        ).all()
+        rows = self.sources.count(['medium', 'affiliation_group'], nulls=True)
 
         affiliations = list(set(r[1] for r in rows))
         affiliations.sort()
@@ -1024,18 +897,7 @@ class MediaDiversityRatingExport(ChildrenRatingExport):
 
         # marginalised voices
         focus_groups = ['Citizens', 'Academics / Experts / Researchers', 'NGOs / CBOs / FBOs', 'Unions']
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                DocumentSourcesView.c.affiliation_group.label('affiliation'),
-                func.count(1).label('freq'))
-            .select_from(DocumentSourcesView)
-            .join(Document)
-            .join(Medium)
-            .filter(DocumentSourcesView.c.affiliation_group.in_(focus_groups))
-            .group_by(Medium.name, DocumentSourcesView.c.affiliation_group)
-            .order_by(Medium.name)
-        ).all()
+        rows = self.sources.count(['medium', 'affiliation_group'], where=self.sources.isin('affiliation_group', focus_groups))
 
         affiliations = list(set(r[1] for r in rows))
         affiliations.sort()
@@ -1049,17 +911,7 @@ class MediaDiversityRatingExport(ChildrenRatingExport):
         row += 2
 
         # gender diversity
-        rows = self.filter(
-            db.session.query(
-                Medium.name,
-                DocumentSourcesView.c.gender,
-                func.count(1).label('freq'))
-            .select_from(DocumentSourcesView)
-            .join(Document, DocumentSourcesView.c.document_id == Document.id)
-            .join(Medium)
-            .group_by(Medium.name, DocumentSourcesView.c.gender)
-            .order_by(Medium.name)
-        ).all()
+        rows = self.sources.count(['medium', 'gender'], nulls=True)
 
         rows = [[m, g or 'Unknown', c] for m, g, c in rows]
         genders = set(r[1] for r in rows)
@@ -1079,26 +931,8 @@ class MediaDiversityRatingExport(ChildrenRatingExport):
         row += 2
 
         # avg sources per medium
-        doc_counts = self.filter(
-            db.session.query(
-                Document.medium_id,
-                func.count(1).label('doc_count'))
-            .group_by(Document.medium_id)).subquery()
-
-        source_counts = self.filter(
-            db.session.query(
-                Document.medium_id,
-                func.count(1).label('source_count'))
-            .select_from(DocumentSource)
-            .join(Document)
-            .group_by(Document.medium_id)).subquery()
-
-        rows = db.session.query(
-            Medium.name,
-            source_counts.c.source_count / doc_counts.c.doc_count)\
-            .join(source_counts, Medium.id == source_counts.c.medium_id)\
-            .join(doc_counts, Medium.id == doc_counts.c.medium_id)\
-            .all()
+        doc_counts = dict(self.documents.count(['medium']))
+        rows = [[medium, n / float(doc_counts[medium])] for medium, n in self.sources.count(['medium'])]
 
         self.write_simple_score_row('Avg sources', rows, row)
         row += 2
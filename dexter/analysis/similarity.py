@@ -0,0 +1,265 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy
+from sqlalchemy.sql import func
+
+from dexter.models import db, Document, DocumentFeatures
+from dexter.analysis.base import top_k
+
+log = logging.getLogger(__name__)
+
+
+class SimilarityIndex(object):
+    """
+    An in-memory inverted index of the documents' feature vectors, for
+    finding the documents most like a document.
+
+    Documents are scored by the cosine similarity of their TF-IDF weighted
+    feature vectors. The vectors are held in a sparse matrix with a column
+    for each feature, so scoring a document only touches the documents that
+    share one of its features.
+
+    The index is built from document_features in a background thread,
+    started with `start` when the web worker starts, or else the first time
+    it's used. After that, vectors that have changed since the index was
+    last updated are read at most every REFRESH_INTERVAL seconds and held
+    in a small second matrix. When that gets big, the index is rebuilt in
+    the background. Documents that have been deleted are left in the index,
+    so callers should ignore results that no longer exist.
+    """
+
+    # seconds between checking for changed vectors
+    REFRESH_INTERVAL = 60
+    # vectors are stamped when they're written, not when they're committed,
+    # so look this far back for vectors that were committed late
+    REFRESH_MARGIN = timedelta(minutes=10)
+    # rebuild the main matrix when there are this many changed vectors,
+    # as a fraction of the documents in the index
+    MERGE_FRACTION = 0.05
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.main = None
+        self.recent = None
+        # rows of the recently changed vectors, by document id
+        self.recent_rows = {}
+        self.updated_at = None
+        self.checked = 0
+        self.building = False
+
+    def similar(self, doc_id, limit=10, start_date=None, end_date=None, country_id=None, medium_ids=None):
+        """
+        The documents most similar to document +doc_id+, optionally limited
+        to those published between the dates +start_date+ and +end_date+,
+        in +country_id+ and in one of +medium_ids+.
+
+        :return: a list of (doc_id, score) pairs, best first, or None if
+                 the index hasn't been built yet
+        """
+        vector = db.session.query(DocumentFeatures.vector).filter(DocumentFeatures.doc_id == doc_id).scalar()
+        if vector is None:
+            return []
+
+        with self.lock:
+            if self.main is None:
+                self._start()
+                return None
+
+            self.refresh()
+            main, recent = self.main, self.recent
+
+        ids, weights = DocumentFeatures.unpack(vector)
+        ids = ids.astype(int)
+        weights = main.tfidf(ids, weights)
+
+        results = []
+        for part in (main, recent):
+            if part is None or not part.n_docs:
+                continue
+
+            scores = part.scores(ids, weights)
+            keep = part.filter(start_date, end_date, country_id, medium_ids)
+            keep &= part.doc_ids != doc_id
+            if part is main and recent is not None:
+                # newer vectors for these documents are in the recent part
+                keep &= ~numpy.in1d(part.doc_ids, recent.doc_ids)
+
+            candidates = numpy.flatnonzero(keep & (scores > 0))
+            for i in candidates[top_k(scores[candidates], limit)]:
+                results.append((int(part.doc_ids[i]), float(scores[i])))
+
+        results.sort(key=lambda p: p[1], reverse=True)
+        return results[:limit]
+
+    def refresh(self):
+        """ Add the vectors that changed since the index was last updated,
+        and start rebuilding it if there are too many. Call with the lock held. """
+        if time.time() - self.checked < self.REFRESH_INTERVAL:
+            return
+        self.checked = time.time()
+
+        rows = load_vectors(DocumentFeatures.updated_at >= self.updated_at - self.REFRESH_MARGIN)
+        if not rows:
+            return
+
+        self.updated_at = max(self.updated_at, max(r[-1] for r in rows))
+
+        # keep only the latest vector for each document
+        self.recent_rows.update((r[0], r) for r in rows)
+        self.recent = IndexPart(sorted(self.recent_rows.itervalues()), self.main.idf)
+
+        if len(self.recent_rows) > self.MERGE_FRACTION * self.main.n_docs:
+            self._start()
+
+    def start(self):
+        """ Start building the index in a background thread, unless it's already being built. """
+        with self.lock:
+            self._start()
+
+    def _start(self):
+        if self.building:
+            return
+        self.building = True
+
+        thread = threading.Thread(target=self._build, name='similarity-index')
+        thread.daemon = True
+        thread.start()
+
+    def _build(self):
+        try:
+            self.build()
+        except Exception as e:
+            log.error("Error building similarity index: %s" % e, exc_info=e)
+        finally:
+            self.building = False
+            db.session.remove()
+
+    def build(self):
+        """ Build the index from all the documents' vectors. The old index
+        is used until the new one is ready. """
+        log.info("Building similarity index")
+        start = time.time()
+
+        # note the time before reading, so that we don't miss changes made while reading
+        updated_at = db.session.query(func.max(DocumentFeatures.updated_at)).scalar()
+        main = IndexPart(load_vectors(), idf=None)
+
+        with self.lock:
+            self.main = main
+            self.recent = None
+            self.recent_rows = {}
+            self.updated_at = updated_at or datetime(1970, 1, 1)
+            # pick up changes made while we were building
+            self.checked = 0
+
+        log.info("Built similarity index of %d documents in %.1f seconds" % (main.n_docs, time.time() - start))
+
+
+class IndexPart(object):
+    """
+    Part of a SimilarityIndex: a matrix of the L2-normalised TF-IDF vectors
+    of some documents, with a row for each document and a column for each
+    feature id, and the details of each document that results can be
+    filtered by.
+    """
+
+    def __init__(self, rows, idf=None):
+        """
+        :param rows: list of (doc_id, published_on, country_id, medium_id, vector, updated_at) tuples,
+                     sorted by doc_id
+        :param idf: inverse document frequencies of each feature id, or None to
+                    calculate them from these documents
+        """
+        from scipy.sparse import csr_matrix
+
+        self.n_docs = len(rows)
+        self.doc_ids = numpy.array([r[0] for r in rows], dtype=int)
+        self.days = numpy.array([r[1].toordinal() if r[1] else 0 for r in rows], dtype=int)
+        self.country_ids = numpy.array([r[2] or 0 for r in rows], dtype=int)
+        self.medium_ids = numpy.array([r[3] or 0 for r in rows], dtype=int)
+
+        vectors = [DocumentFeatures.unpack(r[4]) for r in rows]
+        lengths = numpy.array([len(ids) for ids, w in vectors], dtype=int)
+        if vectors and lengths.sum():
+            cols = numpy.concatenate([ids for ids, w in vectors]).astype(int)
+            weights = numpy.concatenate([w for ids, w in vectors]).astype(float)
+        else:
+            cols = numpy.zeros(0, dtype=int)
+            weights = numpy.zeros(0)
+        del vectors
+
+        n_features = cols.max() + 1 if len(cols) else 0
+
+        if idf is None:
+            # smoothed, so that every feature has some weight
+            df = numpy.bincount(cols, minlength=max(n_features, 1))[:n_features]
+            idf = numpy.log((1.0 + self.n_docs) / (1.0 + df)) + 1.0
+        self.idf = idf
+
+        # weight by idf, and normalise each row
+        rows_idx = numpy.repeat(numpy.arange(self.n_docs), lengths)
+        weights = weights * self.idf_of(cols)
+        norms = numpy.sqrt(numpy.bincount(rows_idx, weights ** 2, minlength=max(self.n_docs, 1))[:self.n_docs])
+        norms[norms == 0] = 1
+        weights /= norms[rows_idx]
+
+        self.matrix = csr_matrix((weights, (rows_idx, cols)), shape=(self.n_docs, n_features)).tocsc()
+
+    def idf_of(self, ids):
+        """ The idf of each feature id in +ids+. Features that the index
+        hasn't seen are as rare as can be. """
+        idf = numpy.empty(len(ids))
+        known = ids < len(self.idf)
+        idf[known] = self.idf[ids[known]]
+        idf[~known] = self.idf.max() if len(self.idf) else 1.0
+        return idf
+
+    def tfidf(self, ids, weights):
+        """ The L2-normalised TF-IDF weights of a vector of feature +ids+ and their +weights+. """
+        weights = weights * self.idf_of(ids)
+        norm = numpy.sqrt((weights ** 2).sum())
+        return weights / norm if norm else weights
+
+    def scores(self, ids, weights):
+        """ The cosine similarity of each document to a normalised TF-IDF vector. """
+        known = ids < self.matrix.shape[1]
+        if not known.any():
+            return numpy.zeros(self.n_docs)
+        return self.matrix[:, ids[known]].dot(weights[known])
+
+    def filter(self, start_date=None, end_date=None, country_id=None, medium_ids=None):
+        """ A boolean mask of the documents that match these filters. """
+        keep = numpy.ones(self.n_docs, dtype=bool)
+        if start_date:
+            keep &= self.days >= start_date.toordinal()
+        if end_date:
+            keep &= self.days <= end_date.toordinal()
+        if country_id:
+            keep &= self.country_ids == country_id
+        if medium_ids:
+            keep &= numpy.in1d(self.medium_ids, medium_ids)
+        return keep
+
+
+def load_vectors(*filters):
+    """ Load the vectors and details of documents, sorted by document id. """
+    query = db.session.query(
+                DocumentFeatures.doc_id,
+                func.date(Document.published_at),
+                Document.country_id,
+                Document.medium_id,
+                DocumentFeatures.vector,
+                DocumentFeatures.updated_at)\
+        .join(Document, Document.id == DocumentFeatures.doc_id)\
+        .filter(*filters)\
+        .order_by(DocumentFeatures.doc_id)\
+        .yield_per(10000)
+
+    return [tuple(r) for r in query]
+
+
+# the index for this process
+index = SimilarityIndex()
@@ -3,10 +3,12 @@ from random import choice
 from collections import defaultdict, Counter
 from itertools import groupby, chain
 from datetime import datetime
-from dateutil.parser import parse
 
-from dexter.analysis.base import BaseAnalyser, moving_weighted_avg_zscore
-from dexter.models import db, Document, DocumentSource, Person, Utterance, Entity
+import numpy
+
+from dexter.analysis.base import BaseAnalyser, DailyCounts, top_k, daily_shares, moving_weighted_avg_zscores
+from dexter.models import db, Document, DocumentSource, Person, Utterance, Entity, PersonDailyStats
+from dexter.minhash import MinHasher, LSHIndex, band_hashes, normalise_words
 
 from sqlalchemy.sql import func, distinct, or_, desc
 from sqlalchemy.orm import joinedload
@@ -25,6 +27,14 @@ class SourceAnalyser(BaseAnalyser):
     Helper that runs analyses on document sources.
     """
 
+    # quotes are short, so they're compared with smaller shingles than
+    # documents; 64 hashes in 16 bands of 4 makes quotes that are 0.7
+    # similar likely candidates
+    QUOTE_SHINGLE_SIZE = 2
+    QUOTE_NUM_PERM = 64
+    QUOTE_BANDS = 16
+    QUOTE_SIMILARITY = 0.7
+
     def __init__(self, doc_ids=None, start_date=None, end_date=None):
         super(SourceAnalyser, self).__init__(doc_ids, start_date, end_date)
         self.top_people = None
@@ -52,35 +62,13 @@ class SourceAnalyser(BaseAnalyser):
                       .options(joinedload(Utterance.document))\
                       .options(joinedload('document.medium'))\
                       .filter(Entity.person_id.in_(ids))\
-                      .filter(Utterance.doc_id.in_(self.doc_ids))\
+                      .filter(self.docs.contains(Utterance.doc_id))\
                       .order_by(Entity.person_id)\
                       .all()
 
         self.person_utterances = {}
         for person_id, group in groupby(utterances, lambda u: u.entity.person_id):
-            for_person = []
-
-            for utterance in group:
-                # are any ones we already have similar?
-                dup = False
-                for au in for_person:
-                    # checking levenshtein similarity is too slow, just see if they
-                    # match directly
-                    if au.quote == utterance.quote:
-                        # it's similar
-                        dup = True
-                        au.count += 1
-                        # collect the documents that have it, one from each medium
-                        if not any(u.document.medium == utterance.document.medium for u in au.utterances):
-                            au.utterances.append(utterance)
-                        break
-
-                if not dup:
-                    au = AnalysedUtterance()
-                    au.quote = utterance.quote
-                    au.count = 1
-                    au.utterances = [utterance]
-                    for_person.append(au)
+            for_person = self.group_utterances(group)
 
             # best first
             for_person.sort(key=lambda au: au.count, reverse=True)
@@ -103,13 +91,63 @@ class SourceAnalyser(BaseAnalyser):
             self.person_utterances[person_id] = for_person
 
 
+    @classmethod
+    def group_utterances(cls, utterances):
+        """ Group +utterances+ that are the same quote, and return a list of
+        `AnalysedUtterance` instances, one for each group.
+
+        Quotes are the same if their words are the same, ignoring case and
+        punctuation, or if their MinHash signatures estimate that they're
+        at least QUOTE_SIMILARITY similar, such as a quote that has been
+        reworded slightly by another medium. Each group's signature goes into
+        an LSH index, so an utterance is only compared with the few groups
+        that share a band with it.
+        """
+        hasher = MinHasher(num_perm=cls.QUOTE_NUM_PERM)
+        index = LSHIndex(bands=cls.QUOTE_BANDS)
+        # normalised quote -> AnalysedUtterance
+        exact = {}
+        grouped = []
+
+        for utterance in utterances:
+            words = normalise_words(utterance.quote or '')
+            key = ' '.join(words)
+            au = exact.get(key)
+
+            if au is None:
+                sig = hasher.text_signature(key, cls.QUOTE_SHINGLE_SIZE)
+                hashes = band_hashes(sig, cls.QUOTE_BANDS)
+                matches = index.query(sig, cls.QUOTE_SIMILARITY, hashes)
+                if matches:
+                    # the earliest group that is similar
+                    au = grouped[min(matches)]
+                    exact[key] = au
+
+            if au is not None:
+                au.count += 1
+                # collect the documents that have it, one from each medium
+                if not any(u.document.medium == utterance.document.medium for u in au.utterances):
+                    au.utterances.append(utterance)
+            else:
+                au = AnalysedUtterance()
+                au.quote = utterance.quote
+                au.count = 1
+                au.utterances = [utterance]
+
+                index.add(len(grouped), sig, hashes)
+                exact[key] = au
+                grouped.append(au)
+
+        return grouped
+
+
     def load_people_sources(self):
         """
         Load all people source data for this period.
         """
         rows = db.session.query(distinct(DocumentSource.person_id))\
                 .filter(
-                        DocumentSource.doc_id.in_(self.doc_ids),
+                        self.docs.contains(DocumentSource.doc_id),
                         DocumentSource.person_id != None)\
                 .group_by(DocumentSource.person_id)\
                 .all()
@@ -123,57 +161,34 @@ class SourceAnalyser(BaseAnalyser):
         utterance_count = self.count_utterances(self.people.keys())
         source_counts = self.source_frequencies(self.people.keys())
 
-        self.analysed_people = {}
-        for pid, person in self.people.iteritems():
+        totals = source_counts.totals()
+        shares = source_counts.shares()
+        trends = source_counts.trends(0.8)
+        biggest = max(totals.max(), 1) if len(totals) else 1
+
+        analysed = []
+        for i, pid in enumerate(source_counts.ids):
             src = AnalysedSource()
-            src.person = person
-
-            src.utterance_count = utterance_count.get(src.person.id, 0)
-            src.source_counts = source_counts[src.person.id]
-            src.source_counts_total = sum(src.source_counts)
-
-            self.analysed_people[pid] = src
-
-        # normalize by total counts per day
-        totals = [0] * (self.days+1)
-
-        # first count per-day totals
-        for src in self.analysed_people.itervalues():
-            for i, n in enumerate(src.source_counts):
-                totals[i] += n
-
-        # normalize
-        for src in self.analysed_people.itervalues():
-            for i, n in enumerate(src.source_counts):
-                if totals[i] == 0:
-                    src.source_counts[i] = 0
-                else:
-                    src.source_counts[i] = 100.0 * n / totals[i]
-
-        # calculate trends
-        # normalise source counts
-        if self.analysed_people:
-            biggest = max(src.source_counts_total for src in self.analysed_people.itervalues())
-            for src in self.analysed_people.itervalues():
-                src.source_counts_trend = moving_weighted_avg_zscore(src.source_counts, 0.8)
-                src.source_counts_normalised = src.source_counts_total * 1.0 / biggest
+            src.person = self.people[pid]
 
-        # top 20 sources
-        self.top_people = sorted(
-                self.analysed_people.itervalues(),
-                key=lambda s: s.source_counts_total, reverse=True)[:20]
+            src.utterance_count = utterance_count.get(pid, 0)
+            src.source_counts = shares[i].tolist()
+            src.source_counts_total = int(totals[i])
+            src.source_counts_trend = float(trends[i])
+            src.source_counts_normalised = float(totals[i] / biggest)
 
-        # trends
-        trending = sorted(
-                self.analysed_people.itervalues(),
-                key=lambda s: s.source_counts_trend)
+            analysed.append(src)
+
+        self.analysed_people = dict((src.person.id, src) for src in analysed)
+
+        # top 20 sources
+        self.top_people = [analysed[i] for i in top_k(totals, 20)]
 
         # top 10 trending up, most trending first
-        self.people_trending_up = [s for s in trending[-10:] if s.source_counts_trend > self.TREND_UP]
-        self.people_trending_up.reverse()
+        self.people_trending_up = [analysed[i] for i in top_k(trends, 10) if trends[i] > self.TREND_UP]
 
         # top 10 trending down, most trending first
-        self.people_trending_down = [s for s in trending[:10] if s.source_counts_trend < self.TREND_DOWN]
+        self.people_trending_down = [analysed[i] for i in top_k(-trends, 10) if trends[i] < self.TREND_DOWN]
 
 
     def count_utterances(self, ids):
@@ -187,7 +202,7 @@ class SourceAnalyser(BaseAnalyser):
                 )\
                 .join(Entity, Entity.person_id == Person.id)\
                 .join(Utterance, Utterance.entity_id == Entity.id)\
-                .filter(Utterance.doc_id.in_(self.doc_ids))\
+                .filter(self.docs.contains(Utterance.doc_id))\
                 .filter(Person.id.in_(ids))\
                 .group_by(Person.id)\
                 .all()
@@ -197,31 +212,22 @@ class SourceAnalyser(BaseAnalyser):
 
     def source_frequencies(self, ids):
         """
-        Return dict from person ID to a list of how frequently each
-        source was used per day, over the period.
+        Return a DailyCounts of how frequently each of the people
+        in +ids+ was used as a source per day, over the period.
         """
         rows = db.session.query(
                     DocumentSource.person_id,
-                    func.date_format(Document.published_at, '%Y-%m-%d').label('date'),
+                    self.day_index(Document.published_at).label('day'),
                     func.count(1).label('count')
                 )\
                 .join(Document, DocumentSource.doc_id == Document.id)\
-                .filter(DocumentSource.person_id.in_(ids))\
-                .filter(DocumentSource.doc_id.in_(self.doc_ids))\
-                .group_by(DocumentSource.person_id, 'date')\
-                .order_by(DocumentSource.person_id, Document.published_at)\
+                .filter(DocumentSource.person_id != None)\
+                .filter(self.docs.contains(DocumentSource.doc_id))\
+                .group_by(DocumentSource.person_id, 'day')\
                 .all()
 
-        freqs = {}
-        for person_id, group in groupby(rows, lambda r: r[0]):
-            freqs[person_id] = [0] * (self.days+1)
-
-            # set day buckets based on date
-            for row in group:
-                d, n = parse(row[1]).date(), row[2]
-                day = (d - self.start_date).days
-                freqs[person_id][day] = n
-
+        freqs = DailyCounts(ids, self.days+1)
+        freqs.add(rows)
         return freqs
 
 
@@ -236,7 +242,7 @@ class SourceAnalyser(BaseAnalyser):
                 )\
                 .join(Person, Person.id == DocumentSource.person_id)\
                 .filter(DocumentSource.person_id != None)\
-                .filter(DocumentSource.doc_id.in_(self.doc_ids))\
+                .filter(self.docs.contains(DocumentSource.doc_id))\
                 .filter(or_(
                     Person.race_id == None,
                     Person.gender_id == None,
@@ -247,3 +253,58 @@ class SourceAnalyser(BaseAnalyser):
                 .all()
 
         return self._lookup_people([r[0] for r in rows]).values()
+
+
+def analyse_person_sources(person, start_date, end_date, filters=()):
+    """
+    Analyse how +person+ was used as a source between +start_date+ and +end_date+,
+    from the per-person daily statistics rather than by analysing all the documents.
+    +filters+ are extra conditions on PersonDailyStats, such as the country.
+
+    Returns an AnalysedSource like those of SourceAnalyser, or None if the person
+    wasn't a source in the period.
+    """
+    days = max((end_date - start_date).days, 1)
+    day = func.datediff(PersonDailyStats.date, start_date)
+
+    def query(*cols):
+        return db.session.query(*cols)\
+            .filter(PersonDailyStats.date >= start_date)\
+            .filter(PersonDailyStats.date <= end_date)\
+            .filter(*filters)
+
+    person_rows = query(day, func.sum(PersonDailyStats.source_count), func.sum(PersonDailyStats.utterance_count))\
+        .filter(PersonDailyStats.person_id == person.id)\
+        .group_by(PersonDailyStats.date)\
+        .all()
+
+    counts = numpy.zeros(days+1)
+    for i, n, _ in person_rows:
+        counts[i] = n
+
+    if not counts.any():
+        return None
+
+    # total sources for all people, per day
+    day_totals = numpy.zeros(days+1)
+    for i, n in query(day, func.sum(PersonDailyStats.source_count)).group_by(PersonDailyStats.date):
+        day_totals[i] = n
+
+    # the biggest total for any one person
+    totals = query(func.sum(PersonDailyStats.source_count).label('total'))\
+        .group_by(PersonDailyStats.person_id)\
+        .subquery()
+    biggest = db.session.query(func.max(totals.c.total)).scalar()
+
+    # the person's share of each day's sources
+    shares = daily_shares([counts], day_totals)[0]
+
+    src = AnalysedSource()
+    src.person = person
+    src.utterance_count = int(sum(r[2] for r in person_rows))
+    src.source_counts = shares.tolist()
+    src.source_counts_total = int(counts.sum())
+    src.source_counts_trend = float(moving_weighted_avg_zscores([shares], 0.8)[0])
+    src.source_counts_normalised = src.source_counts_total * 1.0 / max(int(biggest or 0), 1)
+
+    return src
@@ -0,0 +1,288 @@
+import logging
+from io import BytesIO
+from datetime import datetime
+
+import numpy
+
+from dexter.models import db, Document, DocumentSet, TopicModel, DocumentTopic
+
+log = logging.getLogger(__name__)
+
+
+def dirichlet_expectation(alpha):
+    """
+    E[log(theta)] for theta ~ Dir(alpha), for each row of +alpha+.
+    """
+    from scipy.special import psi
+
+    if alpha.ndim == 1:
+        return psi(alpha) - psi(numpy.sum(alpha))
+    return psi(alpha) - psi(numpy.sum(alpha, axis=1))[:, numpy.newaxis]
+
+
+def dirichlet_expectation_cols(lambda_, cols):
+    """
+    `dirichlet_expectation` for the +cols+ of each row of +lambda_+,
+    without calculating it for the other columns.
+    """
+    from scipy.special import psi
+
+    return psi(lambda_[:, cols]) - psi(numpy.sum(lambda_, axis=1))[:, numpy.newaxis]
+
+
+class OnlineLDA(object):
+    """
+    Latent Dirichlet allocation fitted with online variational Bayes
+    (Hoffman, Blei and Bach, 2010), so that the model can be updated with
+    a batch of new documents at a time instead of being fitted from scratch.
+
+    The features are entity ids. The vocabulary grows as new entities are
+    seen, and a batch of documents is given as a sparse matrix with the
+    ids of the entities for its columns.
+
+    See also: https://github.com/blei-lab/onlineldavb
+    """
+
+    def __init__(self, n_topics=50, alpha=None, eta=None, tau0=64.0, kappa=0.7, random_state=1):
+        self.n_topics = n_topics
+        # priors on document-topic and topic-entity weights
+        self.alpha = alpha or 1.0 / n_topics
+        self.eta = eta or 1.0 / n_topics
+        # learning rate is (tau0 + updates) ^ -kappa
+        self.tau0 = tau0
+        self.kappa = kappa
+        self.updates = 0
+
+        self.random = numpy.random.RandomState(random_state)
+
+        # sorted entity ids, and the variational topic-entity weights for each
+        self.vocab = numpy.zeros(0, dtype=int)
+        self.lambda_ = numpy.zeros((n_topics, 0))
+
+    @property
+    def components_(self):
+        """ Topic-entity weights, normalised so that each topic sums to 1. """
+        return self.lambda_ / self.lambda_.sum(axis=1)[:, numpy.newaxis]
+
+    def partial_fit(self, data, entity_ids, total_docs):
+        """
+        Update the model with a batch of documents.
+
+        :param data: sparse document-by-entity matrix of counts
+        :param entity_ids: entity ids of the columns of +data+
+        :param total_docs: the (estimated) total number of documents
+                           the model is fitted to
+        :return: the topic weights of each document in the batch
+        """
+        self._add_vocab(entity_ids)
+        cols = numpy.searchsorted(self.vocab, entity_ids)
+
+        gamma, sstats = self._e_step(data, cols)
+
+        rho = (self.tau0 + self.updates) ** -self.kappa
+        self.lambda_ *= 1 - rho
+        self.lambda_ += rho * self.eta
+        self.lambda_[:, cols] += rho * float(total_docs) / data.shape[0] * sstats
+        self.updates += 1
+
+        return self._normalise(gamma)
+
+    def transform(self, data, entity_ids):
+        """
+        The topic weights of each document in +data+, a sparse
+        document-by-entity matrix of counts, without updating the model.
+        Entities the model hasn't seen are ignored.
+        """
+        entity_ids = numpy.asarray(entity_ids, dtype=int)
+        known = numpy.in1d(entity_ids, self.vocab)
+
+        data = data.tocsc()[:, numpy.flatnonzero(known)]
+        cols = numpy.searchsorted(self.vocab, entity_ids[known])
+
+        gamma, _ = self._e_step(data, cols)
+        return self._normalise(gamma)
+
+    def _add_vocab(self, entity_ids):
+        new = numpy.setdiff1d(entity_ids, self.vocab)
+        if not len(new):
+            return
+
+        vocab = numpy.concatenate([self.vocab, new])
+        order = numpy.argsort(vocab, kind='mergesort')
+
+        # new entities start off like a freshly initialised model
+        fresh = self.random.gamma(100.0, 1.0 / 100.0, (self.n_topics, len(new)))
+        self.lambda_ = numpy.hstack([self.lambda_, fresh])[:, order]
+        self.vocab = vocab[order]
+
+    def _e_step(self, data, cols, max_iter=100, tolerance=1e-3):
+        """
+        Find the variational topic weights (gamma) for the documents
+        in +data+, whose columns are the +cols+ of the model, and the
+        sufficient statistics for updating those columns of lambda.
+        """
+        data = data.tocsr()
+        n_docs = data.shape[0]
+
+        # only calculate E[log beta] for the entities in this batch
+        elog_beta = dirichlet_expectation_cols(self.lambda_, cols)
+        exp_elog_beta = numpy.exp(elog_beta)
+
+        gamma = self.random.gamma(100.0, 1.0 / 100.0, (n_docs, self.n_topics))
+        sstats = numpy.zeros((self.n_topics, len(cols)))
+
+        for d in xrange(n_docs):
+            start, end = data.indptr[d], data.indptr[d + 1]
+            ids = data.indices[start:end]
+            counts = data.data[start:end].astype(float)
+            if not len(ids):
+                gamma[d] = self.alpha
+                continue
+
+            gamma_d = gamma[d]
+            exp_elog_theta_d = numpy.exp(dirichlet_expectation(gamma_d))
+            exp_elog_beta_d = exp_elog_beta[:, ids]
+            phinorm = numpy.dot(exp_elog_theta_d, exp_elog_beta_d) + 1e-100
+
+            for i in xrange(max_iter):
+                last_gamma = gamma_d
+                gamma_d = self.alpha + exp_elog_theta_d * numpy.dot(counts / phinorm, exp_elog_beta_d.T)
+                exp_elog_theta_d = numpy.exp(dirichlet_expectation(gamma_d))
+                phinorm = numpy.dot(exp_elog_theta_d, exp_elog_beta_d) + 1e-100
+
+                if numpy.mean(numpy.abs(gamma_d - last_gamma)) < tolerance:
+                    break
+
+            gamma[d] = gamma_d
+            sstats[:, ids] += numpy.outer(exp_elog_theta_d, counts / phinorm)
+
+        sstats *= exp_elog_beta
+        return gamma, sstats
+
+    def _normalise(self, gamma):
+        return gamma / gamma.sum(axis=1)[:, numpy.newaxis]
+
+    def dumps(self):
+        """ Serialise the model as a string. """
+        buf = BytesIO()
+        numpy.savez_compressed(buf, vocab=self.vocab, lambda_=self.lambda_,
+                               params=numpy.array([self.n_topics, self.alpha, self.eta,
+                                                   self.tau0, self.kappa, self.updates]))
+        return buf.getvalue()
+
+    @classmethod
+    def loads(cls, data):
+        """ Load a model serialised with `dumps`. """
+        arrays = numpy.load(BytesIO(data))
+        n_topics, alpha, eta, tau0, kappa, updates = arrays['params']
+
+        model = cls(int(n_topics), alpha, eta, tau0, kappa)
+        model.updates = int(updates)
+        model.vocab = arrays['vocab']
+        model.lambda_ = arrays['lambda_']
+        return model
+
+
+def update_topic_model(batch_size=1000, rebuild=False):
+    """
+    Update the current topic model with the documents added since it was
+    last updated, and assign topics to them. If there is no model, or
+    +rebuild+ is True, a new model is fitted to all the documents.
+
+    This commits the transaction after each batch.
+    """
+    from .topics import entity_matrix
+
+    # forget models that were abandoned part way through being fitted
+    TopicModel.query.filter(TopicModel.trained_until == None).delete(synchronize_session=False)  # noqa
+
+    old = TopicModel.current()
+    topic_model = None if rebuild else old
+    if topic_model is None:
+        topic_model = TopicModel()
+        topic_model.n_topics = TopicModel.N_TOPICS
+        topic_model.n_documents = 0
+        lda = OnlineLDA(topic_model.n_topics)
+    else:
+        lda = topic_model.load()
+
+    # the model's id is needed for assigning topics
+    db.session.add(topic_model)
+    db.session.commit()
+
+    until = datetime.utcnow()
+    query = db.session.query(Document.id).filter(Document.created_at < until)
+    if topic_model.trained_until:
+        query = query.filter(Document.created_at >= topic_model.trained_until)
+    doc_ids = sorted(r[0] for r in query)
+
+    total_docs = db.session.query(Document.id).filter(Document.created_at < until).count()
+    log.info("Updating topic model %s with %d documents" % (topic_model.id, len(doc_ids)))
+
+    for i in xrange(0, len(doc_ids), batch_size):
+        batch, entity_ids, matrix = entity_matrix(DocumentSet(ids=doc_ids[i:i + batch_size]))
+        weights = lda.partial_fit(matrix, entity_ids, total_docs)
+        topic_model.n_documents += len(batch)
+
+        # if we fail part way, the documents will be assigned
+        # topics again the next time the model is updated
+        store_topics(topic_model, batch, weights)
+        db.session.commit()
+
+    topic_model.save(lda)
+    topic_model.trained_until = until
+
+    if old and old is not topic_model:
+        # the new model replaces the old one and its assignments
+        db.session.delete(old)
+
+    db.session.commit()
+    log.info("Updated topic model %s" % topic_model.id)
+
+    return topic_model
+
+
+def assign_topics(doc_ids):
+    """
+    Assign topics to these documents, using the current topic model.
+    The model isn't updated. This does NOT commit the transaction.
+    """
+    from .topics import entity_matrix
+
+    topic_model = TopicModel.current()
+    if topic_model is None:
+        return
+
+    batch, entity_ids, matrix = entity_matrix(DocumentSet(ids=doc_ids))
+    if not len(batch):
+        return
+
+    weights = topic_model.load().transform(matrix, entity_ids)
+    store_topics(topic_model, batch, weights)
+
+
+def store_topics(topic_model, doc_ids, weights):
+    """
+    Replace the topics assigned to +doc_ids+ by +topic_model+ with those in
+    +weights+, a matrix of topic weights for each document. Only topics with
+    at least DocumentTopic.MIN_WEIGHT are kept.
+    """
+    doc_ids = [int(i) for i in doc_ids]
+
+    DocumentTopic.query\
+        .filter(DocumentTopic.topic_model_id == topic_model.id)\
+        .filter(DocumentTopic.doc_id.in_(doc_ids))\
+        .delete(synchronize_session=False)
+
+    rows = []
+    for doc_id, w in zip(doc_ids, weights):
+        for topic in numpy.flatnonzero(w >= DocumentTopic.MIN_WEIGHT):
+            rows.append({
+                'doc_id': doc_id,
+                'topic_model_id': topic_model.id,
+                'topic': int(topic),
+                'weight': float(w[topic]),
+            })
+
+    if rows:
+        db.session.execute(DocumentTopic.__table__.insert(), rows)
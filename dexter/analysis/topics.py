@@ -1,13 +1,45 @@
 import collections
 import math
-from itertools import groupby
-from dateutil.parser import parse
 
-from dexter.analysis.base import BaseAnalyser, moving_weighted_avg_zscore
-from dexter.models import db, Document, DocumentEntity, Entity, Cluster, ClusteredDocument
+from dexter.analysis.base import BaseAnalyser, DailyCounts, moving_weighted_avg_zscore, top_k
+from dexter.models import db, Document, DocumentEntity, Entity, Cluster, ClusteredDocument, Medium, TopicModel, DocumentTopic, \
+    Feature, DocumentFeatures
 
 from sqlalchemy.sql import func, distinct
-from sqlalchemy.orm import subqueryload
+
+
+def entity_matrix(docs):
+    """
+    The entities mentioned in +docs+, a DocumentSet, as a sparse
+    document-by-entity matrix of mention counts.
+
+    This is read from the documents' stored feature vectors, keeping
+    only the entity features, so memory scales with the number of
+    mentions rather than documents times entities.
+
+    :return: (doc_ids, entity_ids, matrix) where +matrix+ is a
+             scipy CSR matrix of integer counts, whose rows are for the
+             sorted +doc_ids+ and whose columns are for the sorted
+             +entity_ids+.
+    """
+    import numpy
+
+    doc_ids, feature_ids, matrix = DocumentFeatures.matrix(docs)
+
+    entities = {}
+    if len(feature_ids):
+        entities = dict(db.session.query(Feature.id, Feature.entity_id)
+                        .filter(Feature.id.in_(feature_ids.tolist()))
+                        .filter(Feature.entity_id != None))  # noqa
+
+    cols = numpy.array([i for i, f in enumerate(feature_ids) if f in entities], dtype=int)
+    entity_ids = numpy.array([entities[f] for f in feature_ids[cols]], dtype=int)
+    order = numpy.argsort(entity_ids)
+
+    matrix = matrix.tocsc()[:, cols[order]].tocsr()
+    matrix.data = numpy.rint(matrix.data)
+
+    return doc_ids, entity_ids[order], matrix.astype(int)
 
 
 class AnalysedMention(object):
@@ -23,11 +55,46 @@ class TopicAnalyser(BaseAnalyser):
     Helper that runs analyses on document topics.
     """
 
+    # LDA sampler iterations
+    LDA_ITERATIONS = 200
+    # LDA random seed, so that clustering is repeatable
+    LDA_RANDOM_STATE = 1
+    # topics with this score or lower are ignored
+    TOPIC_SCORE_THRESHOLD = 0.6
+    # the topic model to use: 'online' to use the topics assigned by the
+    # daily TopicModel, or a key of TOPIC_MODELS to cluster on demand
+    TOPIC_MODEL = 'online'
+
     def __init__(self, doc_ids=None, start_date=None, end_date=None):
         super(TopicAnalyser, self).__init__(doc_ids, start_date, end_date)
         self.top_people = None
         self.clustered_topics = None
-        self.topic_score_threshold = 0.6
+        self.topic_score_threshold = self.TOPIC_SCORE_THRESHOLD
+
+    @classmethod
+    def clustering_params(cls):
+        """
+        The parameters that affect the topics found by `find_topics`,
+        as a dict. Clusterings of the same documents with the same
+        parameters are reused.
+        """
+        return {
+            'model': cls.clustering_model(),
+            'n_iter': cls.LDA_ITERATIONS,
+            'random_state': cls.LDA_RANDOM_STATE,
+            'threshold': cls.TOPIC_SCORE_THRESHOLD,
+        }
+
+    @classmethod
+    def clustering_model(cls):
+        """ The key of TOPIC_MODELS that `find_topics` uses. """
+        return cls.TOPIC_MODEL if cls.TOPIC_MODEL in cls.TOPIC_MODELS else 'lda'
+
+    @classmethod
+    def uses_stored_topics(cls):
+        """ Should topics be found with `find_stored_topics`, rather
+        than by clustering with `find_topics`? """
+        return cls.TOPIC_MODEL == 'online' and TopicModel.current() is not None
 
     def find_top_people(self):
         self._load_people_mentions()
@@ -41,13 +108,59 @@ class TopicAnalyser(BaseAnalyser):
             for t in self.clustered_topics:
                 db.session.add(t)
 
+    def dump_topics(self):
+        """
+        The topics found by `find_topics`, as a list of dicts that can be
+        stored as json and later given to `load_topics`. The clusters must
+        have been saved and flushed, so that they have ids.
+        """
+        return [{
+            'cluster_id': t.id,
+            'score': float(t.score),
+            'stars': int(t.stars),
+            'features': [[f, float(w)] for f, w in t.features],
+            'media_counts': [[m.id, n] for m, n in t.media_counts],
+            'histogram': [float(h) for h in t.histogram],
+            'trend': float(t.trend),
+        } for t in self.clustered_topics]
+
+    def load_topics(self, topics):
+        """
+        Load topics previously found by `find_topics` and dumped
+        with `dump_topics`, into `clustered_topics`.
+        """
+        clusters = {}
+        ids = [t['cluster_id'] for t in topics]
+        if ids:
+            clusters = dict((c.id, c) for c in Cluster.query.filter(Cluster.id.in_(ids)))
+
+        media = {}
+        medium_ids = set(m for t in topics for m, n in t['media_counts'])
+        if medium_ids:
+            media = dict((m.id, m) for m in Medium.query.filter(Medium.id.in_(medium_ids)))
+
+        self.clustered_topics = []
+        for t in topics:
+            cluster = clusters.get(t['cluster_id'])
+            if cluster is None:
+                continue
+
+            cluster.score = t['score']
+            cluster.stars = t['stars']
+            cluster.features = [tuple(f) for f in t['features']]
+            cluster.media_counts = [(media[m], n) for m, n in t['media_counts'] if m in media]
+            cluster.histogram = t['histogram']
+            cluster.trend = t['trend']
+
+            self.clustered_topics.append(cluster)
+
     def _load_people_mentions(self):
         """
         Load all people mentions data for this period.
         """
         rows = db.session.query(distinct(Entity.person_id))\
                 .filter(
-                        DocumentEntity.doc_id.in_(self.doc_ids),
+                        self.docs.contains(DocumentEntity.doc_id),
                         Entity.person_id != None)\
                 .join(DocumentEntity, DocumentEntity.entity_id == Entity.id)\
                 .all()
@@ -59,89 +172,65 @@ class TopicAnalyser(BaseAnalyser):
         """
         mention_counts = self.mention_frequencies(self.people.keys())
 
-        self.analysed_people = {}
-        for pid, person in self.people.iteritems():
-            mention = AnalysedMention()
-            mention.person = person
-            mention.mention_counts = mention_counts[pid]
-            mention.mention_counts_total = sum(mention.mention_counts)
-            self.analysed_people[pid] = mention
-
-        # normalize by total counts per day
-        totals = [0] * (self.days+1)
-
-        # first count per-day totals
-        for topic in self.analysed_people.itervalues():
-            for i, n in enumerate(topic.mention_counts):
-                totals[i] += n
+        totals = mention_counts.totals()
+        shares = mention_counts.shares()
+        trends = mention_counts.trends(0.8)
 
-        # normalize
-        for topic in self.analysed_people.itervalues():
-            for i, n in enumerate(topic.mention_counts):
-                if totals[i] == 0:
-                    topic.mention_counts[i] = 0
-                else:
-                    topic.mention_counts[i] = 100.0 * n / totals[i]
-
-        # calculate trends
-        for topic in self.analysed_people.itervalues():
-            topic.mention_counts_trend = moving_weighted_avg_zscore(topic.mention_counts, 0.8)
+        analysed = []
+        for i, pid in enumerate(mention_counts.ids):
+            mention = AnalysedMention()
+            mention.person = self.people[pid]
+            mention.mention_counts = shares[i].tolist()
+            mention.mention_counts_total = int(totals[i])
+            mention.mention_counts_trend = float(trends[i])
+            analysed.append(mention)
 
+        self.analysed_people = dict((m.person.id, m) for m in analysed)
 
         # top 20 sources
-        self.top_people = sorted(
-                self.analysed_people.itervalues(),
-                key=lambda s: s.mention_counts_total, reverse=True)[:20]
-
-        # trends
-        trending = sorted(
-                self.analysed_people.itervalues(),
-                key=lambda s: s.mention_counts_trend)
+        self.top_people = [analysed[i] for i in top_k(totals, 20)]
 
         # top 10 trending up, most trending first
-        self.people_trending_up = [s for s in trending[-10:] if s.mention_counts_trend > self.TREND_UP]
-        self.people_trending_up.reverse()
+        self.people_trending_up = [analysed[i] for i in top_k(trends, 10) if trends[i] > self.TREND_UP]
 
         # top 10 trending down, most trending first
-        self.people_trending_down = [s for s in trending[:10] if s.mention_counts_trend < self.TREND_DOWN]
+        self.people_trending_down = [analysed[i] for i in top_k(-trends, 10) if trends[i] < self.TREND_DOWN]
 
     def mention_frequencies(self, ids):
         """
-        Return dict from person ID to a list of how frequently each
-        person was mentioned per day, over the period.
+        Return a DailyCounts of how frequently each of the people
+        in +ids+ was mentioned per day, over the period.
         """
         rows = db.session.query(
                     Entity.person_id,
-                    func.date_format(Document.published_at, '%Y-%m-%d').label('date'),
+                    self.day_index(Document.published_at).label('day'),
                     func.count(distinct(DocumentEntity.doc_id)).label('count')
                 ) \
                 .join(DocumentEntity, Entity.id == DocumentEntity.entity_id) \
                 .join(Document, DocumentEntity.doc_id == Document.id) \
-                .filter(Entity.person_id.in_(ids))\
-                .filter(DocumentEntity.doc_id.in_(self.doc_ids))\
-                .group_by(Entity.person_id, 'date')\
-                .order_by(Entity.person_id, Document.published_at)\
+                .filter(Entity.person_id != None)\
+                .filter(self.docs.contains(DocumentEntity.doc_id))\
+                .group_by(Entity.person_id, 'day')\
                 .all()
 
-        freqs = {}
-        for person_id, group in groupby(rows, lambda r: r[0]):
-            freqs[person_id] = [0] * (self.days+1)
-
-            # set day buckets based on date
-            for row in group:
-                d, n = parse(row[1]).date(), row[2]
-                day = (d - self.start_date).days
-                freqs[person_id][day] = n
-
+        freqs = DailyCounts(ids, self.days+1)
+        freqs.add(rows)
         return freqs
 
+    def entity_matrix(self):
+        """
+        The entities mentioned in these documents, see `entity_matrix`.
+        """
+        return entity_matrix(self.docs)
+
     def find_topics(self):
         """
         Run clustering on these documents and identify common topics.
 
-        We use latent Dirichlet allocation (LDA) to cluster the documents
-        into an arbitrary number of clusters. We then find the strongest
-        clusters and pull representative documents for each cluster.
+        We use a topic model, latent Dirichlet allocation (LDA) by default,
+        to cluster the documents into an arbitrary number of clusters.
+        We then find the strongest clusters and pull representative documents
+        for each cluster.
 
         Clustering is based on the people and entities mentioned in the documents,
         rather than raw text. This is based on the assumption that Opencalais and
@@ -153,106 +242,201 @@ class TopicAnalyser(BaseAnalyser):
 
         See also: https://github.com/ariddell/lda
         """
-        from sklearn.feature_extraction import DictVectorizer
         import numpy
 
         # TODO: factor people into cluster calcs
 
         self.clustered_topics = []
 
-        # load documents and their entities
-        docs = Document.query\
-            .options(subqueryload('entities'),
-                     subqueryload('medium'))\
-            .filter(Document.id.in_(self.doc_ids))\
-            .all()
-
-        if not docs:
+        doc_ids, entity_ids, matrix = self.entity_matrix()
+        if not len(doc_ids):
             return
 
         # guess at the number of topics, between 1 and 50
-        n_topics = max(min(50, len(docs)/5), 1)
+        n_topics = max(min(50, len(doc_ids)/5), 1)
 
-        # list of entity maps for each document, from entity name to occurrence count
-        entities = [dict(('%s-%s' % (de.entity.group, de.entity.name), de.count or 1)
-                         for de in d.entities) for d in docs]
-        vec = DictVectorizer(sparse=True)
+        doc_topics, components = self.TOPIC_MODELS[self.clustering_model()](self, matrix, n_topics)
+        del matrix
 
-        # TODO: we should ideally use sparse, but it causes the lda library to fail
-        entity_vector = vec.fit_transform(entities)
-        features = numpy.array(vec.feature_names_)
+        # each document belongs to its highest scoring topic
+        labels = doc_topics.argmax(axis=1)
+        scores = doc_topics[numpy.arange(len(doc_ids)), labels]
+        del doc_topics
 
-        clusters, lda_model = self._run_lda(entity_vector, n_topics)
-        del entity_vector
-        del vec
+        # top 8 entities for each topic as (entity_id, weight) pairs
+        features = {}
+        for i in numpy.unique(labels):
+            indexes = numpy.argsort(components[i])[:-8:-1]
+            features[i] = zip(entity_ids[indexes], components[i][indexes])
+
+        self._make_clusters(doc_ids, labels, scores, features)
+
+    def find_stored_topics(self):
+        """
+        Identify common topics using the topics already assigned to these
+        documents by the current TopicModel, rather than clustering them.
+        The clusters are the same as `find_topics` would produce, and are
+        stored in `clustered_topics`.
+
+        Topic numbers are stable for as long as the model is, so the same topic
+        found on different days is the same cluster of ideas.
+        """
+        import numpy
+
+        self.clustered_topics = []
+
+        topic_model = TopicModel.current()
+        if topic_model is None:
+            return
+
+        rows = db.session.query(DocumentTopic.doc_id, DocumentTopic.topic, DocumentTopic.weight)\
+            .filter(DocumentTopic.topic_model_id == topic_model.id)\
+            .filter(self.docs.contains(DocumentTopic.doc_id))\
+            .all()
+        if not rows:
+            return
+
+        doc_ids = numpy.array([r[0] for r in rows], dtype=int)
+        topics = numpy.array([r[1] for r in rows], dtype=int)
+        weights = numpy.array([r[2] for r in rows], dtype=float)
+        del rows
+
+        # each document belongs to its highest scoring topic
+        order = numpy.lexsort((-weights, doc_ids))
+        first = numpy.concatenate([[True], doc_ids[order][1:] != doc_ids[order][:-1]])
+        best = order[first]
+
+        features = dict((i, [(e, w) for e, w in feats[:8]])
+                        for i, feats in enumerate(topic_model.topic_features()))
+
+        self._make_clusters(doc_ids[best], topics[best], weights[best], features)
+
+    def _make_clusters(self, doc_ids, labels, scores, features):
+        """
+        Build the topic clusters of documents, from the topic +labels+ and
+        +scores+ of each document in +doc_ids+, and a dict from each topic
+        to its top (entity_id, weight) +features+. Only clusters scoring
+        better than the threshold are kept, in `clustered_topics`.
+        """
+        import numpy
+
+        # publication day and medium of each document
+        info = dict((r[0], r[1:]) for r in db.session.query(Document.id, Document.published_at, Document.medium_id)
+                    .filter(self.docs.contains(Document.id)))
+        days = numpy.array([(info[i][0].date() - self.start_date).days for i in doc_ids], dtype=int)
+        medium_ids = numpy.array([info[i][1] for i in doc_ids], dtype=int)
 
         # for normalising histograms
-        day_counts = self.date_histogram(d.published_at for d in docs)
+        day_counts = numpy.bincount([(p.date() - self.start_date).days for p, m in info.itervalues()],
+                                    minlength=self.days+1).tolist()
+        del info
 
-        # generate topic info
-        for i, clustering in clusters.iteritems():
-            # cluster is a list of (doc-index, score) pairs
+        media = dict((m.id, m) for m in Medium.query.all())
+        names = {}
 
-            # sort each cluster to put top-scoring docs first
+        # generate topic info
+        for i in numpy.unique(labels):
+            # indexes of the documents in this cluster, with top-scoring docs first
             # TODO: this isn't great, because scores for each document
             # for the same cluster can't really be compared. We
             # need a better way of doing this.
-            clustering.sort(key=lambda p: p[1], reverse=True)
-            cluster_docs = [docs[p[0]] for p in clustering]
-
-            cluster = Cluster.find_or_create(docs=cluster_docs)
-
-            # top 8 features for this cluster as (feature, weight) pairs
-            indexes = numpy.argsort(lda_model.components_[i])[:-8:-1]
-            cluster.features = zip(features[indexes], lda_model.components_[i][indexes])
+            members = numpy.flatnonzero(labels == i)
+            members = members[numpy.argsort(-scores[members], kind='mergesort')]
 
             # top 20 of each cluster are used to characterize the cluster
-            best = clustering[0:20]
-            cluster.score = numpy.median([p[1] for p in best])
+            score = numpy.median(scores[members[0:20]])
 
             # keep only the clusters with a score > self.topic_score_threshold
-            if cluster.score <= self.topic_score_threshold:
+            if score <= self.topic_score_threshold:
                 continue
 
+            cluster = self._find_or_create_cluster(doc_ids[members])
+            cluster.score = score
+
+            # top features for this cluster as (entity_id, weight) pairs,
+            # which are named below
+            cluster.features = features.get(i, [])
+            names.update((e, None) for e, w in cluster.features)
+
             # score for this cluster as stars, from 0 to 3
             cluster.stars = math.ceil((cluster.score - self.topic_score_threshold) / ((1.0 - self.topic_score_threshold) / 3.0))
 
             # media counts
-            media = dict(collections.Counter([d.medium for d in cluster_docs]))
-            cluster.media_counts = sorted(media.items(), key=lambda p: p[1], reverse=True)
+            counts = collections.Counter(medium_ids[members].tolist())
+            cluster.media_counts = sorted(((media[m], n) for m, n in counts.iteritems()), key=lambda p: p[1], reverse=True)
 
             # publication dates
-            cluster.histogram = self.date_histogram((d.published_at for d in cluster_docs))
+            cluster.histogram = numpy.bincount(days[members], minlength=self.days+1).tolist()
             cluster.trend = moving_weighted_avg_zscore(cluster.histogram)
             cluster.histogram = self.normalise_histogram(cluster.histogram, day_counts)
 
             self.clustered_topics.append(cluster)
 
+        # name the features of the clusters we kept
+        if names:
+            for e in Entity.query.filter(Entity.id.in_([int(e) for e in names])):
+                names[e.id] = '%s-%s' % (e.group, e.name)
+
+        for cluster in self.clustered_topics:
+            cluster.features = [(names[e], w) for e, w in cluster.features if names.get(e)]
+
         # sort clusters by size
         self.clustered_topics.sort(key=lambda t: t.score, reverse=True)
 
+    def _find_or_create_cluster(self, doc_ids):
+        """ Find or create the cluster of these document ids, which are
+        in the order the cluster's documents should be. """
+        cluster = Cluster.query.filter(Cluster.fingerprint == Cluster.make_fingerprint(doc_ids)).first()
+        if cluster is None:
+            docs = dict((d.id, d) for d in Document.query.filter(Document.id.in_(doc_ids.tolist())))
+            cluster = Cluster.find_or_create(docs=[docs[i] for i in doc_ids])
+        return cluster
+
     def _run_lda(self, data, n_topics):
         """
-        Run LDA algorithm.
+        Run the LDA collapsed Gibbs sampler. It works directly on sparse
+        data, as long as it has integer counts.
 
-        :param data: sparse vector of document features
+        :param data: sparse matrix of document features
         :param n_topics: number of topics we want
-        :return: map from topic label (int) to list of (doc-index, score) tuples of documents
-                 in that topic cluster.
+        :return: (doc_topics, components): the topic scores for each document, and
+                 the feature weights for each topic.
         """
         import lda
 
-        lda_model = lda.LDA(n_topics=n_topics, n_iter=200, random_state=1)
+        lda_model = lda.LDA(n_topics=n_topics, n_iter=self.LDA_ITERATIONS, random_state=self.LDA_RANDOM_STATE)
         lda_model.fit(data)
 
-        clusters = collections.defaultdict(list)
-        # doc_topic_ are the per-topic scores for each document
-        for i, scores in enumerate(lda_model.doc_topic_):
-            label = scores.argmax()
-            score = scores[label]
-            clusters[label].append((i, score))
+        return lda_model.doc_topic_, lda_model.components_
+
+    def _run_nmf(self, data, n_topics):
+        """
+        Run non-negative matrix factorisation, which also works on
+        sparse data and is usually quicker than LDA. Each document's
+        topic weights are normalised to sum to one, like LDA's.
+
+        :param data: sparse matrix of document features
+        :param n_topics: number of topics we want
+        :return: (doc_topics, components): the topic scores for each document, and
+                 the feature weights for each topic.
+        """
+        from sklearn.decomposition import NMF
+        import numpy
+
+        nmf_model = NMF(n_components=n_topics, random_state=self.LDA_RANDOM_STATE)
+        doc_topics = nmf_model.fit_transform(data.astype(float))
+
+        totals = doc_topics.sum(axis=1)
+        totals[totals == 0] = 1
+        doc_topics /= totals[:, numpy.newaxis]
+
+        return doc_topics, nmf_model.components_
 
-        return clusters, lda_model
+    # topic models that find_topics can use
+    TOPIC_MODELS = {
+        'lda': _run_lda,
+        'nmf': _run_nmf,
+    }
 
     def date_histogram(self, dates):
         """
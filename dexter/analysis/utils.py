@@ -1,9 +1,10 @@
 from __future__ import division
 
-from collections import defaultdict
 import logging
 import math
 
+import numpy
+
 logger = logging.getLogger(__name__)
 
 def calculate_entropy(table):
@@ -25,60 +26,59 @@ def calculate_entropy(table):
         row_labels.update(d.keys())
     row_labels = list(row_labels)
 
-    col_sums = {}
-    row_sums = defaultdict(int)
-    total = 0
-
-    # sum across all directions
-    for col in col_labels:
-        # sum down column
-        col_sums[col] = sum(table[col].itervalues())
-
-        # sum across row
+    counts = numpy.zeros((len(row_labels), len(col_labels)))
+    rows = dict((label, i) for i, label in enumerate(row_labels))
+    for j, col in enumerate(col_labels):
         for row, n in table[col].iteritems():
-            row_sums[row] += n
-            total += n
-
-    # calculate entropy per column
-    entropy = {}
-    for col in col_labels:
-        col_total = col_sums[col]
-        if col_total == 0:
-            entropy[col] = 0
-            continue
-
-        row_coverage = defaultdict(int)
-        col_coverage = 0
-        for row in row_labels:
-            # how much does this row contribute to the total
-            row_fraction = row_sums[row] / total
-
-            if row_fraction > 0:
-                # the fraction this row contributes to the column,
-                # as a fraction of the total row
-                row_coverage[row] = table[col].get(row, 0) / col_total / row_fraction
-            else:
-                row_coverage[row] = 0
-
-            col_coverage += row_coverage[row]
-
-        k = 1 / col_coverage
-
-        total_p = 0
-        for row in row_labels:
-            p = k * row_coverage[row]
-            if p > 0:
-                p = p * math.log(p)
-            total_p += p
-
-        if len(row_labels) == 1:
-            # avoid 1/0
-            log = 1
-        else:
-            log = 1 / math.log(len(row_labels))
-
-        entropy[col] = -log * total_p
+            counts[rows[row], j] = n
+
+    entropy = dict(zip(col_labels, column_entropy(counts).tolist()))
 
     logger.debug("Done")
 
     return entropy
+
+
+def column_entropy(counts):
+    """ Calculate the entropy of each column of +counts+, a matrix
+    with a row per label and a column per group. See calculate_entropy.
+
+    Returns an array with the entropy of each column.
+    """
+    counts = numpy.asarray(counts, dtype=float)
+    n_rows, n_cols = counts.shape
+    if n_cols == 0:
+        return numpy.zeros(0)
+
+    col_sums = counts.sum(axis=0)
+    row_sums = counts.sum(axis=1)
+    total = counts.sum()
+
+    entropy = numpy.zeros(n_cols)
+    if total == 0:
+        return entropy
+
+    # how much does each row contribute to the total
+    row_fraction = row_sums / total
+
+    # the fraction each row contributes to each column,
+    # as a fraction of the total row
+    safe_col_sums = numpy.where(col_sums == 0, 1, col_sums)
+    safe_row_fraction = numpy.where(row_fraction > 0, row_fraction, 1)
+    coverage = counts / safe_col_sums / safe_row_fraction[:, numpy.newaxis]
+    coverage[row_fraction <= 0, :] = 0
+
+    col_coverage = coverage.sum(axis=0)
+    has_data = col_sums != 0
+
+    p = coverage[:, has_data] / col_coverage[has_data]
+    p_log_p = numpy.where(p > 0, p * numpy.log(numpy.where(p > 0, p, 1)), 0)
+
+    if n_rows == 1:
+        # avoid 1/0
+        log = 1
+    else:
+        log = 1 / math.log(n_rows)
+
+    entropy[has_data] = -log * p_log_p.sum(axis=0)
+    return entropy
@@ -1,8 +1,13 @@
 from collections import OrderedDict, defaultdict
 from itertools import groupby
 
+import sys
+import threading
+import Queue
+import cPickle
+import tempfile
 import xlsxwriter
-import StringIO
+from xlsxwriter.utility import xl_col_to_name
 from datetime import datetime
 from dateutil.parser import parse
 
@@ -10,61 +15,163 @@ from sqlalchemy.sql import func
 from sqlalchemy.types import Integer
 
 from ..analysis import BiasCalculator
-from ..models import Document, AnalysisNature, db
+from ..models import Document, AnalysisNature, Medium, db
 
 
 class XLSXExportBuilder:
+    # number of queries to run at the same time
+    GATHER_THREADS = 4
+
     def __init__(self, form):
         self.form = form
         self.formats = {}
 
         # we use these to filter our queries, rather than trying to pull
         # complex filter logic into our view queries
-        self.doc_ids = form.document_ids()
+        self.docs = form.document_set()
 
-    def build(self):
+    def build(self, progress=None):
         """
-        Generate an Excel spreadsheet and return it as a string.
+        Generate an Excel spreadsheet in a temporary file and return the
+        file, open and at the start. Closing the file deletes it.
+
+        Big exports have hundreds of thousands of rows, so rows are streamed
+        from the database and written in constant memory mode, which keeps
+        only the current row of each worksheet in memory.
+
+        The queries for all the worksheets are run first, in parallel, and
+        then the worksheets are written in order. If given, +progress+ is
+        called with the percent complete as each query and worksheet is done.
         """
-        output = StringIO.StringIO()
-        workbook = xlsxwriter.Workbook(output)
+        # we run dozens of queries over these documents, so keep their ids
+        # in a temporary table rather than re-running the form's query each time
+        with self.docs.materialise():
+            worksheets = [(write, [QueryResult(q) for q in queries()])
+                          for queries, write in self.worksheets()]
+
+            results = [r for write, rs in worksheets for r in rs]
+            self.gather(results, progress and (lambda n: progress(80 * n // len(results))))
 
-        self.formats['date'] = workbook.add_format({'num_format': 'yyyy/mm/dd'})
-        self.formats['bold'] = workbook.add_format({'bold': True})
+            output = tempfile.TemporaryFile()
+            workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
 
-        self.summary_worksheet(workbook)
+            self.formats['date'] = workbook.add_format({'num_format': 'yyyy/mm/dd'})
+            self.formats['bold'] = workbook.add_format({'bold': True})
 
-        self.origin_worksheet(workbook)
-        self.topic_worksheet(workbook)
+            for i, (write, rs) in enumerate(worksheets):
+                write(workbook, *rs)
+                if progress:
+                    progress(80 + 20 * (i + 1) // len(worksheets))
+
+            workbook.close()
+            output.seek(0)
+
+            return output
+
+    def worksheets(self):
+        """
+        The worksheets to write, in order, as (queries, write) pairs of methods.
+        +queries+ returns the queries the worksheet needs, and +write+ writes
+        the worksheet given the workbook and a QueryResult for each query.
+        """
+        worksheets = [
+            (self.summary_queries, self.summary_worksheet),
+            (self.origin_queries, self.origin_worksheet),
+            (self.topic_queries, self.topic_worksheet),
+        ]
 
         if self.form.analysis_nature().nature == AnalysisNature.ELECTIONS:
-            self.bias_worksheet(workbook)
-            self.fairness_worksheet(workbook)
+            worksheets.extend([
+                (self.bias_queries, self.bias_worksheet),
+                (self.fairness_queries, self.fairness_worksheet),
+            ])
 
         if self.form.analysis_nature().nature == AnalysisNature.CHILDREN:
-            self.child_focus_worksheet(workbook)
-            self.child_gender_worksheets(workbook)
-            self.child_race_worksheets(workbook)
-            self.child_context_worksheet(workbook)
-            self.child_victimisation_worksheet(workbook)
-            self.principles_worksheet(workbook)
-            self.children_worksheet(workbook)
-
-        self.documents_worksheet(workbook)
-        self.sources_worksheet(workbook)
-        self.utterances_worksheet(workbook)
-        self.places_worksheet(workbook)
-        self.keywords_worksheet(workbook)
-        self.issues_worksheet(workbook)
-        self.taxonomies_worksheet(workbook)
-        self.everything_worksheet(workbook)
-
-        workbook.close()
-        output.seek(0)
-
-        return output.read()
-
-    def summary_worksheet(self, wb):
+            worksheets.extend([
+                (self.child_focus_queries, self.child_focus_worksheet),
+                (self.child_gender_queries, self.child_gender_worksheets),
+                (self.child_race_queries, self.child_race_worksheets),
+                (self.child_context_queries, self.child_context_worksheet),
+                (self.child_victimisation_queries, self.child_victimisation_worksheet),
+                (self.principles_queries, self.principles_worksheet),
+                (self.children_queries, self.children_worksheet),
+            ])
+
+        worksheets.extend([
+            (self.documents_queries, self.documents_worksheet),
+            (self.sources_queries, self.sources_worksheet),
+            (self.utterances_queries, self.utterances_worksheet),
+            (self.places_queries, self.places_worksheet),
+            (self.keywords_queries, self.keywords_worksheet),
+            (self.issues_queries, self.issues_worksheet),
+            (self.taxonomies_queries, self.taxonomies_worksheet),
+            (self.everything_queries, self.everything_worksheet),
+        ])
+
+        return worksheets
+
+    def gather(self, results, progress=None):
+        """
+        Fetch each of +results+, a list of QueryResult objects, using up to
+        GATHER_THREADS threads. Each thread uses its own pooled connection,
+        with its own copy of the documents' temporary table, filled from
+        ids read once from the original table. If given, +progress+ is
+        called with the number of results fetched so far.
+        """
+        todo = Queue.Queue()
+        for result in results:
+            todo.put(result)
+        done = Queue.Queue()
+
+        # read the ids once, here, because the temporary table belongs to
+        # this thread's connection
+        doc_ids = self.docs.read_ids()
+
+        def work():
+            try:
+                conn = db.engine.connect()
+                try:
+                    self.docs.copy_to(conn, doc_ids)
+                    try:
+                        while True:
+                            try:
+                                result = todo.get_nowait()
+                            except Queue.Empty:
+                                break
+                            result.fetch(conn)
+                            done.put(None)
+                    finally:
+                        self.docs.drop(conn)
+                finally:
+                    conn.close()
+            except:
+                done.put(sys.exc_info())
+
+        threads = [threading.Thread(target=work) for i in xrange(min(self.GATHER_THREADS, len(results)))]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for n in xrange(1, len(results) + 1):
+                error = done.get()
+                if error:
+                    raise error[0], error[1], error[2]
+                if progress:
+                    progress(n)
+        finally:
+            # stop the other threads as soon as they've finished their current query
+            while not todo.empty():
+                try:
+                    todo.get_nowait()
+                except Queue.Empty:
+                    pass
+            for thread in threads:
+                thread.join()
+
+    def summary_queries(self):
+        return [self.filter(db.session.query(func.count(Document.id)))]
+
+    def summary_worksheet(self, wb, count):
         ws = wb.add_worksheet('summary')
 
         ws.write('D1', 'Generated')
@@ -119,115 +226,117 @@ class XLSXExportBuilder:
 
         ws.write('A15', 'Summary', self.formats['bold'])
         ws.write('A16', 'articles')
-        ws.write('B16', self.filter(Document.query).count())
+        ws.write('B16', count.all()[0][0])
 
-    def documents_worksheet(self, wb):
+    def documents_queries(self):
         from dexter.models.views import DocumentsView
 
+        return [self.filter(db.session.query(DocumentsView).join(Document))]
+
+    def documents_worksheet(self, wb, docs):
         ws = wb.add_worksheet('raw_documents')
-        docs = self.filter(db.session.query(DocumentsView).join(Document)).all()
-        self.write_table(ws, 'Documents', docs)
+        self.write_table(ws, docs)
 
-    def sources_worksheet(self, wb):
+    def sources_queries(self):
         from dexter.models.views import DocumentsView, DocumentSourcesView
 
-        ws = wb.add_worksheet('raw_sources')
-
         tables = OrderedDict()
         tables['doc'] = DocumentsView
         tables['source'] = DocumentSourcesView
 
-        rows = self.filter(db.session
-                           .query(*self.merge_views(tables, ['document_id']))
-                           .join(Document)
-                           .join(DocumentSourcesView)).all()
-        self.write_table(ws, 'Sources', rows)
+        return [self.filter(db.session
+                            .query(*self.merge_views(tables, ['document_id']))
+                            .join(Document)
+                            .join(DocumentSourcesView))]
+
+    def sources_worksheet(self, wb, rows):
+        ws = wb.add_worksheet('raw_sources')
+        self.write_table(ws, rows)
 
-    def utterances_worksheet(self, wb):
+    def utterances_queries(self):
         from dexter.models.views import PersonUtterancesView
 
-        ws = wb.add_worksheet('quotations')
+        return [self.filter(db.session.query(PersonUtterancesView).join(Document))]
 
-        rows = self.filter(db.session.query(PersonUtterancesView).join(Document)).all()
-        self.write_table(ws, 'Quotations', rows)
+    def utterances_worksheet(self, wb, rows):
+        ws = wb.add_worksheet('quotations')
+        self.write_table(ws, rows)
 
-    def issues_worksheet(self, wb):
+    def issues_queries(self):
         from dexter.models.views import DocumentsView, DocumentIssuesView
 
-        ws = wb.add_worksheet('issues')
-
         tables = OrderedDict()
         tables['doc'] = DocumentsView
         tables['issues'] = DocumentIssuesView
 
-        rows = self.filter(db.session
-                           .query(*self.merge_views(tables, ['document_id']))
-                           .join(Document)
-                           .join(DocumentIssuesView))\
-                           .filter(DocumentIssuesView.c.issue != None)\
-                           .all()  # noqa
-        self.write_table(ws, 'Issues', rows)
+        return [self.filter(db.session
+                            .query(*self.merge_views(tables, ['document_id']))
+                            .join(Document)
+                            .join(DocumentIssuesView))\
+                            .filter(DocumentIssuesView.c.issue != None)]  # noqa
+
+    def issues_worksheet(self, wb, rows):
+        ws = wb.add_worksheet('issues')
+        self.write_table(ws, rows)
 
-    def keywords_worksheet(self, wb):
+    def keywords_queries(self):
         from dexter.models.views import DocumentKeywordsView
         from dexter.models import DocumentKeyword
 
-        ws = wb.add_worksheet('raw_keywords')
-
         # only get those that are better than the avg relevance
         subq = db.session.query(
             DocumentKeyword.doc_id,
             func.avg(DocumentKeyword.relevance).label('avg'))\
-            .filter(DocumentKeyword.doc_id.in_(self.doc_ids))\
+            .filter(self.docs.contains(DocumentKeyword.doc_id))\
             .group_by(DocumentKeyword.doc_id)\
             .subquery()
 
-        rows = db.session.query(DocumentKeywordsView)\
-            .join(subq, DocumentKeywordsView.c.document_id == subq.columns.doc_id)\
-            .filter(DocumentKeywordsView.c.relevance >= subq.columns.avg)\
-            .all()
+        return [db.session.query(DocumentKeywordsView)
+                .join(subq, DocumentKeywordsView.c.document_id == subq.columns.doc_id)
+                .filter(DocumentKeywordsView.c.relevance >= subq.columns.avg)]
 
-        self.write_table(ws, 'Keywords', rows)
+    def keywords_worksheet(self, wb, rows):
+        ws = wb.add_worksheet('raw_keywords')
+        self.write_table(ws, rows)
 
-    def taxonomies_worksheet(self, wb):
+    def taxonomies_queries(self):
         from dexter.models.views import DocumentTaxonomiesView, DocumentsView
 
-        ws = wb.add_worksheet('raw_taxonomies')
-
         tables = OrderedDict()
         tables['doc'] = DocumentsView
         tables['taxonomies'] = DocumentTaxonomiesView
 
-        rows = self.filter(db.session
-                           .query(*self.merge_views(tables, ['document_id']))
-                           .join(Document)
-                           .join(DocumentTaxonomiesView)
-                           .filter(DocumentTaxonomiesView.c.label != None))\
-                           .all()  # noqa
-        self.write_table(ws, 'Taxonomies', rows)
+        return [self.filter(db.session
+                            .query(*self.merge_views(tables, ['document_id']))
+                            .join(Document)
+                            .join(DocumentTaxonomiesView)
+                            .filter(DocumentTaxonomiesView.c.label != None))]  # noqa
 
-    def fairness_worksheet(self, wb):
-        from dexter.models.views import DocumentsView, DocumentFairnessView
+    def taxonomies_worksheet(self, wb, rows):
+        ws = wb.add_worksheet('raw_taxonomies')
+        self.write_table(ws, rows)
 
-        ws = wb.add_worksheet('fairness')
+    def fairness_queries(self):
+        from dexter.models.views import DocumentsView, DocumentFairnessView
 
         tables = OrderedDict()
         tables['doc'] = DocumentsView
         tables['fairness'] = DocumentFairnessView
 
-        rows = self.filter(db.session
-                           .query(*self.merge_views(tables, ['document_id']))
-                           .join(Document)
-                           .join(DocumentFairnessView)).all()
-        self.write_table(ws, 'Fairness', rows)
+        return [self.filter(db.session
+                            .query(*self.merge_views(tables, ['document_id']))
+                            .join(Document)
+                            .join(DocumentFairnessView))]
 
-    def principles_worksheet(self, wb):
-        from dexter.models.views import DocumentsView, DocumentPrinciplesView
+    def fairness_worksheet(self, wb, rows):
+        ws = wb.add_worksheet('fairness')
+        self.write_table(ws, rows)
 
-        ws = wb.add_worksheet('principles')
+    def principles_queries(self):
+        from dexter.models.views import DocumentsView, DocumentPrinciplesView
 
         # supported
-        rows = self.filter(
+        supported = self.filter(
             db.session.query(
                 DocumentPrinciplesView.c.principle_supported,
                 func.count(1).label('count')
@@ -235,11 +344,10 @@ class XLSXExportBuilder:
             .join(Document)
             .filter(DocumentPrinciplesView.c.principle_supported != None)  # noqa
             .group_by('principle_supported')
-        ).all()
-        rownum = 3 + self.write_table(ws, 'PrincipleSupported', rows)
+        )
 
         # violated
-        rows = self.filter(
+        violated = self.filter(
             db.session.query(
                 DocumentPrinciplesView.c.principle_violated,
                 func.count(1).label('count')
@@ -247,114 +355,121 @@ class XLSXExportBuilder:
             .join(Document)
             .filter(DocumentPrinciplesView.c.principle_violated != None)  # noqa
             .group_by('principle_violated')
-        ).all()
-        self.write_table(ws, 'PrincipleViolated', rows, rownum=rownum)
+        )
 
         # raw data
-        ws = wb.add_worksheet('raw_principles')
-
         tables = OrderedDict()
         tables['doc'] = DocumentsView
         tables['principles'] = DocumentPrinciplesView
 
-        rows = self.filter(
+        raw = self.filter(
             db.session
             .query(*self.merge_views(tables, ['document_id']))
             .join(Document)
-            .join(DocumentPrinciplesView)).all()
-        self.write_table(ws, 'Principles', rows)
+            .join(DocumentPrinciplesView))
 
-    def origin_worksheet(self, wb):
-        from dexter.models.views import DocumentsView
+        return [supported, violated, raw]
 
-        ws = wb.add_worksheet('origins')
+    def principles_worksheet(self, wb, supported, violated, raw):
+        ws = wb.add_worksheet('principles')
+        rownum = 3 + self.write_table(ws, supported)
+        self.write_table(ws, violated, rownum=rownum)
 
-        query = db.session.query(
+        ws = wb.add_worksheet('raw_principles')
+        self.write_table(ws, raw)
+
+    def origin_queries(self):
+        from dexter.models.views import DocumentsView
+
+        origins = db.session.query(
             DocumentsView.c.origin,
             func.count(1).label('count')
         )\
             .join(Document)\
             .group_by('origin')
-        rows = self.filter(query).all()
-        rownum = 3 + self.write_table(ws, 'Origins', rows)
 
-        query = db.session.query(
+        groups = db.session.query(
             DocumentsView.c.origin_group,
             func.count(1).label('count')
         )\
             .join(Document)\
             .group_by('origin_group')
-        rows = self.filter(query).all()
-        self.write_table(ws, 'OriginGroups', rows, rownum=rownum)
 
-    def topic_worksheet(self, wb):
-        from dexter.models.views import DocumentsView
+        return [self.filter(origins), self.filter(groups)]
 
-        ws = wb.add_worksheet('topics')
+    def origin_worksheet(self, wb, origins, groups):
+        ws = wb.add_worksheet('origins')
+        rownum = 3 + self.write_table(ws, origins)
+        self.write_table(ws, groups, rownum=rownum)
+
+    def topic_queries(self):
+        from dexter.models.views import DocumentsView
 
         # topic groups
-        rows = self.filter(
+        groups = self.filter(
             db.session.query(
                 DocumentsView.c.topic_group,
                 func.count(1).label('count')
             )
             .join(Document)
-            .group_by('topic_group')).all()
-        rownum = 3 + self.write_table(ws, 'TopicGroups', rows)
+            .group_by('topic_group'))
 
         # topics
-        rows = self.filter(
+        topics = self.filter(
             db.session.query(
                 DocumentsView.c.topic,
                 func.count(1).label('count')
             )
             .join(Document)
-            .group_by('topic')).all()
-        self.write_table(ws, 'Topics', rows, rownum=rownum)
+            .group_by('topic'))
 
-    def children_worksheet(self, wb):
-        from dexter.models.views import DocumentsView, DocumentChildrenView
+        return [groups, topics]
 
-        ws = wb.add_worksheet('raw_children')
+    def topic_worksheet(self, wb, groups, topics):
+        ws = wb.add_worksheet('topics')
+        rownum = 3 + self.write_table(ws, groups)
+        self.write_table(ws, topics, rownum=rownum)
+
+    def children_queries(self):
+        from dexter.models.views import DocumentsView, DocumentChildrenView
 
         tables = OrderedDict()
         tables['doc'] = DocumentsView
         tables['children'] = DocumentChildrenView
 
-        rows = self.filter(db.session
-                           .query(*self.merge_views(tables, ['document_id']))
-                           .join(Document)
-                           .join(DocumentChildrenView)).all()
-        self.write_table(ws, 'Children', rows)
+        return [self.filter(db.session
+                            .query(*self.merge_views(tables, ['document_id']))
+                            .join(Document)
+                            .join(DocumentChildrenView))]
 
-    def child_victimisation_worksheet(self, wb):
-        from dexter.models.views import DocumentChildrenView
+    def children_worksheet(self, wb, rows):
+        ws = wb.add_worksheet('raw_children')
+        self.write_table(ws, rows)
 
-        ws = wb.add_worksheet('child_secondary_victimisation')
+    def child_victimisation_queries(self):
+        from dexter.models.views import DocumentChildrenView
 
-        rows = self.filter(
+        return [self.filter(
             db.session.query(
                 func.sum(DocumentChildrenView.c.secondary_victim_source == 'secondary-victim-source', type_=Integer).label('secondary_victim_source'),
                 func.sum(DocumentChildrenView.c.secondary_victim_identified == 'secondary-victim-identified', type_=Integer).label('secondary_victim_identified'),
                 func.sum(DocumentChildrenView.c.secondary_victim_victim_of_abuse == 'secondary-victim-abused', type_=Integer).label('secondary_victim_victim_of_abuse'),
                 func.sum(DocumentChildrenView.c.secondary_victim_source_identified_abused == 'secondary-victim-source-identified-abused', type_=Integer).label('secondary_victim_source_identified_abused'),
             )
-            .join(Document)).all()
+            .join(Document))]
+
+    def child_victimisation_worksheet(self, wb, result):
+        rows = result.all()
         if not rows:
             return
 
-        d = rows[0]._asdict()
+        ws = wb.add_worksheet('child_secondary_victimisation')
+
+        d = dict(zip(result.keys, rows[0]))
         data = [[k, d[k]] for k in sorted(d.keys(), key=len)]
-        ws.add_table(0, 0, len(data), 1, {
-            'name': 'ChildSecondaryVictimisation',
-            'data': data,
-            'columns': [
-                {'header': ''},
-                {'header': 'count'},
-            ]
-        })
-
-    def child_focus_worksheet(self, wb):
+        self.write_table(ws, data, keys=['', 'count'])
+
+    def child_focus_queries(self):
         from dexter.models.views import DocumentChildrenView
 
         query = db.session.query(
@@ -363,12 +478,14 @@ class XLSXExportBuilder:
         )\
             .join(Document)\
             .group_by('child_focused')
-        rows = self.filter(query).all()
 
+        return [self.filter(query)]
+
+    def child_focus_worksheet(self, wb, rows):
         ws = wb.add_worksheet('child_focused')
-        self.write_table(ws, 'ChildFocused', rows)
+        self.write_table(ws, rows)
 
-    def child_gender_worksheets(self, wb):
+    def child_gender_queries(self):
         """
         For documents with child sources, give various breakdowns by gender of
         those children. All reports are source focused, providing counts
@@ -377,21 +494,16 @@ class XLSXExportBuilder:
         from dexter.models.views import DocumentsView, DocumentSourcesView
 
         # genders
-        query = db.session.query(
+        genders = db.session.query(
             DocumentSourcesView.c.gender,
             func.count(DocumentSourcesView.c.document_source_id).label('count')
         )\
             .join(Document)\
             .filter(DocumentSourcesView.c.source_type == 'child')\
             .group_by('gender')
-        rows = self.filter(query).all()
-
-        ws = wb.add_worksheet('child_genders')
-        self.write_table(ws, 'ChildGenders', rows)
-        rownum = len(rows) + 4
 
         # topics by gender
-        query = self.filter(
+        topics = self.filter(
             db.session.query(
                 DocumentsView.c.topic_group,
                 DocumentSourcesView.c.gender,
@@ -403,10 +515,8 @@ class XLSXExportBuilder:
             .group_by('topic_group', 'gender')
             .order_by('topic_group'))
 
-        rownum += 3 + self.write_summed_table(ws, 'ChildGenderTopics', query, rownum=rownum)
-
         # origins by gender
-        query = self.filter(
+        origins = self.filter(
             db.session.query(
                 DocumentsView.c.origin,
                 DocumentSourcesView.c.gender,
@@ -418,10 +528,8 @@ class XLSXExportBuilder:
             .group_by('origin', 'gender')
             .order_by('origin'))
 
-        rownum += 3 + self.write_summed_table(ws, 'ChildGenderOrigins', query, rownum=rownum)
-
         # roles by gender
-        query = self.filter(
+        roles = self.filter(
             db.session.query(
                 DocumentSourcesView.c.role,
                 DocumentSourcesView.c.gender,
@@ -432,10 +540,8 @@ class XLSXExportBuilder:
             .group_by('role', 'gender')
             .order_by('role'))
 
-        rownum += 3 + self.write_summed_table(ws, 'ChildGenderRoles', query, rownum=rownum)
-
         # ages by gender
-        query = self.filter(
+        ages = self.filter(
             db.session.query(
                 DocumentSourcesView.c.source_age,
                 DocumentSourcesView.c.gender,
@@ -446,10 +552,8 @@ class XLSXExportBuilder:
             .group_by('source_age', 'gender')
             .order_by('source_age'))
 
-        rownum += 3 + self.write_summed_table(ws, 'ChildGenderAges', query, rownum=rownum)
-
         # quoted-vs-non by gender
-        query = self.filter(
+        quoted = self.filter(
             db.session.query(
                 DocumentSourcesView.c.quoted,
                 DocumentSourcesView.c.gender,
@@ -460,9 +564,16 @@ class XLSXExportBuilder:
             .group_by('quoted', 'gender')
             .order_by('quoted'))
 
-        self.write_summed_table(ws, 'ChildGenderQuoted', query, rownum=rownum)
+        return [self.filter(genders), topics, origins, roles, ages, quoted]
+
+    def child_gender_worksheets(self, wb, genders, *summed):
+        ws = wb.add_worksheet('child_genders')
+        rownum = 3 + self.write_table(ws, genders)
+
+        for result in summed:
+            rownum += 3 + self.write_summed_table(ws, result, rownum=rownum)
 
-    def child_race_worksheets(self, wb):
+    def child_race_queries(self):
         """
         For documents with child sources, give various breakdowns by race of
         those children. All reports are source focused, providing counts
@@ -471,20 +582,17 @@ class XLSXExportBuilder:
         from dexter.models.views import DocumentsView, DocumentSourcesView
 
         # races
-        rows = self.filter(
+        races = self.filter(
             db.session.query(
                 DocumentSourcesView.c.race,
                 func.count(DocumentSourcesView.c.document_source_id).label('count')
             )
             .join(Document)
             .filter(DocumentSourcesView.c.source_type == 'child')
-            .group_by('race')).all()
-
-        ws = wb.add_worksheet('child_races')
-        rownum = 3 + self.write_table(ws, 'ChildRace', rows)
+            .group_by('race'))
 
         # topics by race
-        query = self.filter(
+        topics = self.filter(
             db.session.query(
                 DocumentsView.c.topic_group,
                 DocumentSourcesView.c.race,
@@ -496,12 +604,17 @@ class XLSXExportBuilder:
             .group_by('topic_group', 'race')
             .order_by('topic_group'))
 
-        self.write_summed_table(ws, 'RaceTopics', query, rownum=rownum)
+        return [races, topics]
 
-    def child_context_worksheet(self, wb):
+    def child_race_worksheets(self, wb, races, topics):
+        ws = wb.add_worksheet('child_races')
+        rownum = 3 + self.write_table(ws, races)
+        self.write_summed_table(ws, topics, rownum=rownum)
+
+    def child_context_queries(self):
         from dexter.models.views import DocumentChildrenView
 
-        rows = self.filter(
+        return [self.filter(
             db.session.query(
                 func.sum(DocumentChildrenView.c.basic_context == 'basic-context', type_=Integer).label('basic_context'),
                 func.sum(DocumentChildrenView.c.causes_mentioned == 'causes-mentioned', type_=Integer).label('causes_mentioned'),
@@ -510,26 +623,22 @@ class XLSXExportBuilder:
                 func.sum(DocumentChildrenView.c.relevant_policies == 'relevant-policies', type_=Integer).label('relevant_policies'),
                 func.sum(DocumentChildrenView.c.self_help_offered == 'self-help-offered', type_=Integer).label('self_help_offered'),
             )
-            .join(Document)).all()
+            .join(Document))]
+
+    def child_context_worksheet(self, wb, result):
+        rows = result.all()
         if not rows:
             return
 
         ws = wb.add_worksheet('child_context')
 
-        d = rows[0]._asdict()
+        d = OrderedDict(zip(result.keys, rows[0]))
         data = [[k, d[k]] for k in d.keys()]
-        ws.add_table(0, 0, len(data), 1, {
-            'name': 'ChildContext',
-            'data': data,
-            'columns': [
-                {'header': ''},
-                {'header': 'count'},
-            ]
-        })
-
-    def write_summed_table(self, ws, name, query, rownum=0):
+        self.write_table(ws, data, keys=['', 'count'])
+
+    def write_summed_table(self, ws, result, rownum=0):
         """
-        For a query which returns three columns, [A, B, C],
+        For a QueryResult which has three columns, [A, B, C],
         write a table that uses A as row labels, B values as column
         labels, and C as counts for each.
 
@@ -537,13 +646,13 @@ class XLSXExportBuilder:
 
         Returns number of rows written, including headers and footers.
         """
-        row_label = query.column_descriptions[0]['name']
+        row_label = result.keys[0]
 
         # calculate col labels dynamically
         col_labels = set()
 
         data = OrderedDict()
-        for label, rows in groupby(query.all(), lambda r: r[0]):
+        for label, rows in groupby(result, lambda r: r[0]):
             data[label or '(none)'] = row = defaultdict(int)
 
             for r in rows:
@@ -559,36 +668,37 @@ class XLSXExportBuilder:
         # decompose rows into a list of values
         data = [[label] + [r[col] for col in col_labels] for label, r in data.iteritems()]
 
-        ws.add_table(rownum, 0, rownum + len(data) + 1, len(keys) - 1, {
-            'name': name,
-            'total_row': True,
-            'columns': [{'header': k, 'total_function': 'sum' if i > 0 else None} for i, k in enumerate(keys)],
-            'data': data,
-        })
+        self.write_table(ws, data, keys=keys, rownum=rownum)
+
+        # footer with the sum of each column
+        footer = rownum + len(data) + 1
+        ws.write(footer, 0, 'total', self.formats['bold'])
+        for col in xrange(1, len(keys)):
+            name = xl_col_to_name(col)
+            ws.write_formula(footer, col, '=SUM(%s%d:%s%d)' % (name, rownum + 2, name, footer), self.formats['bold'])
 
         # number of rows plus header and footer
         return len(data) + 2
 
-    def places_worksheet(self, wb):
+    def places_queries(self):
         from dexter.models.views import DocumentsView, DocumentPlacesView
 
-        ws = wb.add_worksheet('raw_places')
-
         tables = OrderedDict()
         tables['doc'] = DocumentsView
         tables['places'] = DocumentPlacesView
 
-        rows = self.filter(
+        return [self.filter(
             db.session
             .query(*self.merge_views(tables, ['document_id']))
             .join(Document)
-            .join(DocumentPlacesView)).all()
-        self.write_table(ws, 'Places', rows)
+            .join(DocumentPlacesView))]
 
-    def everything_worksheet(self, wb):
-        from dexter.models.views import DocumentsView, DocumentSourcesView, DocumentFairnessView, DocumentPlacesView
+    def places_worksheet(self, wb, rows):
+        ws = wb.add_worksheet('raw_places')
+        self.write_table(ws, rows)
 
-        ws = wb.add_worksheet('raw_everything')
+    def everything_queries(self):
+        from dexter.models.views import DocumentsView, DocumentSourcesView, DocumentFairnessView, DocumentPlacesView
 
         tables = OrderedDict()
         tables['doc'] = DocumentsView
@@ -596,39 +706,39 @@ class XLSXExportBuilder:
         tables['sources'] = DocumentSourcesView
         tables['places'] = DocumentPlacesView
 
-        rows = self.filter(
+        return [self.filter(
             db.session
             .query(*self.merge_views(tables, ['document_id']))
             .join(Document)
             .outerjoin(DocumentFairnessView)
             .outerjoin(DocumentSourcesView)
-            .outerjoin(DocumentPlacesView)).all()
-        self.write_table(ws, 'Everything', rows)
+            .outerjoin(DocumentPlacesView))]
+
+    def everything_worksheet(self, wb, rows):
+        ws = wb.add_worksheet('raw_everything')
+        self.write_table(ws, rows)
+
+    def bias_queries(self):
+        # the bias calculator runs its own queries
+        return []
 
     def bias_worksheet(self, wb):
         ws = wb.add_worksheet('bias')
 
         calc = BiasCalculator()
-        docs = self.filter(calc.get_query()).all()
-        scores = calc.calculate_bias_scores(docs, key=lambda d: d.medium.group_name())
-
-        ws.write(1, 0, 'oppose')
-        ws.write(2, 0, 'favour')
-        ws.write(3, 0, 'discrepancy')
-        ws.write(4, 0, 'parties')
-        ws.write(5, 0, 'fair')
-        ws.write(6, 0, 'final score')
-
-        for i, score in enumerate(scores):
-            col = i + 1
-
-            ws.write(0, col, score.group)
-            ws.write(1, col, score.oppose)
-            ws.write(2, col, score.favour)
-            ws.write(3, col, score.discrepancy)
-            ws.write(4, col, score.parties)
-            ws.write(5, col, score.fair)
-            ws.write(6, col, score.score)
+        scores = calc.calculate_grouped_bias_scores(self.docs, [Medium.group_name_column()])
+
+        # rows must be written in order, so write a row at a time
+        ws.write_row(0, 1, [score.group for score in scores])
+        for row, (label, attr) in enumerate([
+                ('oppose', 'oppose'),
+                ('favour', 'favour'),
+                ('discrepancy', 'discrepancy'),
+                ('parties', 'parties'),
+                ('fair', 'fair'),
+                ('final score', 'score')], 1):
+            ws.write(row, 0, label)
+            ws.write_row(row, 1, [getattr(score, attr) for score in scores])
 
         # key
         ws.write(9, 0, 'KEY')
@@ -644,27 +754,35 @@ class XLSXExportBuilder:
             ws.write(10 + i, 0, item[0])
             ws.write(10 + i, 1, item[1])
 
-    def write_table(self, ws, name, rows, keys=None, rownum=0, colnum=0):
-        if rows:
-            if not keys:
-                keys = rows[0].keys()
-                data = [list(doc) for doc in rows]
-            else:
-                data = []
-                for row in rows:
-                    info = row._asdict()
-                    data.append([info[k] for k in keys])
-
-            ws.add_table(rownum, colnum, rownum + len(rows), colnum + len(keys) - 1, {
-                'name': name,
-                'columns': [{'header': k} for k in keys],
-                'data': data,
-            })
-
-        return len(rows) + 1
+    def write_table(self, ws, rows, keys=None, rownum=0, colnum=0):
+        """
+        Write +rows+ below a header row of +keys+, starting at +rownum+ and +colnum+.
+
+        +rows+ is either a list of rows or a fetched QueryResult, in which case
+        +keys+ defaults to the query's column names.
+
+        The workbook is in constant memory mode, so rows must be written in order
+        and we can't use Excel tables. Instead, the first table on a worksheet
+        gets an autofilter.
+
+        Returns number of rows written, including the header.
+        """
+        if isinstance(rows, QueryResult):
+            keys = keys or rows.keys
+
+        ws.write_row(rownum, colnum, keys, self.formats['bold'])
+
+        n = 0
+        for n, row in enumerate(rows, 1):
+            ws.write_row(rownum + n, colnum, list(row))
+
+        if rownum == 0:
+            ws.autofilter(rownum, colnum, rownum + n, colnum + len(keys) - 1)
+
+        return n + 1
 
     def filter(self, query):
-        return query.filter(Document.id.in_(self.doc_ids))
+        return query.filter(self.docs.contains(Document.id))
 
     def merge_views(self, tables, singletons=None):
         """
@@ -687,3 +805,69 @@ class XLSXExportBuilder:
                     cols.append(col.label('%s_%s' % (alias, col.name)))
 
         return cols
+
+
+class QueryResult(object):
+    """
+    The rows of a query, fetched ahead of time and spooled to a temporary
+    file so that big results don't have to be held in memory. Iterating
+    over the result reads the rows back and deletes the file, so it can
+    only be done once.
+    """
+    def __init__(self, query):
+        self.query = query
+        self.keys = [c['name'] for c in query.column_descriptions]
+        self.file = None
+        self.count = 0
+
+    def fetch(self, conn=None):
+        """ Run the query on +conn+, or the session's connection, and spool its rows. """
+        self.file = tempfile.TemporaryFile()
+        pickler = cPickle.Pickler(self.file, 2)
+
+        for row in stream_rows(self.query, conn):
+            pickler.dump(tuple(row))
+            # the pickler remembers everything it's written unless cleared
+            pickler.clear_memo()
+            self.count += 1
+
+        self.file.seek(0)
+
+    def __iter__(self):
+        try:
+            unpickler = cPickle.Unpickler(self.file)
+            for i in xrange(self.count):
+                yield unpickler.load()
+        finally:
+            self.file.close()
+
+    def all(self):
+        return list(self)
+
+
+def stream_rows(query, conn=None, batch_size=1000):
+    """
+    Run +query+ with a server-side cursor and yield its rows, fetching
+    +batch_size+ rows at a time, so that the whole result is never in memory.
+
+    MySQLdb otherwise reads the entire result into memory before returning
+    the first row. The query is run on +conn+, or the session's connection,
+    so it can use temporary tables, but nothing else can be run on that
+    connection until all the rows have been read.
+    """
+    from MySQLdb.cursors import SSCursor
+
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    params = [compiled.params[k] for k in compiled.positiontup]
+
+    cursor = (conn or db.session.connection()).connection.cursor(SSCursor)
+    try:
+        cursor.execute(unicode(compiled), params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        cursor.close()
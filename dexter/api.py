@@ -10,10 +10,12 @@ from flask.ext.security import roles_accepted, current_user, login_required
 from flask.ext import htauth
 from flask_cors import cross_origin
 from sqlalchemy.orm import joinedload, lazyload
-from sqlalchemy.sql import func
+from sqlalchemy import Integer
+from sqlalchemy.sql import func, cast
 
 from .app import app
-from .models import db, Author, Person, Entity, Document, DocumentSource, Medium, Location, Topic, Affiliation, DocumentPlace, Place, Country
+from .models import db, Author, Person, Entity, Document, DocumentSource, Medium, Location, Topic, Affiliation, DocumentPlace, Place, Country, DocumentSet
+from .models import DailyTopicCount, DailyOriginCount, DailySourceCount
 from .analysis import BiasCalculator
 
 @app.route('/api/authors')
@@ -105,6 +107,65 @@ def api_people_sourced(name):
     return jsonify(result)
 
 
+@app.route('/api/documents/<int:id>/similar')
+@login_required
+@roles_accepted('monitor')
+def api_similar_documents(id):
+    """
+    The documents most like this one, by the entities and keywords they share.
+    Optionally filtered by publication date (start-date and end-date), country
+    (a country code) and medium (one or more medium ids).
+    """
+    from .analysis.similarity import index
+
+    doc = Document.query.get_or_404(id)
+
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 0), 100)
+    except:
+        limit = 10
+
+    start_date = end_date = None
+    try:
+        if request.args.get('start-date'):
+            start_date = parse(request.args['start-date'], yearfirst=True).date()
+        if request.args.get('end-date'):
+            end_date = parse(request.args['end-date'], yearfirst=True).date()
+    except ValueError:
+        abort(400, 'invalid date')
+
+    country_id = None
+    if request.args.get('country'):
+        country_id = api_country(request.args['country']).id
+
+    try:
+        medium_ids = [int(m) for m in request.args.getlist('medium')]
+    except ValueError:
+        abort(400, 'invalid medium')
+
+    # ask for a few extra, in case some have been deleted
+    scores = index.similar(doc.id, limit + 10, start_date, end_date, country_id, medium_ids)
+    if scores is None:
+        abort(503, 'the similarity index is still being built, try again soon')
+
+    docs = {}
+    if scores:
+        docs = dict((d.id, d) for d in Document.query
+                    .options(joinedload(Document.medium))
+                    .filter(Document.id.in_([i for i, _ in scores])))
+
+    similar = [{
+        'id': docs[i].id,
+        'title': docs[i].title,
+        'url': docs[i].url,
+        'published_at': docs[i].published_at.isoformat() if docs[i].published_at else None,
+        'medium': docs[i].medium.name if docs[i].medium else None,
+        'score': round(score, 4),
+    } for i, score in scores if i in docs][:limit]
+
+    return jsonify({'document': doc.id, 'similar': similar})
+
+
 @app.route('/api/entities')
 @login_required
 @roles_accepted('monitor')
@@ -168,74 +229,15 @@ def api_feed_sources(group=None):
 @app.route('/api/feeds/topics')
 @htauth.authenticated
 def api_feed_topics():
-    from dexter.models.views import DocumentSourcesView, DocumentsView, DocumentPlacesView
-
     start_date, end_date = api_date_range(request)
-
-    query = db.session.query(
-                func.count(DocumentsView.c.document_id).label("record_count"),
-                DocumentsView.c.topic.label("topic"),
-                DocumentsView.c.medium_group.label("medium_group"),
-                DocumentsView.c.medium_type.label("medium_type"),
-                DocumentPlacesView.c.province_code,
-                DocumentPlacesView.c.province_name,
-                DocumentPlacesView.c.municipality_code,
-                DocumentPlacesView.c.municipality_name,
-            )\
-            .outerjoin(DocumentPlacesView, DocumentPlacesView.c.document_id == DocumentsView.c.document_id)\
-            .group_by(
-                DocumentsView.c.topic.label("topic"),
-                DocumentsView.c.medium_group.label("medium_group"),
-                DocumentsView.c.medium_type.label("medium_type"),
-                DocumentPlacesView.c.province_code,
-                DocumentPlacesView.c.province_name,
-                DocumentPlacesView.c.municipality_code,
-                DocumentPlacesView.c.municipality_name,
-            )\
-            .filter(DocumentsView.c.published_at >= start_date)\
-            .filter(DocumentsView.c.published_at <= end_date)
-
-    query = filter_country(query, DocumentsView.c.country, request.args.get('country'))
-
-    results = {
-        "date-start": start_date,
-        "date-end": end_date,
-        "cells": [r._asdict() for r in query.all()]
-    }
-
-    return jsonify(results)
+    return jsonify(get_topics_feed(start_date, end_date))
 
 
 @app.route('/api/feeds/origins')
 @htauth.authenticated
 def api_feed_origins():
-    from dexter.models.views import DocumentsView
-
     start_date, end_date = api_date_range(request)
-
-    query = db.session.query(
-                func.count(DocumentsView.c.document_id).label("record_count"),
-                DocumentsView.c.origin.label("origin"),
-                DocumentsView.c.medium_group.label("medium_group"),
-                DocumentsView.c.medium_type.label("medium_type"),
-            )\
-            .group_by(
-                DocumentsView.c.origin.label("origin"),
-                DocumentsView.c.medium_group.label("medium_group"),
-                DocumentsView.c.medium_type.label("medium_type"),
-            )\
-            .filter(DocumentsView.c.published_at >= start_date)\
-            .filter(DocumentsView.c.published_at <= end_date)
-
-    query = filter_country(query, DocumentsView.c.country, request.args.get('country'))
-
-    results = {
-        "date-start": start_date,
-        "date-end": end_date,
-        "cells": [r._asdict() for r in query.all()]
-    }
-
-    return jsonify(results)
+    return jsonify(get_origins_feed(start_date, end_date))
 
 
 @app.route('/api/feeds/bias')
@@ -244,19 +246,12 @@ def api_feed_bias():
     start_date, end_date = api_date_range(request)
     calc = BiasCalculator()
 
-    log.info("Loading documents for bias calculation")
-    query = calc.get_query()\
-            .join(Country)\
+    query = db.session.query(Document.id)\
             .filter(Document.published_at >= start_date)\
-            .filter(Document.published_at <= end_date)
+            .filter(Document.published_at <= end_date)\
+            .filter(Document.country == api_country(request.args.get('country')))
 
-    query = filter_country(query, Country.name, request.args.get('country'))
-
-    documents = query.all()
-
-    log.info("Loaded %d docs" % len(documents))
-
-    scores = calc.calculate_bias_scores(documents, key=lambda d: (d.medium.group_name(), d.medium.medium_type))
+    scores = calc.calculate_grouped_bias_scores(DocumentSet(query), [Medium.group_name_column(), Medium.medium_type])
 
     cells = []
     for score in scores:
@@ -326,29 +321,62 @@ def api_date_range(request):
 
     return (start_date, end_date)
 
+def get_topics_feed(start_date, end_date):
+    """
+    Get a rollup of documents by topic, medium and place over a period.
+    """
+    rollup = DailyTopicCount
+    cols = [rollup.topic, rollup.medium_group, rollup.medium_type,
+            rollup.province_code, rollup.province_name, rollup.municipality_code, rollup.municipality_name]
+
+    query = db.session.query(rollup_count(rollup), *cols).group_by(*cols)
+    query = filter_rollup(query, rollup, start_date, end_date)
+
+    return {
+        "date-start": start_date,
+        "date-end": end_date,
+        "cells": [r._asdict() for r in query.all()]
+    }
+
+def get_origins_feed(start_date, end_date):
+    """
+    Get a rollup of documents by origin and medium over a period.
+    """
+    rollup = DailyOriginCount
+    cols = [rollup.origin, rollup.medium_group, rollup.medium_type]
+
+    query = db.session.query(rollup_count(rollup), *cols).group_by(*cols)
+    query = filter_rollup(query, rollup, start_date, end_date)
+
+    return {
+        "date-start": start_date,
+        "date-end": end_date,
+        "cells": [r._asdict() for r in query.all()]
+    }
+
 def get_sources_feed(start_date, end_date, keys=None, group=None, source_type=None):
     """
     Get a rollup of sources over a period, where 'keys' is a list
     of keys to group them by.
     """
-    from dexter.models.views import DocumentSourcesView, DocumentsView, DocumentPlacesView
-
     if group and group not in ['political-parties', 'groups']:
         abort(404)
 
+    rollup = DailySourceCount
+
     # map from the column alias to the column object
-    FIELDS = {str(c.name): c for c in [
-            DocumentSourcesView.c.affiliation.label("affiliation"),
-            DocumentSourcesView.c.affiliation_group.label("affiliation_group"),
-            DocumentSourcesView.c.source_name.label("source_name"),
-            DocumentSourcesView.c.gender.label("gender"),
-            DocumentSourcesView.c.race.label("race"),
-            DocumentsView.c.medium_group.label("medium_group"),
-            DocumentsView.c.medium_type.label("medium_type"),
-            DocumentPlacesView.c.province_code,
-            DocumentPlacesView.c.province_name,
-            DocumentPlacesView.c.municipality_code,
-            DocumentPlacesView.c.municipality_name,
+    FIELDS = {c.key: c for c in [
+            rollup.affiliation,
+            rollup.affiliation_group,
+            rollup.source_name,
+            rollup.gender,
+            rollup.race,
+            rollup.medium_group,
+            rollup.medium_type,
+            rollup.province_code,
+            rollup.province_name,
+            rollup.municipality_code,
+            rollup.municipality_name,
             ]}
 
     # let the user choose what columns they get back as a comma-separated list
@@ -361,22 +389,18 @@ def get_sources_feed(start_date, end_date, keys=None, group=None, source_type=No
     cols = [FIELDS[c] for c in FIELDS.viewkeys() & keys]
 
     # we're going to filter out anything with just 1 quotation
-    counts = func.count(DocumentSourcesView.c.document_id).label("record_count")
+    counts = rollup_count(rollup)
     query = db.session.query(counts, *cols)\
-        .join(DocumentsView, DocumentSourcesView.c.document_id == DocumentsView.c.document_id)\
-        .outerjoin(DocumentPlacesView, DocumentPlacesView.c.document_id == DocumentsView.c.document_id)\
         .group_by(*cols)\
-        .having(counts > 1)\
-        .filter(DocumentsView.c.published_at >= start_date)\
-        .filter(DocumentsView.c.published_at <= end_date)
+        .having(counts > 1)
+
+    query = filter_rollup(query, rollup, start_date, end_date)
 
     if source_type is not None:
-        query = query.filter(DocumentSourcesView.c.source_type == source_type)
+        query = query.filter(rollup.source_type == source_type)
 
     if group == 'political-parties':
-        query = query.filter(DocumentSourcesView.c.affiliation_code.like('4.%'))
-
-    query = filter_country(query, DocumentsView.c.country, request.args.get('country'))
+        query = query.filter(rollup.affiliation_code.like('4.%'))
 
     # {
     #   "date-start":"2014-04-03",
@@ -396,7 +420,27 @@ def get_sources_feed(start_date, end_date, keys=None, group=None, source_type=No
 
     return results
 
+def rollup_count(rollup):
+    """ The total record count of the rollup rows being grouped. """
+    return cast(func.sum(rollup.record_count), Integer).label("record_count")
+
+def filter_rollup(query, rollup, start_date, end_date):
+    """ Limit a query over daily rollups to the days from +start_date+
+    to +end_date+, and the requested country. """
+    start_date = parse(start_date).date()
+    end_date = parse(end_date).date()
+
+    country = api_country(request.args.get('country'))
+
+    return query\
+        .filter(rollup.country_id == country.id)\
+        .filter(rollup.date >= start_date)\
+        .filter(rollup.date <= end_date)
+
 def filter_country(query, col, country=None):
+    return query.filter(col == api_country(country))
+
+def api_country(country=None):
     if not country:
         if current_user and current_user.is_authenticated():
             country = current_user.country
@@ -408,5 +452,5 @@ def filter_country(query, col, country=None):
     if not country:
         abort(400, 'invalid country')
 
-    return query.filter(col == country)
+    return country
 
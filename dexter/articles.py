@@ -315,11 +315,15 @@ def reprocess_article_analysis(id):
         db.session.flush()
 
         cx = CalaisExtractor()
-        calais = cx.fetch_data(document)
-        cx.extract_topics(document, calais)
+        try:
+            calais = cx.fetch_data(document)
+            cx.extract_topics(document, calais)
 
-        db.session.commit()
-        flash('Topics updated')
+            db.session.commit()
+            flash('Topics updated')
+        except ProcessingError as e:
+            db.session.rollback()
+            flash("Couldn't update topics: %s" % e, 'error')
     else:
         abort(400, "Must supply a valid aspect parameter")
 
@@ -0,0 +1,180 @@
+import time
+import hashlib
+import logging
+import threading
+import cPickle as pickle
+from collections import OrderedDict
+from datetime import date
+
+from flask import request
+from flask.ext.security import current_user
+
+from .models import db
+from .models.document_changes import documents_committed
+
+log = logging.getLogger(__name__)
+
+# Server-side cache for expensive analyses, such as those behind the
+# dashboard and mine views.
+#
+# Cache keys include a data version, which is bumped whenever documents
+# are committed, so cached results are never older than the data. Old
+# entries are simply never asked for again and are evicted in time.
+#
+# Results are pickled, and any database models in them are merged back
+# into the current session when they're fetched from the cache.
+
+
+class LocalCache(object):
+    """ An in-memory LRU cache for this process only. The data version is
+    only bumped by changes made in this process, so use RedisCache when
+    there is more than one process, as in production.
+    """
+    def __init__(self, max_entries=500):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.data_version = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+
+            value, expires = entry
+            if expires <= time.time():
+                return None
+
+            # most recently used goes last
+            self.entries[key] = entry
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (value, time.time() + ttl)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def version(self):
+        return self.data_version
+
+    def bump_version(self):
+        with self.lock:
+            self.data_version += 1
+
+
+class RedisCache(object):
+    """ A cache shared between all processes, using Redis. Configure Redis
+    with an LRU maxmemory-policy to evict old entries. Requires the redis package.
+    """
+    VERSION_KEY = 'cache:data-version'
+
+    def __init__(self, url):
+        import redis
+        self.redis = redis.StrictRedis.from_url(url)
+
+    def get(self, key):
+        return self.redis.get('cache:%s' % key)
+
+    def set(self, key, value, ttl):
+        self.redis.set('cache:%s' % key, value, ex=int(ttl))
+
+    def version(self):
+        return int(self.redis.get(self.VERSION_KEY) or 0)
+
+    def bump_version(self):
+        self.redis.incr(self.VERSION_KEY)
+
+
+enabled = True
+ttl = 10 * 60
+cache = LocalCache()
+
+
+def configure(config):
+    """ Configure the cache from the app config. """
+    global cache, enabled, ttl
+
+    enabled = config.get('RESULT_CACHE', True)
+    ttl = config.get('RESULT_CACHE_TTL', ttl)
+
+    if config.get('RESULT_CACHE_REDIS_URL'):
+        cache = RedisCache(config['RESULT_CACHE_REDIS_URL'])
+    else:
+        cache = LocalCache(config.get('RESULT_CACHE_MAX_ENTRIES', 500))
+
+
+@documents_committed.connect
+def bump_data_version(session, **kwargs):
+    if enabled:
+        try:
+            cache.bump_version()
+        except Exception as e:
+            # the cache must never stop data from being saved
+            log.error("Couldn't bump cache data version: %s" % e, exc_info=e)
+
+
+def request_key(name, *parts):
+    """ A cache key for +name+ for the current request, based on the
+    request's non-empty arguments, the user's country and today's date,
+    which the forms use as defaults. """
+    args = sorted((k, v) for k, v in request.args.iteritems(multi=True) if v)
+    country_id = current_user.country_id if current_user.is_authenticated() else None
+
+    key = repr((name, parts, args, country_id, date.today().isoformat()))
+    return '%s:%s' % (name, hashlib.sha1(key).hexdigest())
+
+
+def cached(key, func):
+    """ Return the result of +func+, using the result cached under +key+
+    if the data hasn't changed since it was cached.
+    """
+    if not enabled:
+        return func()
+
+    key = '%s:%s' % (cache.version(), key)
+
+    value = cache.get(key)
+    if value is not None:
+        log.debug("Cache hit for %s" % key)
+        return merge_models(pickle.loads(value))
+
+    result = func()
+    cache.set(key, pickle.dumps(result, pickle.HIGHEST_PROTOCOL), ttl)
+    return result
+
+
+def merge_models(value, seen=None):
+    """ Merge the models in +value+, which may be nested in lists, dicts
+    and plain objects, into the current session, without reloading them. """
+    if seen is None:
+        seen = {}
+
+    if isinstance(value, db.Model):
+        return db.session.merge(value, load=False)
+
+    if id(value) in seen:
+        return seen[id(value)]
+
+    if isinstance(value, list):
+        seen[id(value)] = value
+        value[:] = [merge_models(v, seen) for v in value]
+
+    elif isinstance(value, tuple):
+        value = tuple(merge_models(v, seen) for v in value)
+
+    elif isinstance(value, dict):
+        seen[id(value)] = value
+        items = [(merge_models(k, seen), merge_models(v, seen)) for k, v in value.iteritems()]
+        value.clear()
+        value.update(items)
+
+    elif hasattr(value, '__dict__') and not isinstance(value, type):
+        seen[id(value)] = value
+        for k, v in value.__dict__.items():
+            value.__dict__[k] = merge_models(v, seen)
+
+    return value
@@ -12,6 +12,11 @@ CELERY_TIMEZONE = 'Africa/Johannesburg'
 CELERY_ENABLE_UTC = True
 
 CELERYBEAT_SCHEDULE = {
+    # often, so that the feeds are up to date soon after documents change
+    'refresh-stale': {
+        'schedule': timedelta(minutes=1),
+        'task': 'dexter.tasks.refresh_stale',
+    },
     'fetch-yesterdays-feeds': {
         'schedule': crontab(hour=3, minute=0),
         'task': 'dexter.tasks.fetch_yesterdays_feeds',
@@ -20,4 +25,16 @@ CELERYBEAT_SCHEDULE = {
         'schedule': crontab(hour=15, minute=0),
         'task': 'dexter.tasks.backfill_taxonomies',
     },
+    'recrawl-recent-documents': {
+        'schedule': crontab(hour=5, minute=0),
+        'task': 'dexter.tasks.recrawl_recent_documents',
+    },
+    'update-topic-model': {
+        'schedule': crontab(hour=1, minute=0),
+        'task': 'dexter.tasks.update_topic_model',
+    },
+    'delete-old-reports': {
+        'schedule': crontab(hour=2, minute=0),
+        'task': 'dexter.tasks.delete_old_reports',
+    },
 }
@@ -14,7 +14,20 @@ from .processing.extractors.calais import CalaisExtractor
 AlchemyExtractor.API_KEY = app.config.get('ALCHEMY_API_KEY')
 CalaisExtractor.API_KEY = app.config.get('CALAIS_API_KEY')
 
+# rate limits for external services
+from .processing import ratelimit
+ratelimit.configure(app.config)
+
+# server-side cache for analyses
+from . import cache
+cache.configure(app.config)
+
+# topic model for dashboard topics, 'online', 'lda' or 'nmf'
+from .analysis import TopicAnalyser
+TopicAnalyser.TOPIC_MODEL = app.config.get('TOPIC_MODEL', 'online')
+
 
 # setup crawlers
 from .processing import DocumentProcessor
 DocumentProcessor.FEED_PASSWORD = app.config.get('NEWSTOOLS_FEED_PASSWORD')
+DocumentProcessor.DUPLICATE_POLICY = app.config.get('DUPLICATE_POLICY', 'reuse')
@@ -1,12 +1,13 @@
 from itertools import groupby
+from collections import defaultdict, Counter
 from datetime import datetime, timedelta
 import re
 
 from dexter.app import app
-from flask import request, make_response, jsonify
+from flask import request, jsonify, redirect, url_for, abort, _request_ctx_stack, Response, stream_with_context
 from flask.ext.mako import render_template
 from flask.ext.security import roles_accepted, current_user, login_required
-from sqlalchemy.sql import func, distinct, or_, desc
+from sqlalchemy.sql import func, distinct, or_, and_, desc, case
 from sqlalchemy.orm import joinedload
 from sqlalchemy_fulltext import FullTextSearch
 import sqlalchemy_fulltext.modes as FullTextMode
@@ -17,9 +18,11 @@ from dexter.models.user import default_country_id
 
 from wtforms import validators, HiddenField, TextField, SelectMultipleField, BooleanField
 from .forms import Form, SelectField, MultiCheckboxField, RadioField
-from .analysis import SourceAnalyser, TopicAnalyser, XLSXExportBuilder, ChildrenRatingExport, MediaDiversityRatingExport
+from .analysis import SourceAnalyser, TopicAnalyser, XLSXExportBuilder, ChildrenRatingExport, MediaDiversityRatingExport, BulkExportBuilder
+from .processing.language import LanguageIdentifier
 
 from utils import paginate
+from .cache import cached, request_key
 
 
 @app.route('/dashboard')
@@ -75,6 +78,45 @@ def monitor_dashboard():
                            doc_groups=doc_groups)
 
 
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+NPZ_MIMETYPE = 'application/octet-stream'
+
+# reports that are built in the background by the build_report task,
+# by activity form format: a function that makes the report's builder
+# from the form, and the report's mimetype
+REPORTS = {
+    'xlsx': (lambda form: XLSXExportBuilder(form), XLSX_MIMETYPE),
+    'children-ratings.xlsx': (lambda form: ChildrenRatingExport(form.document_set()), XLSX_MIMETYPE),
+    'media-diversity-ratings.xlsx': (lambda form: MediaDiversityRatingExport(form.document_set()), XLSX_MIMETYPE),
+    'everything.npz': (lambda form: BulkExportBuilder(form, 'everything'), NPZ_MIMETYPE),
+    'sources.npz': (lambda form: BulkExportBuilder(form, 'sources'), NPZ_MIMETYPE),
+}
+
+# bulk exports of raw data that are streamed as they're read from the
+# database, by activity form format: the table and the format
+BULK_EXPORTS = {
+    'everything.csv.gz': ('everything', 'csv'),
+    'everything.ndjson.gz': ('everything', 'ndjson'),
+    'sources.csv.gz': ('sources', 'csv'),
+    'sources.ndjson.gz': ('sources', 'ndjson'),
+}
+
+
+def build_report(job, progress=None):
+    """
+    Build the file for a ReportJob, and return it as an open temporary file.
+
+    The report is built from the activity form, so this runs in a request
+    with the job's form arguments, as the user who asked for it. The
+    request tears down the database session, so don't use +job+ afterwards.
+    """
+    with app.test_request_context('/activity', query_string=job.args):
+        _request_ctx_stack.top.user = job.created_by
+        form = ActivityForm(request.args)
+        builder = REPORTS[job.report][0](form)
+        return builder.build(progress=progress)
+
+
 @app.route('/activity')
 @login_required
 @roles_accepted('monitor')
@@ -99,32 +141,12 @@ def activity():
 
         return jsonify(DocumentPlace.summary_for_docs(query.all()))
 
-    elif form.format.data == 'xlsx' and current_user.admin:
-        # excel spreadsheet
-        excel = XLSXExportBuilder(form).build()
-
-        response = make_response(excel)
-        response.headers["Content-Disposition"] = "attachment; filename=%s" % form.filename()
-        response.headers["Content-Type"] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        return response
-
-    elif form.format.data == 'children-ratings.xlsx' and current_user.admin:
-        # excel spreadsheet
-        excel = ChildrenRatingExport(form.document_ids()).build()
-
-        response = make_response(excel)
-        response.headers["Content-Disposition"] = "attachment; filename=%s" % form.filename()
-        response.headers["Content-Type"] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        return response
+    elif form.format.data in REPORTS and current_user.admin:
+        # excel spreadsheets are built in the background
+        return redirect(url_for('activity_report', id=submit_report(form).id))
 
-    elif form.format.data == 'media-diversity-ratings.xlsx' and current_user.admin:
-        # excel spreadsheet
-        excel = MediaDiversityRatingExport(form.document_ids()).build()
-
-        response = make_response(excel)
-        response.headers["Content-Disposition"] = "attachment; filename=%s" % form.filename()
-        response.headers["Content-Type"] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        return response
+    elif form.format.data in BULK_EXPORTS and current_user.admin:
+        return bulk_export(form)
 
     # setup pagination for doc ids
     query = db.session.query(Document.id).order_by(Document.created_at.desc())
@@ -168,6 +190,67 @@ def activity():
                            all_doc_ids=all_doc_ids)
 
 
+def submit_report(form):
+    """ Find or create the job for the report asked for by +form+,
+    and start building it if necessary. """
+    from .tasks import build_report as build_report_task
+
+    args = [(k, v) for k, v in request.args.iteritems(multi=True) if k != 'format']
+    job = ReportJob.find_or_create(form.format.data, args)
+
+    if job.id is None:
+        job.filename = form.filename()
+        job.mimetype = REPORTS[job.report][1]
+        job.created_by = current_user
+        db.session.add(job)
+        db.session.commit()
+
+        build_report_task.delay(job.id)
+
+    return job
+
+
+def bulk_export(form):
+    """ Stream the gzipped bulk export asked for by +form+. """
+    table, format = BULK_EXPORTS[form.format.data]
+    chunks = BulkExportBuilder(form, table).stream(format)
+
+    return Response(stream_with_context(chunks),
+                    mimetype='application/gzip',
+                    headers={'Content-Disposition': 'attachment; filename="%s"' % form.filename()})
+
+
+@app.route('/activity/reports/<int:id>')
+@login_required
+@roles_accepted('monitor')
+def activity_report(id):
+    # the page polls this with format=json until the report is ready
+    if not current_user.admin:
+        abort(403)
+
+    job = ReportJob.query.get_or_404(id)
+
+    if request.args.get('format') == 'json':
+        return jsonify({'report': job.to_json()})
+
+    return render_template('dashboard/report.haml',
+                           job=job)
+
+
+@app.route('/activity/reports/<int:id>/download')
+@login_required
+@roles_accepted('monitor')
+def activity_report_download(id):
+    if not current_user.admin:
+        abort(403)
+
+    job = ReportJob.query.get_or_404(id)
+    if not job.is_done():
+        abort(404)
+
+    return redirect(job.download_url)
+
+
 @app.route('/activity/map')
 @login_required
 @roles_accepted('monitor')
@@ -191,13 +274,18 @@ def activity_map():
 def activity_sources():
     form = ActivityForm(request.args)
 
-    sa = SourceAnalyser(doc_ids=form.document_ids())
-    sa.analyse()
-    sa.load_utterances()
+    def analyse():
+        sa = SourceAnalyser(doc_ids=form.document_set())
+        sa.analyse()
+        sa.load_utterances()
+
+        # problem sources
+        problem_people = sa.find_problem_people()
+        problem_people.sort(key=lambda p: -sa.analysed_people[p.id].source_counts_total)
 
-    # problem sources
-    problem_people = sa.find_problem_people()
-    problem_people.sort(key=lambda p: -sa.analysed_people[p.id].source_counts_total)
+        return sa, problem_people
+
+    sa, problem_people = cached(request_key('activity_sources'), analyse)
 
     return render_template('dashboard/sources.haml',
                            form=form,
@@ -211,8 +299,12 @@ def activity_sources():
 def activity_mentions():
     form = ActivityForm(request.args)
 
-    ta = TopicAnalyser(doc_ids=form.document_ids())
-    ta.find_top_people()
+    def analyse():
+        ta = TopicAnalyser(doc_ids=form.document_set())
+        ta.find_top_people()
+        return ta
+
+    ta = cached(request_key('activity_mentions'), analyse)
 
     return render_template('dashboard/mentions.haml',
                            form=form,
@@ -236,15 +328,48 @@ def activity_topics():
 @login_required
 @roles_accepted('monitor')
 def activity_topics_detail():
+    # Topics are either read from those assigned by the daily topic model, or
+    # clustering is done in the background by the cluster_topics task,
+    # and the results are kept for the next time the same documents are
+    # clustered. Until they're ready, this returns 202 and the page
+    # polls again, with poll=1.
+    from .tasks import cluster_topics
+
     form = ActivityForm(request.args)
 
-    ta = TopicAnalyser(doc_ids=form.document_ids())
-    ta.find_topics()
-    ta.save()
-    db.session.commit()
+    if TopicAnalyser.uses_stored_topics():
+        # topics have already been assigned to documents, so it's quick
+        ta = TopicAnalyser(doc_ids=form.document_set())
+        ta.find_stored_topics()
+        ta.save()
+        db.session.commit()
 
-    return render_template('dashboard/topics_detail.haml',
-                           topic_analyser=ta)
+        return render_template('dashboard/topics_detail.haml',
+                               topic_analyser=ta)
+
+    doc_ids = form.document_set().ids()
+
+    clustering, created = TopicClustering.find_or_create(doc_ids, TopicAnalyser.clustering_params())
+    polling = bool(request.args.get('poll'))
+
+    if clustering.is_done():
+        ta = TopicAnalyser(doc_ids=doc_ids)
+        ta.load_topics(clustering.topic_data)
+
+        return render_template('dashboard/topics_detail.haml',
+                               topic_analyser=ta)
+
+    if clustering.is_failed() and polling:
+        return ('', 500)
+
+    if created or clustering.is_failed() or clustering.is_stale():
+        # (re)start it
+        clustering.status = TopicClustering.PENDING
+        clustering.updated_at = datetime.utcnow()
+        db.session.commit()
+        cluster_topics.delay(clustering.id)
+
+    return ('', 202)
 
 
 @app.route('/activity/taxonomies')
@@ -252,7 +377,8 @@ def activity_topics_detail():
 @roles_accepted('monitor')
 def activity_taxonomies():
     form = ActivityForm(request.args)
-    taxonomies = DocumentTaxonomy.summary_for_docs(form.document_ids())
+    taxonomies = cached(request_key('activity_taxonomies'),
+                        lambda: [tuple(r) for r in DocumentTaxonomy.summary_for_docs(form.document_set())])
 
     return render_template('dashboard/taxonomies.haml',
                            taxonomies=taxonomies,
@@ -265,6 +391,7 @@ class ActivityForm(Form):
     user_id         = SelectField('User', [validators.Optional()], default='')
     medium_id       = SelectMultipleField('Medium', [validators.Optional()], default='')
     country_id      = SelectMultipleField('Country', [validators.Optional()], default=default_country_id)
+    language        = SelectField('Language', [validators.Optional()], default='')
     created_at      = TextField('Added', [validators.Optional()])
     published_at    = TextField('Published', [validators.Optional()])
     problems        = MultiCheckboxField('Article problems', [validators.Optional()], choices=DocumentAnalysisProblem.for_select())
@@ -287,6 +414,7 @@ class ActivityForm(Form):
         self.medium_id.choices = [(str(m.id), m.name) for m in Medium.query.order_by(Medium.name).all()]
         self.analysis_nature_id.choices = [[str(n.id), n.name] for n in AnalysisNature.all()]
         self.natures = AnalysisNature.all()
+        self.language.choices = [['', '(any)']] + sorted(LanguageIdentifier.LANGUAGES.items(), key=lambda p: p[1])
         self.tags.choices = [t[0] for t in db.session.query(DocumentTag.tag.distinct()).order_by(DocumentTag.tag)]
 
         # only admins can see all countries
@@ -367,8 +495,9 @@ class ActivityForm(Form):
         else:
             return self.published_from
 
-    def document_ids(self):
-        return [d[0] for d in self.filter_query(db.session.query(Document.id)).all()]
+    def document_set(self):
+        """ The documents matching this form, as a DocumentSet. """
+        return DocumentSet(self.filter_query(db.session.query(Document.id)))
 
     def filter_query(self, query):
         query = query.filter(Document.analysis_nature_id == self.analysis_nature_id.data)
@@ -393,6 +522,9 @@ class ActivityForm(Form):
         if self.country_id.data:
             query = query.filter(Document.country_id.in_(self.country_id.data))
 
+        if self.language.data:
+            query = query.filter(Document.language == self.language.data)
+
         if self.created_from:
             query = query.filter(Document.created_at >= self.created_from)
 
@@ -453,160 +585,169 @@ class ActivityForm(Form):
         else:
             ext = self.format.data
 
+            # bulk exports, such as everything.csv.gz
+            table, _, rest = ext.partition('.')
+            if table in BulkExportBuilder.TABLES:
+                filename.append(table)
+                ext = rest
+
         return "%s.%s" % ('-'.join(filename), ext)
 
 
 class ActivityChartHelper:
+    """ Builds the data for the activity charts.
+
+    Rather than running a query for each chart, we group the documents in
+    SQL by all the attributes the charts need, and then count the groups
+    for each chart. Sources are summarised per document in a second query,
+    and fairness in a third.
+    """
     def __init__(self, form):
         self.form = form
 
         # we use these to filter our queries, rather than trying to pull
         # complex filter logic into our view queries
-        self.doc_ids = [d[0] for d in form.filter_query(db.session.query(Document.id)).all()]
+        self.docs = form.document_set()
 
     def chart_data(self):
+        counts = self.document_counts()
+        source_counts = self.source_counts()
+        n_documents = sum(counts['created'].itervalues())
+
+        problems = dict((p.short_desc, counts['problems'].get(p.code, 0) + source_counts['problems'].get(p.code, 0))
+                        for p in DocumentAnalysisProblem.all())
+
+        markers = counts['markers']
+        markers['average-sources-per-document'] = source_counts['average-sources-per-document']
+
         return {
             'charts': {
-                'created': self.created_chart(),
-                'published': self.published_chart(),
-                'users': self.users_chart(),
-                'countries': self.countries_chart(),
-                'media': self.media_chart(),
-                'problems': self.problems_chart(),
-                'fairness': self.fairness_chart(),
-                'markers': self.markers_chart(),
+                'created': {'values': counts['created']},
+                'published': {'values': counts['published']},
+                'users': self.users_chart(counts['users']),
+                'countries': self.countries_chart(counts['countries']),
+                'media': self.media_chart(counts['media']),
+                'problems': {'values': problems},
+                'fairness': self.fairness_chart(n_documents),
+                'markers': {'values': markers},
             },
             'summary': {
-                'documents': len(self.doc_ids)
+                'documents': n_documents
             }
         }
 
-    def created_chart(self):
-        query = db.session.query(
-            func.date_format(Document.created_at, '%Y/%m/%d').label('t'),
-            func.count(Document.id),
-        ).group_by('t')
+    def document_counts(self):
+        """ Count documents by each of the attributes we chart, in one query. """
+        problems = [p for p in DocumentAnalysisProblem.all() if not p.source_problem]
+        has_url = and_(Document.url != None, Document.url != '')  # noqa
+
+        columns = [
+            func.date_format(Document.created_at, '%Y/%m/%d'),
+            func.date_format(Document.published_at, '%Y/%m/%d'),
+            func.ifnull(Document.checked_by_user_id, Document.created_by_user_id),
+            Document.country_id,
+            Document.medium_id,
+            case([(Document.flagged == True, 1)], else_=0),  # noqa
+            case([(has_url, 1)], else_=0),
+        ] + [case([(p.condition(), 1)], else_=0) for p in problems]
+
+        query = db.session\
+            .query(*(columns + [func.count(1)]))\
+            .select_from(Document)\
+            .outerjoin(AnalysisNature, Document.analysis_nature_id == AnalysisNature.id)\
+            .group_by(*columns)
+
+        counts = defaultdict(Counter)
+        for row in self.filter(query):
+            created, published, user_id, country_id, medium_id, flagged, with_url = row[:7]
+            n = row[-1]
+
+            counts['created'][created] += n
+            counts['published'][published] += n
+            counts['users'][user_id] += n
+            counts['countries'][country_id] += n
+            if medium_id is not None:
+                counts['media'][medium_id] += n
+
+            counts['markers']['flagged'] += flagged * n
+            counts['markers']['with-url'] += with_url * n
+            counts['markers']['without-url'] += (1 - with_url) * n
+
+            for p, flag in zip(problems, row[7:-1]):
+                counts['problems'][p.code] += flag * n
+
+        # make sure the markers are always present
+        for marker in ['flagged', 'with-url', 'without-url']:
+            counts['markers'][marker] += 0
+
+        return dict((k, dict(v)) for k, v in counts.iteritems())
+
+    def source_counts(self):
+        """ Summarise document sources per document, and then across documents, in one query. """
+        problems = [p for p in DocumentAnalysisProblem.all() if p.source_problem]
+
+        per_doc = db.session\
+            .query(*([
+                DocumentSource.doc_id,
+                func.sum(case([(DocumentSource.quoted == True, 1)], else_=0)).label('quoted')  # noqa
+            ] + [func.max(case([(p.condition(), 1)], else_=0)).label('problem_%d' % i)
+                 for i, p in enumerate(problems)]))\
+            .filter(self.docs.contains(DocumentSource.doc_id))\
+            .group_by(DocumentSource.doc_id)\
+            .subquery('per_doc')
+
+        # average people sources for documents with any quoted sources
+        row = db.session\
+            .query(*([func.avg(func.nullif(per_doc.c.quoted, 0))] +
+                     [func.sum(per_doc.c['problem_%d' % i]) for i in xrange(len(problems))]))\
+            .one()
 
         return {
-            'values': dict(self.filter(query).all())
+            'average-sources-per-document': round(float(row[0] or 0), 2),
+            'problems': dict((p.code, int(n or 0)) for p, n in zip(problems, row[1:])),
         }
 
-    def published_chart(self):
-        query = db.session.query(
-            func.date_format(Document.published_at, '%Y/%m/%d').label('t'),
-            func.count(Document.id),
-        ).group_by('t')
+    def users_chart(self, counts):
+        users = dict((u.id, u.short_name()) for u in User.query.filter(User.id.in_(counts.keys())))
 
         return {
-            'values': dict(self.filter(query).all())
+            'values': dict((users.get(k, 'None'), n) for k, n in counts.iteritems())
         }
 
-    def users_chart(self):
-        query = db.session.query(
-            func.ifnull(Document.checked_by_user_id, Document.created_by_user_id),
-            func.count(Document.id),
-        ).group_by(Document.created_by_user_id)
-        rows = self.filter(query).all()
-        users = dict((u.id, u.short_name()) for u in User.query.filter(User.id.in_(r[0] for r in rows)))
+    def countries_chart(self, counts):
+        countries = dict((c.id, c.name) for c in Country.query.filter(Country.id.in_(counts.keys())))
 
         return {
-            'values': dict((users.get(r[0], 'None'), r[1]) for r in rows)
+            'values': dict((countries.get(k, 'None'), n) for k, n in counts.iteritems())
         }
 
-    def countries_chart(self):
-        query = db.session.query(
-            Document.country_id,
-            func.count(Document.id),
-        ).group_by(Document.country_id)
-        rows = self.filter(query).all()
-        countries = dict((c.id, c.name) for c in Country.query.filter(Country.id.in_(r[0] for r in rows)))
+    def media_chart(self, counts):
+        media = Medium.query.all()
+        names = dict((m.id, m.name) for m in media)
 
         return {
-            'values': dict((countries.get(r[0], 'None'), r[1]) for r in rows)
+            'values': dict((names[k], n) for k, n in counts.iteritems()),
+            'types': dict([m.name, m.medium_type] for m in media)
         }
 
-    def fairness_chart(self):
+    def fairness_chart(self, n_documents):
         query = db.session.query(
             Fairness.name.label('t'),
             func.count(distinct(DocumentFairness.doc_id))
         )\
             .join(DocumentFairness)\
-            .join(Document, DocumentFairness.doc_id == Document.id)\
+            .filter(self.docs.contains(DocumentFairness.doc_id))\
             .group_by('t')
 
-        rows = self.filter(query).all()
-        counts = dict(rows)
+        counts = dict(query.all())
         counts.setdefault('Fair', 0)
 
         # missing documents are considered fair
-        counts['Fair'] += len(self.doc_ids) - sum(counts.itervalues())
-
-        return {
-            'values': counts
-        }
-
-    def media_chart(self):
-        query = db.session.query(Medium.name, func.count(Document.id))\
-            .join(Document)\
-            .group_by(Medium.name)
-        rows = self.filter(query).all()
-
-        return {
-            'values': dict(rows),
-            'types': dict([m.name, m.medium_type] for m in Medium.query.all())
-        }
-
-    def problems_chart(self):
-        counts = {}
-
-        for p in DocumentAnalysisProblem.all():
-            query = db.session.query(func.count(distinct(Document.id)))
-            query = self.filter(p.filter_query(query))
-            counts[p.short_desc] = query.scalar()
-
-        return {
-            'values': counts
-        }
-
-    def markers_chart(self):
-        counts = {}
-
-        # flagged
-        query = self.filter(
-            db.session.query(func.count(Document.id))
-            .filter(Document.flagged == True))  # noqa
-        counts['flagged'] = query.scalar()
-
-        # with URL
-        query = self.filter(
-            db.session.query(func.count(Document.id))
-            .filter(Document.url != None, Document.url != ''))  # noqa
-        counts['with-url'] = query.scalar()
-
-        # without URL
-        query = self.filter(
-            db.session.query(func.count(Document.id))
-            .filter(or_(Document.url == None, Document.url == '')))  # noqa
-        counts['without-url'] = query.scalar()
-
-        # average people sources per document
-        subq = self.filter(
-            db.session
-            .query(func.count(DocumentSource.doc_id).label('count'))
-            .join(Document, DocumentSource.doc_id == Document.id)
-            .filter(DocumentSource.quoted == 1)
-            .group_by(DocumentSource.doc_id))\
-            .subquery('cnt')
-
-        n = float(db.session
-                  .query(func.avg(subq.c.count))
-                  .select_from(subq)
-                  .scalar() or 0)
-        counts['average-sources-per-document'] = round(n, 2)
+        counts['Fair'] += n_documents - sum(counts.itervalues())
 
         return {
             'values': counts
         }
 
     def filter(self, query):
-        return query.filter(Document.id.in_(self.doc_ids))
+        return query.filter(self.docs.contains(Document.id))
@@ -14,7 +14,7 @@ from .app import app
 from .models import db, Document, Entity, Utterance, DocumentEntity, DocumentSource, Person
 from .models.person import PersonForm
 from .utils import paginate
-from .analysis import SourceAnalyser
+from .analysis import analyse_person_sources
 
 import urllib
 
@@ -103,9 +103,7 @@ def show_person(id):
 
     # source frequency
     today = datetime.utcnow().date() - timedelta(days=1)
-    sa = SourceAnalyser(start_date=(today - timedelta(days=14)), end_date=today)
-    sa.analyse()
-    source_analysis = sa.analysed_people.get(person.id)
+    source_analysis = analyse_person_sources(person, today - timedelta(days=14), today)
 
     return render_template('person/show.haml',
         person=person,
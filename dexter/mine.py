@@ -11,8 +11,9 @@ import sqlalchemy_fulltext.modes as FullTextMode
 from dexter.app import app
 from dexter.models import *  # noqa
 from dexter.forms import Form, RadioField
-from dexter.analysis import SourceAnalyser, MediaAnalyser
+from dexter.analysis import SourceAnalyser, MediaAnalyser, analyse_person_sources
 from dexter.utils import client_cache_for
+from dexter.cache import cached, request_key
 
 
 @app.route('/mine/')
@@ -22,12 +23,17 @@ from dexter.utils import client_cache_for
 def mine_home():
     form = MineForm(request.args)
 
-    ma = MediaAnalyser(doc_ids=form.document_ids(overview=True))
-    ma.analyse()
+    def analyse():
+        ma = MediaAnalyser(doc_ids=form.document_set(overview=True))
+        ma.analyse()
 
-    sa = SourceAnalyser(doc_ids=form.document_ids())
-    sa.analyse()
-    sa.load_utterances()
+        sa = SourceAnalyser(doc_ids=form.document_set())
+        sa.analyse()
+        sa.load_utterances()
+
+        return ma, sa
+
+    ma, sa = cached(request_key('mine_home'), analyse)
 
     return render_template('mine/index.haml',
                            form=form,
@@ -43,11 +49,24 @@ def mine_person(id):
     person = Person.query.get_or_404(id)
     form = MineForm(request.args)
 
-    sa = SourceAnalyser(doc_ids=form.document_ids())
-    sa.analyse()
-    sa.load_utterances([person])
+    filters = form.person_stats_filters()
+    if filters is None:
+        # the statistics can't be filtered like this, analyse everyone
+        def analyse():
+            sa = SourceAnalyser(doc_ids=form.document_set())
+            sa.analyse()
+            sa.load_utterances([person])
+            return sa
+
+        sa = cached(request_key('mine_person', person.id), analyse)
+        source = sa.analysed_people.get(person.id)
+    else:
+        start_date, end_date = form.date_range()
+        source = analyse_person_sources(person, start_date, end_date, filters)
+        if source:
+            sa = SourceAnalyser(doc_ids=form.document_set(), start_date=start_date, end_date=end_date)
+            sa.load_utterances([person])
 
-    source = sa.analysed_people.get(person.id)
     if not source:
         return jsonify({'row': '', 'utterances': ''})
 
@@ -68,11 +87,13 @@ def mine_people():
     """ All the people that are in the documents covered by this span. """
     form = MineForm(request.args)
 
-    sa = SourceAnalyser(doc_ids=form.document_ids())
-    sa.load_people_sources()
+    def people():
+        sa = SourceAnalyser(doc_ids=form.document_set())
+        sa.load_people_sources()
+        return [p.json() for p in sa.people.itervalues()]
 
     return jsonify({
-        'people': [p.json() for p in sa.people.itervalues()]
+        'people': cached(request_key('mine_people'), people)
     })
 
 
@@ -91,28 +112,47 @@ class MineForm(Form):
         self.country = current_user.country
         self.yesterday = date.today() - timedelta(days=1)
 
-    @property
-    def published_from(self):
+    def date_range(self):
+        """ The first and last dates of the period, as dates. """
         try:
             days = int(self.period.data)
         except ValueError:
             days = 7
-        days = days
 
-        return (self.yesterday - timedelta(days=days)).strftime('%Y-%m-%d 00:00:00')
+        return (self.yesterday - timedelta(days=days), self.yesterday - timedelta(days=1))
+
+    @property
+    def published_from(self):
+        return self.date_range()[0].strftime('%Y-%m-%d 00:00:00')
 
     @property
     def published_to(self):
-        return (self.yesterday - timedelta(days=1)).strftime('%Y-%m-%d 23:59:59')
+        return self.date_range()[1].strftime('%Y-%m-%d 23:59:59')
 
-    def document_ids(self, overview=False):
-        return [d[0] for d in self.filter_query(db.session.query(Document.id), overview=overview).all()]
+    def document_set(self, overview=False):
+        """ The documents matching this form, as a DocumentSet. """
+        return DocumentSet(self.filter_query(db.session.query(Document.id), overview=overview))
 
     @property
     def medium(self):
         if self.medium_id.data:
             return Medium.query.get(self.medium_id.data)
 
+    def person_stats_filters(self):
+        """ Conditions on PersonDailyStats that match the documents of this
+        form, or None if the statistics can't be filtered like the form. """
+        if self.source_person_id.data or self.q.data:
+            return None
+
+        filters = [
+            PersonDailyStats.analysis_nature_id == self.nature_id,
+            PersonDailyStats.country_id == self.country.id,
+        ]
+        if self.medium:
+            filters.append(PersonDailyStats.medium_id == self.medium.id)
+
+        return filters
+
     def filter_query(self, query, overview=False):
         query = query.filter(
             Document.analysis_nature_id == self.nature_id,
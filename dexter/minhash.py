@@ -0,0 +1,133 @@
+import re
+import struct
+import hashlib
+import zlib
+from collections import defaultdict
+
+import numpy as np
+from unidecode import unidecode
+
+# Helpers for estimating the similarity of texts using MinHash signatures,
+# and for finding similar texts quickly using locality sensitive hashing
+# (LSH) over bands of those signatures.
+#
+# See chapter 3 of Mining of Massive Datasets, http://www.mmds.org/
+
+NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+
+# a Mersenne prime larger than any 32 bit hash, for the permutations
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+MAX_COEFFICIENT = (1 << 31) - 1
+
+
+def normalise_words(text):
+    """ Lowercase, strip diacritics and punctuation from +text+ and return
+    a list of its words. """
+    if isinstance(text, unicode):
+        text = unidecode(text)
+    return NON_WORD_RE.sub(' ', text.lower()).split()
+
+
+def shingles(text, size=4):
+    """ Return the set of +size+-word shingles in +text+. Texts shorter
+    than +size+ words produce a single shingle. """
+    words = normalise_words(text)
+    if len(words) <= size:
+        return set([' '.join(words)]) if words else set()
+
+    return set(' '.join(words[i:i + size]) for i in xrange(len(words) - size + 1))
+
+
+class MinHasher(object):
+    """ Calculates MinHash signatures of +num_perm+ 32 bit integers for
+    sets of shingles. Signatures are only comparable if they're made with
+    hashers with the same +num_perm+ and +seed+.
+    """
+    def __init__(self, num_perm=64, seed=1):
+        self.num_perm = num_perm
+
+        # keep coefficients below 2^31 so that a*x + b can't overflow 64 bits
+        gen = np.random.RandomState(seed)
+        self.a = gen.randint(1, MAX_COEFFICIENT, num_perm).astype(np.uint64)
+        self.b = gen.randint(0, MAX_COEFFICIENT, num_perm).astype(np.uint64)
+
+    def signature(self, shingles):
+        """ MinHash signature for a set of shingles, as a numpy array. """
+        sig = np.empty(self.num_perm, dtype=np.uint64)
+        sig.fill(MAX_HASH)
+
+        if shingles:
+            hashes = np.array([zlib.crc32(s.encode('utf-8') if isinstance(s, unicode) else s) & MAX_HASH
+                               for s in shingles], dtype=np.uint64)
+            # one row per shingle, one column per permutation
+            perms = (np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME & MAX_HASH
+            sig = perms.min(axis=0)
+
+        return sig.astype(np.uint32)
+
+    def text_signature(self, text, size=4):
+        return self.signature(shingles(text, size))
+
+    def pack(self, sig):
+        """ Pack a signature into a string for storage. """
+        return struct.pack('<%dI' % len(sig), *sig)
+
+    def unpack(self, packed):
+        """ Unpack a signature packed with +pack+. """
+        return np.array(struct.unpack('<%dI' % (len(packed) // 4), packed), dtype=np.uint32)
+
+
+def similarity(sig1, sig2):
+    """ Estimate the Jaccard similarity of the sets with these two signatures. """
+    return float(np.count_nonzero(np.asarray(sig1) == np.asarray(sig2))) / len(sig1)
+
+
+def band_hashes(sig, bands=16):
+    """ Split a signature into +bands+ bands and return a list of 60-bit
+    integer hashes, one for each band. Two signatures that share any band
+    hash are candidates for being similar. The band number is part of the
+    hash, so hashes from different bands never collide.
+
+    With r rows per band, the chance of two sets with similarity s sharing
+    at least one band is 1 - (1 - s^r)^bands.
+    """
+    rows = len(sig) // bands
+    sig = np.asarray(sig, dtype=np.uint32)
+
+    hashes = []
+    for i in xrange(bands):
+        digest = hashlib.md5(struct.pack('<I', i) + sig[i * rows:(i + 1) * rows].tostring()).hexdigest()
+        hashes.append(int(digest[:15], 16))
+
+    return hashes
+
+
+class LSHIndex(object):
+    """ A simple in-memory LSH index for finding keys with similar
+    MinHash signatures.
+    """
+    def __init__(self, bands=16):
+        self.bands = bands
+        self.buckets = defaultdict(set)
+        self.signatures = {}
+
+    def add(self, key, sig, hashes=None):
+        """ Add +key+ with signature +sig+. Pass the signature's band
+        +hashes+ if they've already been calculated. """
+        self.signatures[key] = sig
+        for h in hashes or band_hashes(sig, self.bands):
+            self.buckets[h].add(key)
+
+    def candidates(self, sig, hashes=None):
+        """ Keys that share at least one band with this signature. """
+        keys = set()
+        for h in hashes or band_hashes(sig, self.bands):
+            keys.update(self.buckets.get(h, ()))
+        return keys
+
+    def query(self, sig, threshold=0.8, hashes=None):
+        """ Keys whose signatures have an estimated similarity of
+        at least +threshold+ with +sig+. """
+        return [k for k in self.candidates(sig, hashes)
+                if similarity(sig, self.signatures[k]) >= threshold]
@@ -1,5 +1,6 @@
 from dexter.app import db
-from .document import Document, DocumentType, DocumentTag
+from .document import Document, DocumentType, DocumentTag, DocumentLSHBand
+from .document_set import DocumentSet
 from .entity import DocumentEntity, Entity
 from .keyword import DocumentKeyword
 from .topic import Topic, DocumentTaxonomy
@@ -18,4 +19,14 @@ from .children import SourceRole, SourceAge
 from .principle import Principle
 from .attachment import DocumentAttachment, AttachmentImage
 from .country import Country
-from .cluster import Cluster, ClusteredDocument
+from .cluster import Cluster, ClusteredDocument, TopicClustering
+from .document_topic import TopicModel, DocumentTopic
+from .document_features import Feature, DocumentFeatures
+from .report_job import ReportJob
+from .rollups import DailyTopicCount, DailyOriginCount, DailySourceCount
+from .person_stats import PersonDailyStats
+from .stale import StaleDay, StalePerson
+
+from .document_changes import documents_committing, documents_committed
+# keeps the reporting tables up to date
+from . import reporting  # noqa
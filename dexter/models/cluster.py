@@ -1,4 +1,6 @@
 import hashlib
+import json
+from datetime import datetime, timedelta
 
 from sqlalchemy import (
     Column,
@@ -9,7 +11,9 @@ from sqlalchemy import (
     func,
     event,
     )
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import relationship, backref, deferred
+from sqlalchemy.dialects.mysql import LONGTEXT
 
 from ..app import db
 
@@ -20,7 +24,7 @@ class Cluster(db.Model):
     within that cluster. A document can be long to many clusters.
 
     A cluster has a fingerprint, which is an md5 hash of the sorted
-    document ids in the cluster. Always call `recalculate_fingerprint`
+    document ids in the cluster, each followed by a comma. Always call `recalculate_fingerprint`
     after updating the members of the cluster.
     """
     __tablename__ = "clusters"
@@ -50,7 +54,7 @@ class Cluster(db.Model):
     def make_fingerprint(cls, doc_ids):
         m = hashlib.md5()
         for i in sorted(doc_ids):
-            m.update(str(i))
+            m.update('%d,' % i)
         return m.hexdigest()
 
     @classmethod
@@ -85,3 +89,111 @@ class ClusteredDocument(db.Model):
 
     def __repr__(self):
         return "<ClusteredDocument id=%s, cluster=%s, document=%s>" % (self.id, self.cluster, self.document,)
+
+
+class TopicClustering(db.Model):
+    """
+    Topics found by clustering a set of documents, which is done in the
+    background by the `cluster_topics` task because it's slow.
+
+    A clustering is identified by a fingerprint of the document ids and
+    the parameters used to cluster them, so that the topics for the same
+    documents can be reused rather than found again.
+    """
+    __tablename__ = "topic_clusterings"
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    # pending and running clusterings that haven't been updated for this
+    # long are assumed to have been lost, and are started again
+    STALE_AFTER = timedelta(hours=1)
+
+    id           = Column(Integer, primary_key=True)
+    fingerprint  = Column(String(32), index=True, nullable=False, unique=True)
+    status       = Column(String(10), nullable=False, default=PENDING)
+    # comma-separated ids of the documents being clustered
+    doc_ids      = deferred(Column(LONGTEXT, nullable=False))
+    # the topics found, as json
+    topics       = deferred(Column(LONGTEXT))
+
+    created_at   = Column(DateTime(timezone=True), index=True, unique=False, nullable=False, server_default=func.now())
+    # set in UTC by us rather than by the database, because is_stale
+    # compares it with utcnow
+    updated_at   = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow, server_default=func.now())
+
+    @property
+    def document_ids(self):
+        return [int(i) for i in self.doc_ids.split(',') if i]
+
+    @document_ids.setter
+    def document_ids(self, ids):
+        self.doc_ids = ','.join(str(i) for i in sorted(ids))
+
+    @property
+    def topic_data(self):
+        """ The topics found, as a list of dicts. """
+        return json.loads(self.topics) if self.topics else []
+
+    @topic_data.setter
+    def topic_data(self, data):
+        self.topics = json.dumps(data)
+
+    def is_done(self):
+        return self.status == self.DONE
+
+    def is_failed(self):
+        return self.status == self.FAILED
+
+    def is_stale(self):
+        """ Has this clustering been waiting or running for too long? """
+        if self.status not in (self.PENDING, self.RUNNING):
+            return False
+        return self.updated_at is not None and \
+            self.updated_at.replace(tzinfo=None) < datetime.utcnow() - self.STALE_AFTER
+
+    def __repr__(self):
+        return "<TopicClustering id=%s, status=%s, fingerprint=%s>" % (self.id, self.status, self.fingerprint,)
+
+    @classmethod
+    def make_fingerprint(cls, doc_ids, params):
+        """ Fingerprint of the document ids and the clustering
+        parameters, a dict. """
+        m = hashlib.md5()
+        m.update(Cluster.make_fingerprint(doc_ids))
+        for key in sorted(params.iterkeys()):
+            m.update('%s=%r' % (key, params[key]))
+        return m.hexdigest()
+
+    @classmethod
+    def find_or_create(cls, doc_ids, params):
+        """ Find the clustering of these documents with these parameters,
+        or create a pending one and add it to the session. Returns a
+        (clustering, created) tuple. """
+        doc_ids = list(doc_ids)
+        fingerprint = cls.make_fingerprint(doc_ids, params)
+
+        clustering = cls.query.filter(cls.fingerprint == fingerprint).first()
+        if clustering is not None:
+            return clustering, False
+
+        clustering = cls()
+        clustering.fingerprint = fingerprint
+        clustering.status = cls.PENDING
+        clustering.document_ids = doc_ids
+
+        try:
+            with db.session.begin_nested():
+                db.session.add(clustering)
+        except IntegrityError:
+            # someone else created it since we looked; a locking read sees
+            # it even though it was committed after our transaction started
+            clustering = cls.query\
+                .filter(cls.fingerprint == fingerprint)\
+                .with_for_update(read=True)\
+                .one()
+            return clustering, False
+
+        return clustering, True
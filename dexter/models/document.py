@@ -2,6 +2,7 @@ from __future__ import division
 
 import re
 import datetime
+import hashlib
 
 from unidecode import unidecode
 
@@ -13,6 +14,8 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     Integer,
+    BigInteger,
+    LargeBinary,
     String,
     Text,
     func,
@@ -52,6 +55,8 @@ class Document(FullText, db.Model):
     summary   = Column(String(1024))
     text      = Column(Text)
     word_count = Column(Integer)
+    # ISO 639-1 code of the language of the text, if we could identify it
+    language  = Column(String(5), index=True)
     section   = Column(String(100), index=True)
     item_num  = Column(Integer)
 
@@ -61,6 +66,17 @@ class Document(FullText, db.Model):
     # Raw results from the OpenCalais API, as json
     raw_calais = deferred(Column(LONGTEXT))
 
+    # HTTP validators from the last crawl and a hash of the normalised text,
+    # so that re-crawls can be conditional and skip unchanged documents
+    etag          = Column(String(256))
+    last_modified = Column(String(50))
+    text_hash     = Column(String(40))
+
+    # MinHash signature of the text, for finding near-duplicates
+    minhash       = deferred(Column(LargeBinary))
+    # a near-duplicate of this document that was ingested before it
+    canonical_id  = Column(Integer, ForeignKey('documents.id', ondelete='SET NULL'), index=True)
+
     author_id         = Column(Integer, ForeignKey('authors.id'), index=True, nullable=False)
     medium_id         = Column(Integer, ForeignKey('mediums.id'), index=True, nullable=False)
     document_type_id  = Column(Integer, ForeignKey('document_types.id'), index=True)
@@ -119,6 +135,8 @@ class Document(FullText, db.Model):
     origin      = relationship("Location")
     country     = relationship("Country")
     attachments = relationship("DocumentAttachment", backref="document", cascade='all, delete-orphan')
+    canonical   = relationship("Document", remote_side=[id], backref=backref('duplicates'))
+    lsh_bands   = relationship("DocumentLSHBand", cascade='all, delete-orphan', passive_deletes=True)
 
     analysis_nature = relationship("AnalysisNature", lazy=False)
 
@@ -312,6 +330,7 @@ class Document(FullText, db.Model):
 @event.listens_for(Document.text, 'set')
 def document_text_set(target, value, oldvalue, initiator):
     target.word_count = count_words(value)
+    target.text_hash = hash_text(value)
 
 
 def count_words(s):
@@ -324,6 +343,16 @@ def count_words(s):
         return 0
 
 
+def hash_text(s):
+    """ SHA1 hash of s, ignoring differences in whitespace. """
+    if s is None:
+        return None
+    s = whitespace_re.sub(' ', s.strip())
+    if isinstance(s, unicode):
+        s = s.encode('utf-8')
+    return hashlib.sha1(s).hexdigest()
+
+
 # This is actually a full text index creating during a migration.
 # Place this here ensures that Alembic's autogeneration code
 # realises that this index should exist.
@@ -448,3 +477,14 @@ class DocumentTag(db.Model):
     @classmethod
     def split(cls, tags):
         return re.split('\s*,\s*', tags)
+
+
+class DocumentLSHBand(db.Model):
+    """ Hash of one band of a document's MinHash signature. Documents that
+    share a band hash are candidate near-duplicates.
+    """
+    __tablename__ = 'document_lsh_bands'
+
+    id        = Column(Integer, primary_key=True)
+    doc_id    = Column(Integer, ForeignKey('documents.id', ondelete='CASCADE'), index=True, nullable=False)
+    band_hash = Column(BigInteger, index=True, nullable=False)
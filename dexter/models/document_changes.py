@@ -0,0 +1,114 @@
+from itertools import chain
+
+from blinker import Namespace
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from sqlalchemy.sql import text
+
+from .document import Document
+from .entity import Entity
+from .person import Person
+
+# Keeps track of which documents and people are changed in a transaction,
+# and tells interested parties just before and after the transaction is committed.
+#
+# Receivers are called with the session as the sender, and the
+# +doc_ids+ and +person_ids+ that changed. Receivers of documents_committing
+# may run SQL with the session, which becomes part of the transaction, but
+# must not add or change models.
+
+signals = Namespace()
+
+documents_committing = signals.signal('documents-committing')
+documents_committed = signals.signal('documents-committed')
+
+
+def changes(session):
+    return session.info.setdefault('document_changes', {'doc_ids': set(), 'person_ids': set(), 'days': set()})
+
+
+@event.listens_for(Session, 'after_flush')
+def record_changes(session, flush_context):
+    changed = changes(session)
+
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Document):
+            changed['doc_ids'].add(obj.id)
+        elif isinstance(obj, Person):
+            changed['person_ids'].add(obj.id)
+        elif isinstance(obj, Entity):
+            # an entity linked to a different person changes who is
+            # mentioned and quoted in the documents with that entity
+            people = get_history(obj, 'person')
+            person_ids = get_history(obj, 'person_id')
+            if people.has_changes() or person_ids.has_changes():
+                changed['person_ids'].update(p.id for p in people.deleted if p is not None)
+                changed['person_ids'].update(i for i in person_ids.deleted if i is not None)
+                if obj.person_id is not None:
+                    changed['person_ids'].add(obj.person_id)
+        elif getattr(obj, 'doc_id', None) is not None:
+            # something that belongs to a document, such as a source
+            changed['doc_ids'].add(obj.doc_id)
+
+    # remember the days that changed and deleted documents were on before
+    # the flush, because we can't look those up once they're committed
+    for doc in session.deleted:
+        if isinstance(doc, Document) and doc.published_at and doc.country_id:
+            changed['days'].add((day_of(doc.published_at), doc.country_id))
+
+    for doc in session.dirty:
+        if isinstance(doc, Document):
+            published_at = get_history(doc, 'published_at').deleted or [doc.published_at]
+            country_id = get_history(doc, 'country_id').deleted or [doc.country_id]
+
+            for p in published_at:
+                for c in country_id:
+                    if p and c:
+                        changed['days'].add((day_of(p), c))
+
+
+def person_changed(session, person_id):
+    """ Record that +person_id+ changed in a way the session can't see,
+    such as a bulk update of the rows linked to the person. """
+    changes(session)['person_ids'].add(person_id)
+
+
+def day_of(published_at):
+    return published_at.date() if hasattr(published_at, 'date') else published_at
+
+
+def changed_days(session, doc_ids):
+    """ The (day, country_id) pairs that the documents changed in this
+    transaction are on, or were on before they changed or were deleted.
+    For use by receivers of documents_committing. """
+    days = set(changes(session)['days'])
+
+    ids = ','.join(str(int(i)) for i in doc_ids if i is not None)
+    if ids:
+        rows = session.execute(text("select distinct date(published_at), country_id from documents where id in (%s)" % ids))
+        days.update((r[0], r[1]) for r in rows)
+
+    return days
+
+
+@event.listens_for(Session, 'before_commit')
+def send_committing(session):
+    # make sure we know about everything that will be committed
+    session.flush()
+
+    changed = session.info.get('document_changes')
+    if changed and (changed['doc_ids'] or changed['person_ids']):
+        documents_committing.send(session, doc_ids=changed['doc_ids'], person_ids=changed['person_ids'])
+
+
+@event.listens_for(Session, 'after_commit')
+def send_committed(session):
+    changed = session.info.pop('document_changes', None)
+    if changed and (changed['doc_ids'] or changed['person_ids']):
+        documents_committed.send(session, doc_ids=changed['doc_ids'], person_ids=changed['person_ids'])
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def forget_changes(session, previous_transaction):
+    session.info.pop('document_changes', None)
@@ -0,0 +1,210 @@
+import logging
+
+import numpy
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    Integer,
+    String,
+    LargeBinary,
+    DateTime,
+    func,
+    )
+from sqlalchemy.sql import text
+
+from ..app import db
+from .document_changes import documents_committing
+
+log = logging.getLogger(__name__)
+
+# Each document's entities and keywords, as a sparse vector of weights
+# keyed by a global dictionary of features, so that analyses can load the
+# vectors for many documents by reading one column rather than joining
+# the entities and keywords of every document.
+#
+# Like the person statistics, the vectors of committed documents are
+# recalculated in the same transaction.
+
+
+class Feature(db.Model):
+    """
+    A feature of document vectors: either an entity or a keyword.
+    """
+    __tablename__ = "features"
+
+    id        = Column(Integer, primary_key=True)
+    entity_id = Column(Integer, ForeignKey('entities.id', ondelete='CASCADE'), unique=True)
+    keyword   = Column(String(100), unique=True)
+
+    def __repr__(self):
+        return "<Feature id=%s, entity_id=%s, keyword=%s>" % (self.id, self.entity_id, self.keyword)
+
+
+class DocumentFeatures(db.Model):
+    """
+    A document's feature vector. Entities are weighted by the number of
+    times they're mentioned, and keywords by their relevance.
+
+    The vector is packed as little-endian 32-bit feature ids followed by
+    32-bit float weights, see `pack` and `unpack`.
+    """
+    __tablename__ = "document_features"
+
+    doc_id    = Column(Integer, ForeignKey('documents.id', ondelete='CASCADE'), primary_key=True, autoincrement=False)
+    vector    = Column(LargeBinary, nullable=False)
+    # when the vector was last calculated
+    updated_at = Column(DateTime(timezone=True), index=True, nullable=False, server_default=func.now())
+
+    @classmethod
+    def pack(cls, feature_ids, weights):
+        """ Pack a vector of +feature_ids+ and their +weights+ into a string. """
+        return numpy.asarray(feature_ids, dtype='<u4').tostring() + numpy.asarray(weights, dtype='<f4').tostring()
+
+    @classmethod
+    def unpack(cls, packed):
+        """ Unpack a string packed with `pack` into (feature_ids, weights) arrays. """
+        n = len(packed) // 8
+        return (numpy.frombuffer(packed, dtype='<u4', count=n),
+                numpy.frombuffer(packed, dtype='<f4', count=n, offset=n * 4))
+
+    @classmethod
+    def matrix(cls, docs):
+        """
+        The feature vectors of +docs+, a DocumentSet, as a sparse
+        document-by-feature matrix.
+
+        :return: (doc_ids, feature_ids, matrix) where +matrix+ is a scipy CSR
+                 matrix of weights, whose rows are for the sorted +doc_ids+ and
+                 whose columns are for the sorted +feature_ids+. Documents without
+                 a vector have empty rows.
+        """
+        from scipy.sparse import csr_matrix
+
+        doc_ids = numpy.array(sorted(docs.read_ids()), dtype=int)
+
+        rows = []
+        cols = []
+        weights = []
+        for doc_id, packed in db.session.query(cls.doc_id, cls.vector).filter(docs.contains(cls.doc_id)):
+            ids, w = cls.unpack(packed)
+            rows.append(numpy.repeat(numpy.searchsorted(doc_ids, doc_id), len(ids)))
+            cols.append(ids)
+            weights.append(w)
+
+        if rows:
+            rows = numpy.concatenate(rows)
+            cols = numpy.concatenate(cols)
+            weights = numpy.concatenate(weights)
+        else:
+            rows = cols = numpy.zeros(0, dtype=int)
+            weights = numpy.zeros(0, dtype='<f4')
+
+        feature_ids, cols = numpy.unique(cols, return_inverse=True)
+        matrix = csr_matrix((weights, (rows, cols)), shape=(len(doc_ids), len(feature_ids)))
+
+        return doc_ids, feature_ids, matrix
+
+    def __repr__(self):
+        return "<DocumentFeatures doc=%s, %d features>" % (self.doc_id, len(self.vector) // 8)
+
+
+# add the features of documents to the dictionary
+NEW_FEATURES_SQL = [
+    """
+    insert ignore into features (entity_id)
+    select distinct entity_id
+    from document_entities
+    where entity_id is not null and doc_id in (%(ids)s)
+    """,
+    """
+    insert ignore into features (keyword)
+    select distinct keyword
+    from document_keywords
+    where doc_id in (%(ids)s)
+    """,
+]
+
+# (doc_id, feature_id, weight) rows for documents
+WEIGHTS_SQL = """
+    select de.doc_id, f.id, sum(coalesce(nullif(de.count, 0), 1))
+    from
+      document_entities de
+      inner join features f on f.entity_id = de.entity_id
+    where de.doc_id in (%(ids)s)
+    group by 1, 2
+
+    union all
+
+    select dk.doc_id, f.id, max(dk.relevance)
+    from
+      document_keywords dk
+      inner join features f on f.keyword = dk.keyword
+    where dk.doc_id in (%(ids)s)
+    group by 1, 2
+    """
+
+
+def calculate(execute, doc_ids):
+    """
+    Calculate and store the vectors of +doc_ids+, running SQL with
+    +execute+. Documents without any features get empty vectors.
+    """
+    doc_ids = [int(i) for i in doc_ids if i is not None]
+    if not doc_ids:
+        return
+
+    ids = ','.join(str(i) for i in doc_ids)
+    for sql in NEW_FEATURES_SQL:
+        execute(text(sql % {'ids': ids}))
+
+    vectors = dict((doc_id, ([], [])) for doc_id in doc_ids)
+    for doc_id, feature_id, weight in execute(text(WEIGHTS_SQL % {'ids': ids})):
+        vectors[doc_id][0].append(feature_id)
+        vectors[doc_id][1].append(weight)
+
+    # deleted documents don't exist any more
+    existing = set(r[0] for r in execute(text("select id from documents where id in (%s)" % ids)))
+
+    execute(text("delete from document_features where doc_id in (%s)" % ids))
+    rows = []
+    for doc_id, (feature_ids, weights) in vectors.iteritems():
+        if doc_id in existing:
+            order = numpy.argsort(feature_ids)
+            rows.append({
+                'doc_id': doc_id,
+                'vector': DocumentFeatures.pack(numpy.asarray(feature_ids)[order], numpy.asarray(weights)[order]),
+            })
+
+    if rows:
+        execute(DocumentFeatures.__table__.insert(), rows)
+
+
+def refresh(session, doc_ids):
+    """ Recalculate the vectors of these documents. """
+    calculate(session.execute, doc_ids)
+    log.debug("Refreshed feature vectors for %d documents" % len(doc_ids))
+
+
+def rebuild(batch_size=1000):
+    """ Calculate the vectors of all documents, committing after each batch. """
+    conn = db.engine.connect()
+    try:
+        doc_ids = [r[0] for r in conn.execute("select id from documents order by id")]
+        log.info("Rebuilding document_features for %d documents" % len(doc_ids))
+
+        for i in xrange(0, len(doc_ids), batch_size):
+            trans = conn.begin()
+            try:
+                calculate(conn.execute, doc_ids[i:i + batch_size])
+                trans.commit()
+            except:
+                trans.rollback()
+                raise
+    finally:
+        conn.close()
+
+
+@documents_committing.connect
+def refresh_changed(session, doc_ids, person_ids):
+    if doc_ids:
+        refresh(session, doc_ids)
@@ -0,0 +1,129 @@
+import itertools
+
+from sqlalchemy import Table, Column, Integer, MetaData
+from sqlalchemy.sql import select, func
+
+from ..app import db
+from .document import Document
+
+
+class DocumentSet(object):
+    """
+    A set of documents that other queries are filtered by, such as the
+    documents matching a dashboard form. Use `contains` to filter a query
+    by a document id column:
+
+        docs = DocumentSet(db.session.query(Document.id).filter(...))
+        query.filter(docs.contains(Utterance.doc_id))
+
+    By default the set is backed by the query itself, which the database
+    runs as a subquery. Call `materialise` to store the ids in a temporary
+    table instead, which is cheaper when the query is expensive and the set is
+    used many times. A temporary table belongs to the database connection,
+    so it can only be used in the current transaction, can only be referenced
+    once per query (a MySQL restriction) and must be dropped with `drop`.
+    Use `copy_to` to use the set on other connections.
+
+    A set can also be made from an explicit list of ids, which is only
+    sensible for small sets.
+    """
+
+    _counter = itertools.count()
+
+    # rows per INSERT when copying the temporary table
+    COPY_BATCH_SIZE = 10000
+
+    def __init__(self, query=None, ids=None):
+        if query is None and ids is None:
+            raise ValueError("Need either a query or ids")
+
+        # a query selecting Document.id
+        self.query = query
+        self._ids = list(ids) if ids is not None else None
+        self._count = None
+        self.table = None
+
+    @classmethod
+    def coerce(cls, docs):
+        """ Return +docs+ as a DocumentSet, if it's a list of ids. """
+        if docs is None or isinstance(docs, DocumentSet):
+            return docs
+        return cls(ids=docs)
+
+    def select(self):
+        """ A SELECT statement for the document ids in this set. """
+        if self.table is not None:
+            return select([self.table.c.doc_id])
+
+        if self._ids is not None:
+            return select([Document.id]).where(Document.id.in_(self._ids))
+
+        # don't let the documents table be correlated with an enclosing query
+        return self.query.statement.correlate(None)
+
+    def contains(self, column):
+        """ A clause that is true when +column+, a document id, is in this set. """
+        if self._ids is not None:
+            return column.in_(self._ids)
+        return column.in_(self.select())
+
+    def ids(self):
+        """ The document ids in this set, as a list. """
+        if self._ids is None:
+            self._ids = [r[0] for r in db.session.execute(self.select())]
+        return self._ids
+
+    def read_ids(self):
+        """ The document ids in this set, as a list. Unlike `ids`, the ids
+        aren't kept, which would make `contains` use them instead of the
+        temporary table. """
+        return [r[0] for r in db.session.execute(self.select())]
+
+    def __len__(self):
+        if self._ids is not None:
+            return len(self._ids)
+
+        if self._count is None:
+            self._count = db.session.execute(
+                select([func.count()]).select_from(self.select().alias())).scalar()
+        return self._count
+
+    def materialise(self):
+        """ Store the document ids in a temporary table, and use that
+        table for filtering from now on. """
+        if self.table is None and self._ids is None:
+            table = Table('tmp_document_set_%d' % next(self._counter), MetaData(),
+                          Column('doc_id', Integer, primary_key=True),
+                          prefixes=['TEMPORARY'], mysql_engine='MEMORY')
+
+            conn = db.session.connection()
+            table.create(bind=conn)
+            conn.execute(table.insert().from_select(['doc_id'], self.query.statement))
+            self.table = table
+
+        return self
+
+    def copy_to(self, conn, doc_ids):
+        """ Create the temporary table on another connection, +conn+, so that
+        queries using this set can be run on it. +doc_ids+ are the set's ids
+        from `read_ids`, read once on the session's connection, so that every
+        copy has the same documents as the original table and the set's query
+        isn't run again. Does nothing if the set isn't materialised. """
+        if self.table is not None:
+            self.table.create(bind=conn)
+            for i in xrange(0, len(doc_ids), self.COPY_BATCH_SIZE):
+                conn.execute(self.table.insert(), [{'doc_id': d} for d in doc_ids[i:i + self.COPY_BATCH_SIZE]])
+
+    def drop(self, conn=None):
+        """ Drop the temporary table, if any, from +conn+ or the session's
+        connection. """
+        if self.table is not None:
+            self.table.drop(bind=conn or db.session.connection())
+            if conn is None:
+                self.table = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.drop()
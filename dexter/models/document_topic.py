@@ -0,0 +1,105 @@
+import json
+
+import numpy
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    Integer,
+    Float,
+    DateTime,
+    Index,
+    func,
+    )
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.dialects.mysql import LONGBLOB, LONGTEXT
+
+from ..app import db
+
+
+class TopicModel(db.Model):
+    """
+    A topic model that is updated with new documents each day, rather
+    than being fitted from scratch whenever topics are needed. Documents
+    are assigned topics from the current model, in DocumentTopic.
+
+    The fitted model is stored in +state+, see `dexter.analysis.topic_model.OnlineLDA`.
+    """
+    __tablename__ = "topic_models"
+
+    # number of topics in new models
+    N_TOPICS = 50
+    # number of features kept for describing each topic
+    N_FEATURES = 20
+
+    id            = Column(Integer, primary_key=True)
+    n_topics      = Column(Integer, nullable=False)
+    # number of documents the model has been fitted to
+    n_documents   = Column(Integer, nullable=False, default=0)
+    # the model has been fitted to documents created before this time
+    trained_until = Column(DateTime)
+
+    # the serialised model
+    state         = deferred(Column(LONGBLOB))
+    # the top (entity_id, weight) pairs for each topic, as json
+    features      = deferred(Column(LONGTEXT))
+
+    created_at    = Column(DateTime(timezone=True), index=True, unique=False, nullable=False, server_default=func.now())
+    updated_at    = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.current_timestamp())
+
+    # associations
+    document_topics = relationship("DocumentTopic", cascade='all, delete-orphan', passive_deletes=True)
+
+    def load(self):
+        """ The fitted model, an OnlineLDA instance. """
+        from ..analysis.topic_model import OnlineLDA
+        return OnlineLDA.loads(self.state)
+
+    def save(self, lda):
+        """ Store the fitted model +lda+, an OnlineLDA instance. """
+        self.state = lda.dumps()
+
+        features = []
+        components = lda.components_
+        for weights in components:
+            indexes = numpy.argsort(weights)[:-self.N_FEATURES - 1:-1]
+            features.append([[int(lda.vocab[i]), float(weights[i])] for i in indexes])
+        self.features = json.dumps(features)
+
+    def topic_features(self):
+        """ The top (entity_id, weight) pairs for each topic. """
+        return json.loads(self.features) if self.features else []
+
+    def __repr__(self):
+        return "<TopicModel id=%s, topics=%s, docs=%s>" % (self.id, self.n_topics, self.n_documents)
+
+    @classmethod
+    def current(cls):
+        """ The most recently fitted topic model, or None. """
+        return cls.query\
+            .filter(cls.trained_until != None)\
+            .order_by(cls.id.desc())\
+            .first()
+
+
+class DocumentTopic(db.Model):
+    """
+    The weight of a topic of a TopicModel in a document. Only topics with
+    a weight of at least MIN_WEIGHT are stored.
+    """
+    __tablename__ = "document_topics"
+
+    MIN_WEIGHT = 0.1
+
+    id             = Column(Integer, primary_key=True)
+    doc_id         = Column(Integer, ForeignKey('documents.id', ondelete='CASCADE'), index=True, nullable=False)
+    topic_model_id = Column(Integer, ForeignKey('topic_models.id', ondelete='CASCADE'), nullable=False)
+    topic          = Column(Integer, nullable=False)
+    weight         = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index('ix_document_topics_model_doc', 'topic_model_id', 'doc_id'),
+        Index('ix_document_topics_model_topic', 'topic_model_id', 'topic'),
+    )
+
+    def __repr__(self):
+        return "<DocumentTopic doc=%s, model=%s, topic=%s, weight=%s>" % (self.doc_id, self.topic_model_id, self.topic, self.weight)
@@ -10,6 +10,7 @@ from sqlalchemy import (
     ForeignKey,
     )
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
 
 from ..app import db
 
@@ -32,6 +33,11 @@ class Medium(db.Model):
     def group_name(self):
         return self.medium_group or self.name
 
+    @classmethod
+    def group_name_column(cls):
+        """ An SQL expression for the group name, like +group_name+. """
+        return func.coalesce(func.nullif(cls.medium_group, ''), cls.name)
+
     @classmethod
     def for_url(cls, url):
         domain = get_tld(url)
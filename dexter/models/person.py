@@ -175,6 +175,7 @@ class Person(db.Model):
         this person.
         """
         from . import Author, DocumentSource, Entity, Person, Document
+        from .document_changes import person_changed
 
         if self.id is None or dest.id is None:
             raise ArgumentError("Both id's must be valid")
@@ -193,6 +194,10 @@ class Person(db.Model):
         for m in [Author, DocumentSource, Entity]:
             m.query.filter(m.person_id == self.id).update({'person_id': dest.id})
 
+        # the session doesn't see bulk updates, so make sure the documents
+        # that are now linked to dest are refreshed
+        person_changed(db.session, dest.id)
+
         # ensure we remember the old person as an alias of the new one
         e = Entity.get_or_create('person', self.name)
         e.person = dest
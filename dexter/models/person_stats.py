@@ -0,0 +1,150 @@
+import logging
+from datetime import timedelta
+
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    Integer,
+    Date,
+    Index,
+    )
+from sqlalchemy.sql import text
+
+from ..app import db
+
+log = logging.getLogger(__name__)
+
+# Per-person daily statistics, so that a single person's sources, utterances
+# and mentions over a period can be read without analysing every person
+# in every document over that period.
+#
+# Like the daily rollups, the statistics for the days (and countries) that
+# committed documents are on, or were on, and for people that were merged
+# or relinked to other entities, are recalculated by the `refresh_stale`
+# task shortly after they're committed, see stale.py.
+
+
+class PersonDailyStats(db.Model):
+    """
+    How often a person was a source, was quoted and was mentioned in
+    documents on a day, for each medium and analysis nature.
+    """
+    __tablename__ = "person_daily_stats"
+
+    id                 = Column(Integer, primary_key=True)
+    person_id          = Column(Integer, ForeignKey('people.id', ondelete='CASCADE'), nullable=False)
+    date               = Column(Date, nullable=False)
+    country_id         = Column(Integer, ForeignKey('countries.id', ondelete='CASCADE'), nullable=False)
+    medium_id          = Column(Integer, ForeignKey('mediums.id', ondelete='CASCADE'), nullable=False)
+    analysis_nature_id = Column(Integer, ForeignKey('analysis_natures.id', ondelete='CASCADE'), nullable=False)
+
+    # number of times the person is a document source
+    source_count       = Column(Integer, nullable=False, default=0)
+    # number of utterances by the person
+    utterance_count    = Column(Integer, nullable=False, default=0)
+    # number of documents mentioning the person
+    mention_count      = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('ix_person_daily_stats_person_date', 'person_id', 'date'),
+        Index('ix_person_daily_stats_date_country', 'date', 'country_id'),
+    )
+
+
+# %(where)s limits the documents to those being counted, and
+# %(source_people)s and %(entity_people)s limit the people
+STATS_SQL = """
+    insert into person_daily_stats
+      (person_id, date, country_id, medium_id, analysis_nature_id, source_count, utterance_count, mention_count)
+    select
+      person_id, date, country_id, medium_id, analysis_nature_id, sum(sources), sum(utterances), sum(mentions)
+    from (
+      select
+        ds.person_id, date(d.published_at) as date, d.country_id, d.medium_id, d.analysis_nature_id,
+        count(*) as sources, 0 as utterances, 0 as mentions
+      from
+        document_sources ds
+        inner join documents d on d.id = ds.doc_id
+      where ds.person_id is not null %(where)s %(source_people)s
+      group by 1, 2, 3, 4, 5
+
+      union all
+
+      select
+        e.person_id, date(d.published_at), d.country_id, d.medium_id, d.analysis_nature_id,
+        0, count(*), 0
+      from
+        utterances u
+        inner join entities e on e.id = u.entity_id
+        inner join documents d on d.id = u.doc_id
+      where e.person_id is not null %(where)s %(entity_people)s
+      group by 1, 2, 3, 4, 5
+
+      union all
+
+      select
+        e.person_id, date(d.published_at), d.country_id, d.medium_id, d.analysis_nature_id,
+        0, 0, count(distinct de.doc_id)
+      from
+        document_entities de
+        inner join entities e on e.id = de.entity_id
+        inner join documents d on d.id = de.doc_id
+      where e.person_id is not null %(where)s %(entity_people)s
+      group by 1, 2, 3, 4, 5
+    ) counts
+    group by 1, 2, 3, 4, 5
+    """
+
+
+def stats_sql(where='', person_ids=None):
+    """ The SQL to insert the statistics for documents matching +where+
+    and, if given, only the people in the comma-separated +person_ids+. """
+    people = {'source_people': '', 'entity_people': ''}
+    if person_ids:
+        people = {
+            'source_people': 'and ds.person_id in (%s)' % person_ids,
+            'entity_people': 'and e.person_id in (%s)' % person_ids,
+        }
+    return STATS_SQL % dict(where=where, **people)
+
+
+def refresh(session, days):
+    """ Recalculate the statistics for these (day, country_id) pairs. """
+    where = "and d.published_at >= :start and d.published_at < :end and d.country_id = :country_id"
+
+    for day, country_id in sorted(days):
+        params = {'start': day, 'end': day + timedelta(days=1), 'country_id': country_id}
+
+        session.execute(text("delete from person_daily_stats where date = :start and country_id = :country_id"), params)
+        session.execute(text(stats_sql(where)), params)
+
+    log.debug("Refreshed person statistics for %d days" % len(days))
+
+
+def refresh_people(session, person_ids):
+    """ Recalculate all the statistics of these people. """
+    ids = ','.join(str(int(i)) for i in person_ids if i is not None)
+    if not ids:
+        return
+
+    session.execute(text("delete from person_daily_stats where person_id in (%s)" % ids))
+    session.execute(text(stats_sql(person_ids=ids)))
+
+    log.debug("Refreshed person statistics for %d people" % len(person_ids))
+
+
+def rebuild():
+    """ Rebuild all the statistics from scratch, in one transaction. """
+    conn = db.engine.connect()
+    trans = conn.begin()
+    try:
+        log.info("Rebuilding person_daily_stats")
+        conn.execute("delete from person_daily_stats")
+        conn.execute(text(stats_sql()))
+        trans.commit()
+    except:
+        trans.rollback()
+        raise
+    finally:
+        conn.close()
+
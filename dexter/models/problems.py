@@ -1,3 +1,5 @@
+from sqlalchemy import and_
+
 from .analysis_nature import AnalysisNature
 
 
@@ -9,10 +11,18 @@ class DocumentAnalysisProblem(object):
     """
     _problems = {}
     natures = None
+    # is this a problem with one of the document's sources, rather than
+    # with the document itself?
+    source_problem = False
 
     def check(self, doc):
         raise NotImplementedError()
 
+    def condition(self):
+        """ An SQL clause that is true for a document with this problem or,
+        for source problems, for a document source with this problem. """
+        raise NotImplementedError()
+
     def filter_query(self, query):
         raise NotImplementedError()
 
@@ -45,9 +55,12 @@ class MissingTopic(DocumentAnalysisProblem):
     def check(self, doc):
         return doc.topic is None
 
-    def filter_query(self, query):
+    def condition(self):
         from .document import Document
-        return query.filter(Document.topic == None)  # noqa
+        return Document.topic_id == None  # noqa
+
+    def filter_query(self, query):
+        return query.filter(self.condition())
 
 
 class MissingOrigin(DocumentAnalysisProblem):
@@ -59,9 +72,12 @@ class MissingOrigin(DocumentAnalysisProblem):
     def check(self, doc):
         return doc.origin_location_id is None
 
-    def filter_query(self, query):
+    def condition(self):
         from .document import Document
-        return query.filter(Document.origin == None)  # noqa
+        return Document.origin_location_id == None  # noqa
+
+    def filter_query(self, query):
+        return query.filter(self.condition())
 
 
 class NotChildFocused(DocumentAnalysisProblem):
@@ -74,12 +90,15 @@ class NotChildFocused(DocumentAnalysisProblem):
         return (doc.analysis_nature.nature == 'children'
                 and doc.child_focus is None)
 
-    def filter_query(self, query):
+    def condition(self):
         from .document import Document
+        return and_(AnalysisNature.nature == 'children',
+                    Document.child_focus == None)  # noqa
+
+    def filter_query(self, query):
         return query\
             .join(AnalysisNature)\
-            .filter(AnalysisNature.nature == 'children',
-                   Document.child_focus == None)  # noqa
+            .filter(self.condition())
 
 
 class SourceWithoutFunction(DocumentAnalysisProblem):
@@ -87,16 +106,21 @@ class SourceWithoutFunction(DocumentAnalysisProblem):
     short_desc = 'source without a function'
     long_desc  = 'This document has a source without a function.'
     natures = (AnalysisNature.CHILDREN, AnalysisNature.ELECTIONS)
+    source_problem = True
 
     def check(self, doc):
         return any(ds.source_type != 'child' and ds.source_function_id is None for ds in doc.sources)
 
+    def condition(self):
+        from . import DocumentSource
+        return and_(DocumentSource.source_type != 'child',
+                    DocumentSource.source_function_id == None)  # noqa
+
     def filter_query(self, query):
         from . import DocumentSource
         return query\
                 .join(DocumentSource)\
-                .filter(DocumentSource.source_type != 'child')\
-                .filter(DocumentSource.function == None)  # noqa
+                .filter(self.condition())
 
 
 class SourceWithoutAffiliation(DocumentAnalysisProblem):
@@ -104,16 +128,21 @@ class SourceWithoutAffiliation(DocumentAnalysisProblem):
     short_desc = 'source without an affiliation'
     long_desc  = 'This document has a source without an affiliation.'
     natures = (AnalysisNature.CHILDREN, AnalysisNature.ELECTIONS)
+    source_problem = True
 
     def check(self, doc):
         return any(ds.source_type != 'child' and ds.affiliation_id is None for ds in doc.sources)
 
+    def condition(self):
+        from . import DocumentSource
+        return and_(DocumentSource.source_type != 'child',
+                    DocumentSource.affiliation_id == None)  # noqa
+
     def filter_query(self, query):
         from . import DocumentSource
         return query\
                 .join(DocumentSource)\
-                .filter(DocumentSource.source_type != 'child')\
-                .filter(DocumentSource.affiliation == None)  # noqa
+                .filter(self.condition())
 
 
 class ChildSourceWithoutAge(DocumentAnalysisProblem):
@@ -121,16 +150,21 @@ class ChildSourceWithoutAge(DocumentAnalysisProblem):
     short_desc = 'child source without an age'
     long_desc  = 'This document has a child source without an age.'
     natures = (AnalysisNature.CHILDREN, AnalysisNature.ELECTIONS)
+    source_problem = True
 
     def check(self, doc):
         return any(ds.source_type == 'child' and ds.source_age_id is None for ds in doc.sources)
 
+    def condition(self):
+        from . import DocumentSource
+        return and_(DocumentSource.source_type == 'child',
+                    DocumentSource.source_age_id == None)  # noqa
+
     def filter_query(self, query):
         from . import DocumentSource
         return query\
                 .join(DocumentSource)\
-                .filter(DocumentSource.source_type == 'child')\
-                .filter(DocumentSource.age == None)  # noqa
+                .filter(self.condition())
 
 
 class ChildSourceWithoutRole(DocumentAnalysisProblem):
@@ -138,13 +172,18 @@ class ChildSourceWithoutRole(DocumentAnalysisProblem):
     short_desc = 'child source without a role'
     long_desc  = 'This document has a child source without a role.'
     natures = (AnalysisNature.CHILDREN, AnalysisNature.ELECTIONS)
+    source_problem = True
 
     def check(self, doc):
         return any(ds.source_type == 'child' and ds.source_role_id is None for ds in doc.sources)
 
+    def condition(self):
+        from . import DocumentSource
+        return and_(DocumentSource.source_type == 'child',
+                    DocumentSource.source_role_id == None)  # noqa
+
     def filter_query(self, query):
         from . import DocumentSource
         return query\
                 .join(DocumentSource)\
-                .filter(DocumentSource.source_type == 'child')\
-                .filter(DocumentSource.role == None)  # noqa
+                .filter(self.condition())
@@ -0,0 +1,175 @@
+import hashlib
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    Integer,
+    String,
+    Text,
+    DateTime,
+    func,
+    )
+from sqlalchemy.orm import relationship
+from sqlalchemy_imageattach.context import current_store
+from werkzeug.urls import url_decode, url_encode
+
+from ..app import db
+
+log = logging.getLogger(__name__)
+
+
+class ReportJob(db.Model):
+    """
+    A report, such as an Excel export of the activity dashboard, which is
+    built in the background by the `build_report` task because it's slow.
+    The finished file is kept in the attachment store.
+
+    A job is identified by a fingerprint of the report and the dashboard
+    form arguments, so that identical requests made shortly after each
+    other share a job rather than building the same file again.
+    """
+    __tablename__ = "report_jobs"
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    # pending and running jobs that haven't been updated for this
+    # long are assumed to have been lost, and are started again
+    STALE_AFTER = timedelta(hours=1)
+    # finished reports are reused for identical requests for this long
+    REUSE_FOR = timedelta(hours=1)
+    # reports are deleted after this long
+    KEEP_FOR = timedelta(days=7)
+
+    OBJECT_TYPE = 'report'
+
+    id           = Column(Integer, primary_key=True)
+    fingerprint  = Column(String(32), index=True, nullable=False)
+    # the kind of report, the activity form's format
+    report       = Column(String(50), nullable=False)
+    # url-encoded activity form arguments
+    args         = Column(Text, nullable=False)
+    status       = Column(String(10), nullable=False, default=PENDING)
+    # percent complete
+    progress     = Column(Integer, nullable=False, default=0)
+
+    filename     = Column(String(256), nullable=False)
+    mimetype     = Column(String(256), nullable=False)
+
+    created_by_user_id = Column(Integer, ForeignKey('users.id'), index=True)
+
+    # set in UTC by us rather than by the database, because they're
+    # compared with utcnow
+    created_at   = Column(DateTime(timezone=True), index=True, unique=False, nullable=False, default=datetime.utcnow, server_default=func.now())
+    updated_at   = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow, server_default=func.now())
+
+    # Associations
+    created_by   = relationship("User", foreign_keys=[created_by_user_id])
+
+    @property
+    def form_args(self):
+        """ The activity form arguments, as a MultiDict. """
+        return url_decode(self.args)
+
+    def is_done(self):
+        return self.status == self.DONE
+
+    def is_failed(self):
+        return self.status == self.FAILED
+
+    def is_stale(self):
+        """ Has this job been waiting or running for too long? """
+        if self.status not in (self.PENDING, self.RUNNING):
+            return False
+        return self.updated_at is not None and \
+            self.updated_at.replace(tzinfo=None) < datetime.utcnow() - self.STALE_AFTER
+
+    @property
+    def store_key(self):
+        return '%d/%s' % (self.id, self.filename)
+
+    def put_file(self, data):
+        """ Store the report's file, from the file-like object +data+. """
+        current_store.put_file(data, self.OBJECT_TYPE, self.store_key, 0, 0, self.mimetype, False)
+
+    def delete_file(self):
+        current_store.delete_file(self.OBJECT_TYPE, self.store_key, 0, 0, self.mimetype)
+
+    @property
+    def download_url(self):
+        return current_store.get_url(self.OBJECT_TYPE, self.store_key, 0, 0, self.mimetype)
+
+    def to_json(self):
+        return {
+            'id': self.id,
+            'report': self.report,
+            'status': self.status,
+            'progress': self.progress,
+            'filename': self.filename,
+        }
+
+    def __repr__(self):
+        return "<ReportJob id=%s, report=%s, status=%s>" % (self.id, self.report, self.status)
+
+    @classmethod
+    def encode_args(cls, args):
+        """ Url-encode the form arguments +args+, a MultiDict or list of pairs,
+        in a canonical order. """
+        if hasattr(args, 'iteritems'):
+            args = args.iteritems(multi=True)
+        return url_encode(sorted(args))
+
+    @classmethod
+    def make_fingerprint(cls, report, args):
+        m = hashlib.md5()
+        m.update(report)
+        m.update(cls.encode_args(args))
+        return m.hexdigest()
+
+    @classmethod
+    def find_or_create(cls, report, args):
+        """
+        Find a recent job for this report with these form arguments,
+        or create a pending one. Failed and stale jobs aren't reused.
+        """
+        fingerprint = cls.make_fingerprint(report, args)
+
+        job = cls.query\
+            .filter(cls.fingerprint == fingerprint,
+                    cls.created_at >= datetime.utcnow() - cls.REUSE_FOR)\
+            .order_by(cls.created_at.desc(), cls.id.desc())\
+            .first()
+
+        if job is None or job.is_failed() or job.is_stale():
+            job = cls()
+            job.fingerprint = fingerprint
+            job.report = report
+            job.args = cls.encode_args(args)
+            job.status = cls.PENDING
+            job.progress = 0
+
+        return job
+
+    @classmethod
+    def set_progress(cls, job_id, progress):
+        """ Record the progress of a running job. This is done outside the
+        current transaction, so that the progress can be seen while it's running. """
+        db.engine.execute(cls.__table__.update()
+                          .where(cls.__table__.c.id == job_id)
+                          .values(progress=int(progress)))
+
+    @classmethod
+    def delete_old(cls):
+        """ Delete jobs, and their files, that are older than KEEP_FOR.
+        This does NOT commit the transaction. """
+        jobs = cls.query.filter(cls.created_at < datetime.utcnow() - cls.KEEP_FOR).all()
+        for job in jobs:
+            if job.is_done():
+                job.delete_file()
+            db.session.delete(job)
+
+        log.info("Deleted %d old report jobs" % len(jobs))
@@ -0,0 +1,98 @@
+import logging
+
+from sqlalchemy.sql import text
+
+from ..app import app, db
+from .document_changes import documents_committing
+
+log = logging.getLogger(__name__)
+
+# The views in resources/mysql/views.sql are convenient, but they join a lot
+# of tables and are slow to query over many documents. If REPORTING_TABLES
+# is set, each view is materialised into a reporting table with the same
+# columns (see resources/mysql/reporting.sql), and the models in views.py
+# read from those tables instead.
+#
+# The rows for a document are refreshed from the views whenever the
+# document or one of its children is committed, which costs a delete and an
+# indexed insert per table for each document. A person can be on thousands
+# of documents, so the rows of documents linked to a changed person are
+# refreshed later by the `refresh_stale` task, see stale.py. Changes to
+# lookup tables, such as affiliations or media, aren't tracked, so rebuild
+# the tables after changing those.
+
+ENABLED = app.config.get('REPORTING_TABLES', False)
+
+# view name -> reporting table name
+TABLES = [
+    ('documents_view', 'documents_report'),
+    ('document_sources_view', 'document_sources_report'),
+    ('person_utterances_view', 'person_utterances_report'),
+    ('documents_fairness_view', 'documents_fairness_report'),
+    ('documents_keywords_view', 'documents_keywords_report'),
+    ('documents_places_view', 'documents_places_report'),
+    ('documents_principles_view', 'documents_principles_report'),
+    ('documents_children_view', 'documents_children_report'),
+    ('documents_issues_view', 'documents_issues_report'),
+    ('documents_taxonomies_view', 'documents_taxonomies_report'),
+]
+
+# refresh this many documents at a time
+BATCH_SIZE = 500
+
+
+def table_for(view):
+    """ The name of the table to read +view+ from. """
+    if ENABLED:
+        return dict(TABLES)[view]
+    return view
+
+
+def person_doc_ids(session, person_ids):
+    """ Ids of documents whose reporting rows include details of these people. """
+    ids = ','.join(str(int(i)) for i in person_ids)
+
+    rows = session.execute(text("""
+        select doc_id from document_sources where person_id in (%s)
+        union
+        select d.id from documents d inner join authors a on d.author_id = a.id where a.person_id in (%s)
+        """ % (ids, ids)))
+
+    return set(r[0] for r in rows)
+
+
+def refresh(session, doc_ids):
+    """ Replace the reporting rows for these documents with fresh rows from the views. """
+    doc_ids = sorted(set(i for i in doc_ids if i is not None))
+
+    for i in xrange(0, len(doc_ids), BATCH_SIZE):
+        ids = ','.join(str(int(x)) for x in doc_ids[i:i + BATCH_SIZE])
+
+        for view, table in TABLES:
+            session.execute(text("delete from %s where document_id in (%s)" % (table, ids)))
+            session.execute(text("insert into %s select * from %s where document_id in (%s)" % (table, view, ids)))
+
+    log.debug("Refreshed reporting rows for %d documents" % len(doc_ids))
+
+
+def rebuild():
+    """ Rebuild all the reporting tables from scratch. Each table is built
+    alongside the old one and swapped in when it's ready, so readers
+    always see a complete table. """
+    conn = db.engine.connect()
+    try:
+        for view, table in TABLES:
+            log.info("Rebuilding %s" % table)
+            conn.execute("drop table if exists %s_new, %s_old" % (table, table))
+            conn.execute("create table %s_new like %s" % (table, table))
+            conn.execute("insert into %s_new select * from %s" % (table, view))
+            conn.execute("rename table %s to %s_old, %s_new to %s" % (table, table, table, table))
+            conn.execute("drop table %s_old" % table)
+    finally:
+        conn.close()
+
+
+@documents_committing.connect
+def refresh_changed(session, doc_ids, person_ids):
+    if ENABLED and doc_ids:
+        refresh(session, doc_ids)
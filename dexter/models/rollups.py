@@ -0,0 +1,173 @@
+import logging
+from datetime import timedelta
+
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    Integer,
+    String,
+    Date,
+    Index,
+    )
+from sqlalchemy.sql import text
+
+from ..app import app, db
+
+log = logging.getLogger(__name__)
+
+# The public feeds summarise documents and sources over a date range. Rather
+# than grouping the views over the whole range on every request, we keep
+# per-day rollups of the counts for each country, and the feeds sum those.
+#
+# Whenever documents are committed, the days (and countries) those documents
+# are on, or were on before they changed, are marked as stale, and the rollups
+# for those days are recalculated from the views by the `refresh_stale` task,
+# see stale.py. Changes to lookup tables, such as affiliations or media, aren't
+# tracked, so rebuild the rollups after changing those.
+
+ENABLED = app.config.get('DAILY_ROLLUPS', True)
+
+
+class DailyTopicCount(db.Model):
+    """
+    Number of documents per topic, medium and place, on a day.
+    A document with many places is counted once for each place.
+    """
+    __tablename__ = "daily_topic_counts"
+
+    id                = Column(Integer, primary_key=True)
+    date              = Column(Date, nullable=False)
+    country_id        = Column(Integer, ForeignKey('countries.id', ondelete='CASCADE'), nullable=False)
+    medium_group      = Column(String(100))
+    medium_type       = Column(String(100))
+    topic             = Column(String(150))
+    province_code     = Column(String(5))
+    province_name     = Column(String(20))
+    municipality_code = Column(String(10))
+    municipality_name = Column(String(50))
+    record_count      = Column(Integer, nullable=False)
+
+    __table_args__ = (Index('ix_daily_topic_counts_country_date', 'country_id', 'date'), )
+
+
+class DailyOriginCount(db.Model):
+    """
+    Number of documents per origin and medium, on a day.
+    """
+    __tablename__ = "daily_origin_counts"
+
+    id                = Column(Integer, primary_key=True)
+    date              = Column(Date, nullable=False)
+    country_id        = Column(Integer, ForeignKey('countries.id', ondelete='CASCADE'), nullable=False)
+    medium_group      = Column(String(100))
+    medium_type       = Column(String(100))
+    origin            = Column(String(50))
+    record_count      = Column(Integer, nullable=False)
+
+    __table_args__ = (Index('ix_daily_origin_counts_country_date', 'country_id', 'date'), )
+
+
+class DailySourceCount(db.Model):
+    """
+    Number of document sources per source, affiliation, medium and place, on a day.
+    """
+    __tablename__ = "daily_source_counts"
+
+    id                = Column(Integer, primary_key=True)
+    date              = Column(Date, nullable=False)
+    country_id        = Column(Integer, ForeignKey('countries.id', ondelete='CASCADE'), nullable=False)
+    source_type       = Column(String(50))
+    source_name       = Column(String(100))
+    gender            = Column(String(150))
+    race              = Column(String(50))
+    affiliation       = Column(String(100))
+    affiliation_code  = Column(String(10))
+    affiliation_group = Column(String(100))
+    medium_group      = Column(String(100))
+    medium_type       = Column(String(100))
+    province_code     = Column(String(5))
+    province_name     = Column(String(20))
+    municipality_code = Column(String(10))
+    municipality_name = Column(String(50))
+    record_count      = Column(Integer, nullable=False)
+
+    __table_args__ = (Index('ix_daily_source_counts_country_date', 'country_id', 'date'), )
+
+
+# Each rollup is filled by grouping the views. %(where)s limits the
+# documents to those that are being rolled up.
+ROLLUPS = [
+    (DailyTopicCount, """
+        insert into daily_topic_counts
+          (date, country_id, medium_group, medium_type, topic,
+           province_code, province_name, municipality_code, municipality_name, record_count)
+        select
+          date(d.published_at), d.country_id, dv.medium_group, dv.medium_type, dv.topic,
+          pv.province_code, pv.province_name, pv.municipality_code, pv.municipality_name, count(*)
+        from
+          documents d
+          inner join documents_view dv on dv.document_id = d.id
+          left join documents_places_view pv on pv.document_id = d.id
+        %(where)s
+        group by 1, 2, 3, 4, 5, 6, 7, 8, 9
+        """),
+    (DailyOriginCount, """
+        insert into daily_origin_counts
+          (date, country_id, medium_group, medium_type, origin, record_count)
+        select
+          date(d.published_at), d.country_id, dv.medium_group, dv.medium_type, dv.origin, count(*)
+        from
+          documents d
+          inner join documents_view dv on dv.document_id = d.id
+        %(where)s
+        group by 1, 2, 3, 4, 5
+        """),
+    (DailySourceCount, """
+        insert into daily_source_counts
+          (date, country_id, source_type, source_name, gender, race,
+           affiliation, affiliation_code, affiliation_group, medium_group, medium_type,
+           province_code, province_name, municipality_code, municipality_name, record_count)
+        select
+          date(d.published_at), d.country_id, sv.source_type, sv.source_name, sv.gender, sv.race,
+          sv.affiliation, sv.affiliation_code, sv.affiliation_group, dv.medium_group, dv.medium_type,
+          pv.province_code, pv.province_name, pv.municipality_code, pv.municipality_name, count(*)
+        from
+          document_sources_view sv
+          inner join documents d on d.id = sv.document_id
+          inner join documents_view dv on dv.document_id = d.id
+          left join documents_places_view pv on pv.document_id = d.id
+        %(where)s
+        group by 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15
+        """),
+]
+
+
+def refresh(session, days):
+    """ Recalculate the rollups for these (day, country_id) pairs. """
+    where = "where d.published_at >= :start and d.published_at < :end and d.country_id = :country_id"
+
+    for day, country_id in sorted(days):
+        params = {'start': day, 'end': day + timedelta(days=1), 'country_id': country_id}
+
+        for model, sql in ROLLUPS:
+            session.execute(text("delete from %s where date = :start and country_id = :country_id" % model.__tablename__), params)
+            session.execute(text(sql % {'where': where}), params)
+
+    log.debug("Refreshed rollups for %d days" % len(days))
+
+
+def rebuild():
+    """ Rebuild all the rollups from scratch, in one transaction. """
+    conn = db.engine.connect()
+    trans = conn.begin()
+    try:
+        for model, sql in ROLLUPS:
+            log.info("Rebuilding %s" % model.__tablename__)
+            conn.execute("delete from %s" % model.__tablename__)
+            conn.execute(text(sql % {'where': ''}))
+        trans.commit()
+    except:
+        trans.rollback()
+        raise
+    finally:
+        conn.close()
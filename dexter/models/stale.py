@@ -0,0 +1,115 @@
+import logging
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    Date,
+    )
+from sqlalchemy.sql import text
+
+from ..app import db
+from .document_changes import documents_committing, changed_days
+from .reporting import person_doc_ids
+from . import reporting, rollups, person_stats
+
+log = logging.getLogger(__name__)
+
+# The daily rollups and per-person statistics summarise whole days, which is
+# too expensive to do in the transaction that saves a document: every
+# document saved today would rebuild, and lock, today's rows, so concurrent
+# saves would queue up behind each other. Similarly, changing a person
+# changes the reporting rows of every document they're on.
+#
+# Instead, committing documents marks the days (and countries) they're on,
+# or were on, and the people that changed, as stale. Marking is cheap, and
+# the `refresh_stale` task recalculates each stale day, and the statistics
+# of each stale person, once, shortly afterwards, no matter how many
+# documents changed it.
+
+
+class StaleDay(db.Model):
+    """
+    A day and country whose summaries need to be recalculated.
+    """
+    __tablename__ = "stale_days"
+
+    date       = Column(Date, primary_key=True)
+    country_id = Column(Integer, primary_key=True, autoincrement=False)
+
+
+class StalePerson(db.Model):
+    """
+    A person whose details changed, or who was merged or linked to
+    other entities, so their statistics and the summaries of the days
+    they're on need to be recalculated.
+    """
+    __tablename__ = "stale_people"
+
+    person_id  = Column(Integer, primary_key=True, autoincrement=False)
+
+
+def mark(session, days=(), person_ids=()):
+    """ Mark these (day, country_id) pairs and people as stale. """
+    days = [{'date': d, 'country_id': c} for d, c in days]
+    if days:
+        session.execute(text("insert ignore into stale_days (date, country_id) values (:date, :country_id)"), days)
+
+    people = [{'person_id': i} for i in person_ids if i is not None]
+    if people:
+        session.execute(text("insert ignore into stale_people (person_id) values (:person_id)"), people)
+
+
+@documents_committing.connect
+def mark_changed(session, doc_ids, person_ids):
+    mark(session, changed_days(session, doc_ids), person_ids)
+
+
+def claim():
+    """ Remove and return everything that's stale, as (days, person_ids), and commit,
+    so that documents can be marked again while we're busy. """
+    days = set((r.date, r.country_id) for r in StaleDay.query.with_for_update())
+    person_ids = set(r.person_id for r in StalePerson.query.with_for_update())
+
+    for day, country_id in days:
+        StaleDay.query.filter(StaleDay.date == day, StaleDay.country_id == country_id).delete()
+    if person_ids:
+        StalePerson.query.filter(StalePerson.person_id.in_(person_ids)).delete(synchronize_session=False)
+
+    db.session.commit()
+    return days, person_ids
+
+
+def refresh_stale():
+    """ Recalculate the summaries for everything that's stale, and commit. """
+    days, person_ids = claim()
+    if not days and not person_ids:
+        return
+
+    try:
+        # people's names, genders and races are in the reporting rows and
+        # source rollups of the documents they're on
+        person_docs = person_doc_ids(db.session, person_ids) if person_ids else set()
+
+        if reporting.ENABLED and person_docs:
+            reporting.refresh(db.session, person_docs)
+
+        if rollups.ENABLED:
+            rollup_days = set(days)
+            if person_docs:
+                rollup_days.update(changed_days(db.session, person_docs))
+            rollups.refresh(db.session, rollup_days)
+
+        person_stats.refresh(db.session, days)
+        # merged and relinked people move sources, mentions and utterances
+        # between people without changing their documents
+        person_stats.refresh_people(db.session, person_ids)
+
+        db.session.commit()
+    except:
+        db.session.rollback()
+        # try again next time
+        mark(db.session, days, person_ids)
+        db.session.commit()
+        raise
+
+    log.info("Refreshed %d stale days and %d stale people" % (len(days), len(person_ids)))
@@ -181,13 +181,15 @@ class DocumentTaxonomy(db.Model):
             self.label.encode('utf-8'), self.score, self.document)
 
     @classmethod
-    def summary_for_docs(cls, doc_ids):
-        """ Summary of document taxonomies.
+    def summary_for_docs(cls, docs):
+        """ Summary of document taxonomies for a DocumentSet, or a list of document ids.
         """
+        from .document_set import DocumentSet
+
         return db.session.query(
             cls.label,
             func.count(1).label('freq'))\
-            .filter(cls.doc_id.in_(doc_ids))\
+            .filter(DocumentSet.coerce(docs).contains(cls.doc_id))\
             .group_by(cls.label)\
             .order_by(desc('freq'), cls.label)\
             .all()
@@ -1,4 +1,21 @@
 class ProcessingError(StandardError):
     pass
 
+
+class RateLimitExceeded(ProcessingError):
+    """ Raised when a call to an external service isn't allowed right now
+    because of rate limits or quotas. +retry_after+ is the number of seconds
+    to wait before trying again. """
+    def __init__(self, service, retry_after):
+        super(RateLimitExceeded, self).__init__(
+            "Rate limit for %s exceeded, try again in %d seconds" % (service, retry_after))
+        self.service = service
+        self.retry_after = retry_after
+
+
+class NotModified(StandardError):
+    """ Raised by a conditional fetch when the server indicates that
+    the document hasn't changed since it was last crawled. """
+    pass
+
 from document_processor import DocumentProcessor
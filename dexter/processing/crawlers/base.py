@@ -5,6 +5,7 @@ import logging
 import requests
 
 from ...models import Medium
+from ...processing import NotModified
 
 class BaseCrawler(object):
     log = logging.getLogger(__name__)
@@ -22,24 +23,51 @@ class BaseCrawler(object):
         return urlunparse(['http', netloc, parts.path.rstrip('/') or '/', parts.params, parts.query, None])
 
     def crawl(self, doc):
-        """ Crawl this document. """
+        """ Crawl this document. Raises NotModified if the document
+        has been crawled before and hasn't changed since. """
         doc.url = self.canonicalise_url(doc.url)
-        raw_html = self.fetch(doc.url)
+        raw_html = self.fetch(doc.url, doc)
         self.extract(doc, raw_html)
 
-    def fetch(self, url):
+    def fetch(self, url, doc=None):
         """
         Fetch and return the raw HTML for this url.
         The return content is a unicode string.
         """
+        r = self.get(url, doc)
+
+        # this decodes r.content using a guessed encoding
+        return r.text
+
+    def get(self, url, doc=None, timeout=10):
+        """
+        GET this url and return the response. If +doc+ is given, the request
+        is made conditional on the validators from its last crawl, and
+        the validators are updated from the response.
+
+        Raises NotModified if the server says the document hasn't changed.
+        """
         self.log.info("Fetching URL: " + url)
 
-        r = requests.get(url, timeout=10)
+        headers = {}
+        if doc is not None:
+            if doc.etag:
+                headers['If-None-Match'] = doc.etag
+            if doc.last_modified:
+                headers['If-Modified-Since'] = doc.last_modified
+
+        r = requests.get(url, headers=headers, timeout=timeout)
+        if r.status_code == 304:
+            raise NotModified(url)
+
         # raise an HTTPError on badness
         r.raise_for_status()
 
-        # this decodes r.content using a guessed encoding
-        return r.text
+        if doc is not None:
+            doc.etag = r.headers.get('etag')
+            doc.last_modified = r.headers.get('last-modified')
+
+        return r
 
     def extract(self, doc, raw_html):
         """ Run extractions on the HTML. Subclasses should override this
@@ -23,14 +23,9 @@ class MGCrawler(BaseCrawler):
         # force http, strip www, strip trailing slash
         return urlunparse(['http', 'mg.co.za', parts.path.rstrip('/'), parts.params, None, None])
 
-    def fetch(self, url):
+    def fetch(self, url, doc=None):
         url = url.replace("article", "print")
-
-        self.log.info("Fetching URL: " + url)
-
-        r = requests.get(url)
-        # raise an HTTPError on badness
-        r.raise_for_status()
+        r = self.get(url, doc)
 
         return r.text.encode('utf8')
 
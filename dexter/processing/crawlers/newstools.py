@@ -4,6 +4,7 @@ import requests
 from dateutil.parser import parse
 
 from .base import BaseCrawler
+from ..ratelimit import limiter
 from ...models import Author, AuthorType, Medium, Document
 
 
@@ -63,7 +64,11 @@ class NewstoolsCrawler(BaseCrawler):
         return doc
 
     def fetch_text(self, url):
+        rate_limiter = limiter('newstools')
+        rate_limiter.acquire()
+
         r = requests.get(url, verify=False, timeout=60)
+        rate_limiter.throttle(r)
         r.raise_for_status()
         return self.unescape(r.text)
 
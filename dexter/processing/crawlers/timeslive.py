@@ -15,9 +15,9 @@ class TimesLiveCrawler(BaseCrawler):
         parts = urlparse(url)
         return bool(self.TL_RE.match(parts.netloc))
 
-    def fetch(self, url):
+    def fetch(self, url, doc=None):
         url = url + '?service=print'
-        return super(TimesLiveCrawler, self).fetch(url)
+        return super(TimesLiveCrawler, self).fetch(url, doc)
 
     def extract(self, doc, raw_html):
         """ Extract text and other things from the raw_html for this document. """
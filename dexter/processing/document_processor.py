@@ -1,15 +1,19 @@
-import time
 import logging
+from datetime import datetime, timedelta
 
 import requests
-from requests.exceptions import HTTPError
+from requests.exceptions import HTTPError, RequestException
 from sqlalchemy.sql import desc
 
 from ..models import Document, db, DocumentType, DocumentFairness, Fairness, AnalysisNature, DocumentTaxonomy
-from ..processing import ProcessingError
+from ..models.document import hash_text
+from ..processing import ProcessingError, NotModified
+from .ratelimit import limiter
 
 from .crawlers import *  # noqa
-from .extractors import AlchemyExtractor, CalaisExtractor, SourcesExtractor, PlacesExtractor
+from .extractors import AlchemyExtractor, CalaisExtractor, SourcesExtractor, PlacesExtractor, CanonicalExtractor
+from .duplicates import DuplicateFinder
+from .language import LanguageIdentifier
 
 
 class DocumentProcessor:
@@ -19,6 +23,16 @@ class DocumentProcessor:
     FEED_USER = 'dexter'
     FEED_PASSWORD = None
 
+    # What to do with near-duplicates of existing documents:
+    #  - 'reuse': copy extractions from the canonical copy
+    #  - 'skip': link to the canonical copy but don't run remote extractions
+    #  - None: don't look for near-duplicates
+    DUPLICATE_POLICY = 'reuse'
+
+    # Document attributes that crawling can change
+    CRAWLED_FIELDS = ['url', 'raw_html', 'medium', 'country', 'title', 'summary', 'published_at',
+                      'author', 'text', 'text_hash', 'etag', 'last_modified']
+
     def __init__(self):
         self.newstools_crawler = NewstoolsCrawler()
 
@@ -43,6 +57,9 @@ class DocumentProcessor:
             CalaisExtractor(),
             SourcesExtractor(),
             PlacesExtractor()]
+        self.canonical_extractor = CanonicalExtractor()
+        self.duplicate_finder = DuplicateFinder()
+        self.language_identifier = LanguageIdentifier()
 
     def valid_url(self, url):
         """ Is this a URL we can process? """
@@ -79,12 +96,16 @@ class DocumentProcessor:
     def process_document(self, doc):
         """ Process an existing document. """
         self.normalise(doc)
+        self.link_canonical(doc)
         self.extract(doc)
 
     def normalise(self, doc):
         """ Run some normalisations on the document. """
         doc.normalise_text()
 
+        if doc.language is None:
+            doc.language = self.language_identifier.identify(doc.text)
+
         if not doc.document_type:
             doc.document_type = DocumentType.query.filter(DocumentType.name == 'News story').one()
 
@@ -101,11 +122,149 @@ class DocumentProcessor:
                 crawler.crawl(doc)
                 return
 
+    def recrawl(self, doc):
+        """ Re-crawl an existing document, using a conditional request
+        where we can. Extractions are only re-run if the normalised text has
+        changed and the document hasn't yet been checked by a monitor.
+        Checked documents are left alone, otherwise we'd lose their work
+        and the offsets of their entities and quotes.
+
+        Returns True if the document's text changed, False otherwise.
+        """
+        old = dict((f, getattr(doc, f)) for f in self.CRAWLED_FIELDS)
+        text_hash = doc.text_hash or hash_text(doc.text)
+
+        try:
+            self.crawl(doc)
+        except NotModified:
+            self.log.info("Document %s hasn't been modified, skipping" % doc)
+            return False
+        except RequestException as e:
+            self.log.warn("Error re-fetching %s: %s" % (doc, e), exc_info=e)
+            raise ProcessingError("Error re-fetching document %s: %s" % (doc, e))
+
+        doc.normalise_text()
+        changed = doc.text_hash != text_hash
+
+        if doc.checked_by_user_id is not None:
+            # the crawl has overwritten the title, author, etc. too
+            for f, value in old.iteritems():
+                setattr(doc, f, value)
+
+            if changed:
+                self.log.info("Text for document %s has changed, but it has already been checked, keeping it as it was" % doc)
+            return False
+
+        if not changed:
+            self.log.info("Text for document %s hasn't changed, skipping extraction" % doc)
+            return False
+
+        doc.language = self.language_identifier.identify(doc.text)
+
+        self.log.info("Text for document %s has changed, re-running extraction" % doc)
+
+        # throw away old extractions, including the cached calais results
+        collections = ['sources', 'utterances', 'entities', 'keywords', 'taxonomies', 'places']
+        for name in collections:
+            for obj in getattr(doc, name):
+                db.session.delete(obj)
+        doc.raw_calais = None
+        db.session.flush()
+        db.session.expire(doc, collections)
+
+        self.process_document(doc)
+        return True
+
+    def backfill_languages(self, batch_size=1000):
+        """ Identify the language of documents that don't have one yet. """
+        count = 0
+
+        while True:
+            docs = Document.query\
+                .filter(Document.language == None, Document.text != None, Document.text != '')\
+                .order_by(Document.id)\
+                .limit(batch_size)\
+                .all()  # noqa
+            if not docs:
+                break
+
+            for doc in docs:
+                # use '' for unidentifiable text, so that we don't see it again
+                doc.language = self.language_identifier.identify(doc.text) or ''
+            db.session.commit()
+
+            count += len(docs)
+            self.log.info("Identified languages for %d documents" % count)
+
+    def recrawl_recent(self, days=2):
+        """ Re-crawl documents published in the last +days+ days,
+        committing after each one. """
+        since = datetime.utcnow() - timedelta(days=days)
+        doc_ids = [d[0] for d in db.session
+                   .query(Document.id)
+                   .filter(Document.url != None, Document.published_at >= since)
+                   .order_by(desc(Document.published_at))
+                   .all()]  # noqa
+
+        changed = 0
+        self.log.info("Re-crawling %d documents published since %s" % (len(doc_ids), since))
+
+        for doc_id in doc_ids:
+            doc = Document.query.get(doc_id)
+            try:
+                if self.recrawl(doc):
+                    changed += 1
+                db.session.commit()
+            except ProcessingError as e:
+                db.session.rollback()
+                self.log.info("Error re-crawling %s: %s" % (doc, e.message))
+            except Exception as e:
+                # don't let one document stop the others
+                db.session.rollback()
+                self.log.error("Error re-crawling %s: %s" % (doc, e), exc_info=e)
+
+        self.log.info("Re-crawled %d documents, %d changed" % (len(doc_ids), changed))
+
     def extract(self, doc):
         """ Run extraction routines on a document. """
-        for extractor in self.extractors:
+        extractors = self.extractors_for(doc)
+        self.check_rate_limits(extractors)
+
+        for extractor in extractors:
             extractor.extract(doc)
 
+    def check_rate_limits(self, extractors=None):
+        """ Raise RateLimitExceeded if any of the remote services used by
+        these extractors won't allow all the calls they make for a document
+        right now, so that we don't waste quota on one service, or on some
+        of a service's calls, only to be stopped and pay for them again. """
+        for extractor in (extractors or self.extractors):
+            if extractor.service:
+                extractor.key_pool().check(calls=extractor.calls_per_document)
+
+    def extractors_for(self, doc):
+        """ The extractors to run for this document. Near-duplicates of
+        another document don't use the remote extractors, and we only use
+        extractors that support the document's language. """
+        extractors = self.extractors
+
+        if doc.canonical and self.DUPLICATE_POLICY:
+            extractors = [e for e in extractors if not e.service]
+            if self.DUPLICATE_POLICY == 'reuse':
+                extractors = [self.canonical_extractor] + extractors
+
+        return [e for e in extractors if e.languages is None or doc.language in e.languages]
+
+    def link_canonical(self, doc):
+        """ If this document is a near-duplicate of an existing document,
+        link it to that canonical document. Returns the canonical
+        document, or None. """
+        if not self.DUPLICATE_POLICY:
+            return None
+
+        doc.canonical = self.duplicate_finder.find_canonical(doc)
+        return doc.canonical
+
     def get_or_set_entity(self, entities, entity):
         key = (entity.group.lower(), entity.name.lower())
         if key in entities:
@@ -165,6 +324,9 @@ class DocumentProcessor:
                 self.log.info("No medium for URL, ignoring: %s" % url)
                 return
 
+            # don't bother crawling if we can't process it
+            self.check_rate_limits()
+
             # this sets up basic info
             doc = self.newstools_crawler.crawl(item)
             try:
@@ -175,17 +337,18 @@ class DocumentProcessor:
                 raise ProcessingError("Error fetching document: %s" % (e,))
 
             # is it sane?
-            # TODO: this breaks for isolezwe and other non-english media
-            if not doc.text or 'the' not in doc.text:
-                self.log.info("Document %s doesn't have reasonable-looking text, ignoring: %s..." % (url, doc.text[0:100]))
+            doc.language = self.language_identifier.identify(doc.text)
+            if not doc.language:
+                self.log.info("Document %s doesn't have text in a language we recognise, ignoring: %s..." % (url, (doc.text or '')[0:100]))
                 db.session.rollback()
                 return None
 
             doc.analysis_nature = AnalysisNature.lookup(AnalysisNature.ANCHOR)
             self.process_document(doc)
 
-            # only add a document if it has sources or utterances
-            if doc.sources or doc.utterances:
+            # only add a document if it has sources or utterances, near-duplicates
+            # skipped by policy rely on the canonical document having passed this check
+            if doc.sources or doc.utterances or (doc.canonical and self.DUPLICATE_POLICY == 'skip'):
                 db.session.add(doc)
                 db.session.commit()
                 self.log.info("Successfully processed feed item: %s as document %d" % (url, doc.id))
@@ -206,16 +369,21 @@ class DocumentProcessor:
         if self.FEED_PASSWORD is None:
             raise ValueError("%s.FEED_PASSWORD must be set." % self.__class__.__name__)
 
+        rate_limiter = limiter('newstools')
+        rate_limiter.acquire()
+
         r = requests.get(self.FEED_URL % day.strftime('%d-%m-%Y'),
                          auth=(self.FEED_USER, self.FEED_PASSWORD),
                          verify=False,
                          timeout=60)
+        rate_limiter.throttle(r)
         r.raise_for_status()
 
         return ET.fromstring(r.text)
 
     def backfill_taxonomies(self):
-        """ Backfill taxonomies for articles.
+        """ Backfill taxonomies for articles, until we run out of documents
+        or hit a Calais rate limit, in which case RateLimitExceeded is raised.
         """
         doc_ids = (db.session
                    .query(Document.id)
@@ -240,28 +408,15 @@ class DocumentProcessor:
                     self.backfill_taxonomies_for_document(doc)
                     count += 1
                 except HTTPError as e:
-                    if 'requests per day' in e.response.text:
-                        # we're done for the day
-                        self.log.info("Exceeded OpenCalais quota for the day, stopping: %s" % e.message)
-                        break
-
-                    elif e.response.status_code == 429:
-                        # per-minute quota exceeded, try again later
-                        self.log.info("Temporary failure for %s: %s" % (doc, e.message))
-                        time.sleep(60)
-
-                    else:
-                        self.log.info("Error backfilling for %s: %s" % (doc, e.message), exc_info=e)
+                    self.log.info("Error backfilling for %s: %s" % (doc, e.message), exc_info=e)
 
         finally:
             self.log.info("Backfilled %d documents" % count)
 
     def backfill_taxonomies_for_document(self, doc):
-        from dexter.app import app
         self.log.info("Backfilling taxonomies for %s" % doc)
 
         cx = CalaisExtractor()
-        cx.API_KEY = app.config['CALAIS_API_KEY2']
         calais = cx.fetch_data(doc)
         cx.extract_topics(doc, calais)
 
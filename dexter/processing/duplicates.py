@@ -0,0 +1,99 @@
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy.sql import func, desc
+from sqlalchemy.orm import undefer
+
+from ..models import db, Document, DocumentLSHBand
+from ..minhash import MinHasher, band_hashes, similarity
+
+
+class DuplicateFinder(object):
+    """ Finds near-duplicates of a document amongst recently published
+    documents, such as the same wire story syndicated across a number of
+    IOL titles.
+
+    Each document gets a MinHash signature of its text, and the hashes of
+    the bands of that signature are stored in the document_lsh_bands
+    table. Candidates are documents that share at least one band hash,
+    and a candidate is a near-duplicate if the estimated similarity of
+    the texts is at least THRESHOLD.
+    """
+    log = logging.getLogger(__name__)
+
+    # 64 hashes in 16 bands of 4: documents with similarity of 0.8 are
+    # almost certainly candidates, those below 0.4 rarely are
+    NUM_PERM = 64
+    BANDS = 16
+    THRESHOLD = 0.8
+
+    # only look for duplicates published this many days either side of the document
+    WINDOW_DAYS = 3
+
+    # don't bother with very short documents
+    MIN_WORDS = 50
+
+    def __init__(self):
+        self.hasher = MinHasher(num_perm=self.NUM_PERM)
+
+    def fingerprint(self, doc):
+        """ Calculate and set the MinHash signature and LSH bands for this document. """
+        if not doc.text or (doc.word_count or 0) < self.MIN_WORDS:
+            doc.minhash = None
+            doc.lsh_bands = []
+            return None
+
+        sig = self.hasher.text_signature(doc.text)
+        doc.minhash = self.hasher.pack(sig)
+        doc.lsh_bands = [DocumentLSHBand(band_hash=h) for h in band_hashes(sig, self.BANDS)]
+
+        return sig
+
+    def find_canonical(self, doc):
+        """ Fingerprint this document and return its canonical copy,
+        or None if it's not a near-duplicate of another document. """
+        sig = self.fingerprint(doc)
+        if sig is None:
+            return None
+
+        published_at = doc.published_at or datetime.utcnow()
+        window = timedelta(days=self.WINDOW_DAYS)
+        hashes = [b.band_hash for b in doc.lsh_bands]
+
+        query = db.session\
+            .query(DocumentLSHBand.doc_id, func.count(1).label('bands'))\
+            .join(Document, Document.id == DocumentLSHBand.doc_id)\
+            .filter(DocumentLSHBand.band_hash.in_(hashes))\
+            .filter(Document.canonical_id == None)\
+            .filter(Document.published_at.between(published_at - window, published_at + window))  # noqa
+        if doc.id:
+            query = query.filter(Document.id != doc.id)
+
+        candidate_ids = [r[0] for r in query
+                         .group_by(DocumentLSHBand.doc_id)
+                         .order_by(desc('bands'))
+                         .limit(10)
+                         .all()]
+        if not candidate_ids:
+            return None
+
+        candidates = Document.query\
+            .options(undefer('minhash'))\
+            .filter(Document.id.in_(candidate_ids))\
+            .all()
+
+        best = None
+        best_score = self.THRESHOLD
+        for candidate in candidates:
+            if not candidate.minhash:
+                continue
+
+            score = similarity(sig, self.hasher.unpack(candidate.minhash))
+            if score >= best_score:
+                best = candidate
+                best_score = score
+
+        if best:
+            self.log.info("%s is a near-duplicate of %s (similarity %.2f)" % (doc, best, best_score))
+
+        return best
@@ -2,3 +2,4 @@ from .alchemy import AlchemyExtractor
 from .calais import CalaisExtractor
 from .sources import SourcesExtractor
 from .places import PlacesExtractor
+from .canonical import CanonicalExtractor
@@ -1,6 +1,7 @@
 from .base import BaseExtractor
 from .alchemy_api import AlchemyAPI
-from ...processing import ProcessingError
+from ...processing import ProcessingError, RateLimitExceeded
+from ..ratelimit import seconds_until_tomorrow
 from ...models import DocumentKeyword, DocumentEntity, Entity, Utterance, DocumentTaxonomy
 
 import logging
@@ -12,6 +13,10 @@ class AlchemyExtractor(BaseExtractor):
     useful goodies from a document.
     """
     API_KEY = None
+    service = 'alchemy'
+    # entities and keywords
+    calls_per_document = 2
+    languages = set(['en', 'fr', 'de', 'it', 'pt', 'ru', 'es', 'sv'])
 
     def __init__(self):
         # NOTE: set the ENV variable ALCHEMY_API_KEY before running the process
@@ -137,40 +142,38 @@ class AlchemyExtractor(BaseExtractor):
         log.info("Added %d taxonomy for %s" % (added, doc))
 
     def fetch_entities(self, doc):
-        res = self.alchemy.entities('text', doc.text.encode('utf-8'), {
+        res = self.call('entities', 'text', doc.text.encode('utf-8'), {
             'quotations': 1,
             'linkedData': 0,
             'sentiment': 0,
         })
-        if res['status'] == 'ERROR':
-            raise ProcessingError(res['statusInfo'])
-
         return res['entities']
 
     def fetch_keywords(self, doc):
-        res = self.alchemy.keywords('text', doc.text.encode('utf-8'))
-        if res['status'] == 'ERROR':
-            raise ProcessingError(res['statusInfo'])
-
+        res = self.call('keywords', 'text', doc.text.encode('utf-8'))
         return res['keywords']
 
     def fetch_taxonomy(self, doc):
-        res = self.alchemy.taxonomy('text', doc.text.encode('utf-8'))
-        if res['status'] == 'ERROR':
-            raise ProcessingError(res['statusInfo'])
-
+        res = self.call('taxonomy', 'text', doc.text.encode('utf-8'))
         return res['taxonomy']
 
-    def all_offsets(self, text, needle):
-        needle_len = len(needle)
-        start = 0
-        offsets = []
+    def call(self, method, *args):
+        """ Call an AlchemyAPI method, within our rate limits, and return the
+        result. If a key's daily quota is used up, the next key is tried.
+        Raises ProcessingError if the call fails. """
+        pool = self.key_pool()
+
+        for _ in pool.keys:
+            rate_limiter = pool.acquire()
+            self.alchemy.apikey = rate_limiter.api_key
+
+            res = getattr(self.alchemy, method)(*args)
+            if res['status'] == 'ERROR':
+                if res['statusInfo'] == 'daily-transaction-limit-exceeded':
+                    rate_limiter.exhausted()
+                    continue
+                raise ProcessingError(res['statusInfo'])
 
-        while True:
-            start = text.find(needle, start)
-            if start == -1:
-                break
-            offsets.append((start, needle_len))
-            start += needle_len
+            return res
 
-        return ' '.join('%d:%d' % p for p in offsets[:100])
+        raise RateLimitExceeded(self.service, seconds_until_tomorrow())
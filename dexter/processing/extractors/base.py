@@ -1,13 +1,40 @@
 import re
 import md5
 
+from .. import ratelimit
+
 import logging
 log = logging.getLogger(__name__)
 
 
 class BaseExtractor:
+    # name of the remote service this extractor calls, if any
+    service = None
+    # number of calls to the service for each document
+    calls_per_document = 1
+    # ISO 639-1 codes of the languages this extractor supports, or None for any
+    languages = None
+
+    def key_pool(self):
+        """ The pool of API keys for this extractor's service. """
+        return ratelimit.key_pool(self.service, [getattr(self, 'API_KEY', None)])
+
     def normalise_name(self, name):
         return re.sub('(?!^)([A-Z]+)', r'_\1', name).lower()
 
     def hash_url(self, url):
         return md5.md5(url).hexdigest()
+
+    def all_offsets(self, text, needle):
+        needle_len = len(needle)
+        start = 0
+        offsets = []
+
+        while True:
+            start = text.find(needle, start)
+            if start == -1:
+                break
+            offsets.append((start, needle_len))
+            start += needle_len
+
+        return ' '.join('%d:%d' % p for p in offsets[:100])
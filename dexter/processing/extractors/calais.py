@@ -2,6 +2,8 @@ import requests
 import json
 
 from .base import BaseExtractor
+from ..ratelimit import seconds_until_tomorrow
+from ...processing import RateLimitExceeded
 from ...models import DocumentEntity, Entity, Utterance, DocumentTaxonomy
 
 import logging
@@ -13,6 +15,8 @@ class CalaisExtractor(BaseExtractor):
     useful goodies from a document.
     """
     API_KEY = None
+    service = 'calais'
+    languages = set(['en', 'fr', 'es'])
 
     def __init__(self):
         pass
@@ -94,17 +98,31 @@ class CalaisExtractor(BaseExtractor):
             if not self.API_KEY:
                 raise ValueError('%s.%s.API_KEY must be defined.' % (self.__module__, self.__class__.__name__))
 
-            res = requests.post(
-                'https://api.thomsonreuters.com/permid/calais',
-                doc.text.encode('utf-8'),
-                headers={
-                    'x-ag-access-token': self.API_KEY,
-                    'Content-Type': 'text/raw',
-                    'outputFormat': 'application/json',
-                })
-            if res.status_code != 200:
+            pool = self.key_pool()
+
+            for _ in pool.keys:
+                rate_limiter = pool.acquire()
+
+                res = requests.post(
+                    'https://api.thomsonreuters.com/permid/calais',
+                    doc.text.encode('utf-8'),
+                    headers={
+                        'x-ag-access-token': rate_limiter.api_key,
+                        'Content-Type': 'text/raw',
+                        'outputFormat': 'application/json',
+                    })
+                if res.status_code == 200:
+                    break
+
                 log.error(res.text)
+                if res.status_code == 429 and 'requests per day' in res.text:
+                    # this key's daily quota is used up, try the next key
+                    rate_limiter.exhausted()
+                    continue
+                rate_limiter.throttle(res)
                 res.raise_for_status()
+            else:
+                raise RateLimitExceeded(self.service, seconds_until_tomorrow())
 
             res = res.json()
             doc.raw_calais = json.dumps(res)
@@ -0,0 +1,59 @@
+from .base import BaseExtractor
+from ...models import DocumentEntity, DocumentKeyword, Utterance, DocumentTaxonomy
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class CanonicalExtractor(BaseExtractor):
+    """ For a near-duplicate of a document we've already processed, copy
+    the extractions from its canonical copy rather than asking the
+    remote APIs to do the same work again.
+
+    The texts are only similar, not identical, so offsets are
+    recalculated against this document's text.
+    """
+
+    def extract(self, doc):
+        canonical = doc.canonical
+        if not canonical or not doc.text:
+            return
+
+        log.info("Copying extractions for %s from %s" % (doc, canonical))
+
+        for de in canonical.entities:
+            copy = DocumentEntity()
+            copy.entity = de.entity
+            copy.relevance = de.relevance
+            copy.count = de.count
+            copy.offset_list = self.all_offsets(doc.text, de.entity.name)
+            doc.add_entity(copy)
+
+        for u in canonical.utterances:
+            copy = Utterance()
+            copy.quote = u.quote
+            copy.entity = u.entity
+
+            needle = u.quote.strip(' .')
+            offset = doc.text.find(needle)
+            if offset > -1:
+                copy.offset = offset
+                copy.length = len(needle)
+
+            doc.add_utterance(copy)
+
+        for k in canonical.keywords:
+            copy = DocumentKeyword()
+            copy.keyword = k.keyword
+            copy.relevance = k.relevance
+            copy.offset_list = self.all_offsets(doc.text, k.keyword)
+            doc.add_keyword(copy)
+
+        for dt in canonical.taxonomies:
+            copy = DocumentTaxonomy()
+            copy.document = doc
+            copy.label = dt.label
+            copy.score = dt.score
+
+        log.info("Copied %d entities, %d utterances, %d keywords and %d taxonomies for %s" % (
+            len(doc.entities), len(doc.utterances), len(doc.keywords), len(doc.taxonomies), doc))
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import codecs
+from collections import Counter
+
+
+class LanguageIdentifier(object):
+    """ Identifies the language of a text, using character n-gram profiles
+    as described in Cavnar & Trenkle, N-Gram-Based Text Categorization (1994).
+
+    Language profiles are built from the sample texts in the languages
+    directory, named by ISO 639-1 language code. Only the start of a text
+    is used, which is more than enough to identify the language of a
+    news article.
+    """
+    SAMPLE_DIR = os.path.join(os.path.dirname(__file__), 'languages')
+
+    LANGUAGES = {
+        'af': 'Afrikaans',
+        'en': 'English',
+        'st': 'Sesotho',
+        'tn': 'Setswana',
+        'xh': 'isiXhosa',
+        'zu': 'isiZulu',
+    }
+
+    # languages so close that they're always near each other
+    RELATED = [
+        set(['st', 'tn']),
+        set(['xh', 'zu']),
+    ]
+
+    MAX_NGRAM = 3
+    PROFILE_SIZE = 300
+    # only look at this many characters of a text
+    SAMPLE_CHARS = 1000
+    # texts with fewer letters than this, such as headlines and
+    # sports scores, are too short to identify reliably
+    MIN_LETTERS = 40
+    # if the best language is further than this fraction of the maximum
+    # distance, the text is probably not one of our languages. Texts in our
+    # languages are usually within 0.5, others from about 0.6.
+    MAX_DISTANCE = 0.57
+    # the best language must be at least this much closer than any
+    # unrelated language, otherwise we can't tell them apart
+    MIN_MARGIN = 0.05
+
+    NON_LETTERS_RE = re.compile(r'[\W\d_]+', re.UNICODE)
+
+    _profiles = None
+
+    def __init__(self):
+        if LanguageIdentifier._profiles is None:
+            LanguageIdentifier._profiles = self.load_profiles()
+        self.profiles = LanguageIdentifier._profiles
+
+    def load_profiles(self):
+        profiles = {}
+        for code in self.LANGUAGES.iterkeys():
+            with codecs.open(os.path.join(self.SAMPLE_DIR, '%s.txt' % code), 'r', 'utf-8') as f:
+                profiles[code] = self.profile(f.read())
+        return profiles
+
+    def ngrams(self, text):
+        """ Count the 1 to MAX_NGRAM character n-grams in +text+. Words are
+        padded with spaces so that n-grams capture word beginnings and endings. """
+        counts = Counter()
+        for word in self.NON_LETTERS_RE.sub(' ', text.lower()).split():
+            word = ' %s ' % word
+            for n in xrange(1, self.MAX_NGRAM + 1):
+                for i in xrange(len(word) - n + 1):
+                    counts[word[i:i + n]] += 1
+
+        # single spaces tell us nothing
+        counts.pop(' ', None)
+        return counts
+
+    def profile(self, text):
+        """ A profile is a map from the most frequent n-grams to their rank. """
+        ranked = sorted(self.ngrams(text).iteritems(), key=lambda p: (-p[1], p[0]))
+        return {gram: i for i, (gram, _) in enumerate(ranked[:self.PROFILE_SIZE])}
+
+    def distances(self, text):
+        """ The out-of-place distance between +text+ and each language
+        profile, as a fraction of the maximum possible distance. """
+        profile = self.profile(text[:self.SAMPLE_CHARS])
+        if not profile:
+            return {}
+
+        worst = float(len(profile) * self.PROFILE_SIZE)
+        distances = {}
+        for code, lang_profile in self.profiles.iteritems():
+            d = 0
+            for gram, rank in profile.iteritems():
+                other = lang_profile.get(gram)
+                d += self.PROFILE_SIZE if other is None else abs(rank - other)
+            distances[code] = d / worst
+
+        return distances
+
+    def identify(self, text):
+        """ Return the ISO 639-1 code of the language of +text+, or None
+        if it can't be identified. """
+        if not text or len(self.NON_LETTERS_RE.sub('', text[:self.SAMPLE_CHARS])) < self.MIN_LETTERS:
+            return None
+
+        distances = self.distances(text)
+        if not distances:
+            return None
+
+        code = min(distances, key=distances.get)
+        if distances[code] > self.MAX_DISTANCE:
+            return None
+
+        unrelated = [d for c, d in distances.iteritems() if not self.related(code, c)]
+        if unrelated and min(unrelated) - distances[code] < self.MIN_MARGIN:
+            return None
+
+        return code
+
+    def related(self, a, b):
+        return a == b or any(a in group and b in group for group in self.RELATED)
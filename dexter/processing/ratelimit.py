@@ -0,0 +1,377 @@
+from __future__ import division
+
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from email.utils import parsedate_tz, mktime_tz
+
+from flask import has_request_context
+
+from ..processing import RateLimitExceeded
+
+log = logging.getLogger(__name__)
+
+
+class LocalStorage(object):
+    """ Keeps rate limiting state in memory, for this process only. This is a
+    stand-in for RedisStorage when there's only one worker process, such
+    as in development.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.values = {}
+
+    def take(self, key, rate, burst, tokens=1, peek=False, reserve=0):
+        """ Take +tokens+ from the bucket +key+, which fills at +rate+ tokens a
+        second up to +burst+ tokens, leaving at least +reserve+ tokens in the bucket.
+        Returns the number of seconds to wait before the tokens are available,
+        or 0 if they were taken. If +peek+ is True, no tokens are taken. """
+        now = time.time()
+
+        with self.lock:
+            level, ts = self.buckets.get(key, (burst, now))
+            level = min(burst, level + max(0, now - ts) * rate)
+
+            if level >= tokens + reserve:
+                wait = 0
+                if not peek:
+                    level -= tokens
+            else:
+                wait = (tokens + reserve - level) / rate
+
+            if not peek:
+                self.buckets[key] = (level, now)
+
+        return wait
+
+    def incr(self, key, ttl):
+        """ Increment a counter that expires after +ttl+ seconds, and return the new value. """
+        now = time.time()
+
+        with self.lock:
+            value, expires = self.values.get(key, (0, now + ttl))
+            if expires <= now:
+                value, expires = 0, now + ttl
+            value += 1
+            self.values[key] = (value, expires)
+
+        return value
+
+    def get(self, key):
+        value, expires = self.values.get(key, (None, None))
+        if expires is not None and expires <= time.time():
+            return None
+        return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.values[key] = (value, time.time() + ttl)
+
+
+class RedisStorage(object):
+    """ Keeps rate limiting state in Redis, so that it's shared between
+    all workers. Requires the redis package.
+    """
+    TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local tokens = tonumber(ARGV[3])
+local peek = tonumber(ARGV[4])
+local now = tonumber(ARGV[5])
+local reserve = tonumber(ARGV[6])
+
+local level = tonumber(redis.call('hget', KEYS[1], 'level'))
+local ts = tonumber(redis.call('hget', KEYS[1], 'ts'))
+if level == nil then
+  level = burst
+  ts = now
+end
+level = math.min(burst, level + math.max(0, now - ts) * rate)
+
+local wait = 0
+if level >= tokens + reserve then
+  if peek == 0 then
+    level = level - tokens
+  end
+else
+  wait = (tokens + reserve - level) / rate
+end
+
+if peek == 0 then
+  redis.call('hmset', KEYS[1], 'level', tostring(level), 'ts', tostring(now))
+  redis.call('expire', KEYS[1], math.ceil(burst / rate) + 60)
+end
+
+return tostring(wait)
+"""
+
+    def __init__(self, url):
+        import redis
+        self.redis = redis.StrictRedis.from_url(url)
+        self.take_script = self.redis.register_script(self.TAKE_SCRIPT)
+
+    def take(self, key, rate, burst, tokens=1, peek=False, reserve=0):
+        return float(self.take_script(keys=[key], args=[rate, burst, tokens, int(peek), time.time(), reserve]))
+
+    def incr(self, key, ttl):
+        pipe = self.redis.pipeline()
+        pipe.incr(key)
+        pipe.ttl(key)
+        value, remaining = pipe.execute()
+        if remaining is None or remaining < 0:
+            self.redis.expire(key, ttl)
+        return value
+
+    def get(self, key):
+        return self.redis.get(key)
+
+    def set(self, key, value, ttl):
+        self.redis.set(key, value, ex=int(ttl))
+
+
+class RateLimiter(object):
+    """ A token bucket rate limiter for calls to an external service.
+
+    The bucket fills at +rate+ calls a second, up to +burst+ calls. The
+    limiter also enforces an optional +daily+ quota, and can be told to back
+    off when the service tells us to slow down, such as with a 429 response or
+    a Retry-After header.
+
+    Rather than sleeping until a call is allowed, +acquire+ raises
+    RateLimitExceeded with the number of seconds to wait, so that
+    Celery tasks can be retried later without tying up a worker.
+    """
+    # how long to back off for if a service doesn't say
+    DEFAULT_BACKOFF = 60
+
+    def __init__(self, name, rate, burst=1, daily=None, storage=None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.daily = daily
+        self.storage = storage or LocalStorage()
+
+    def key(self, suffix):
+        return 'ratelimit:%s:%s' % (self.name, suffix)
+
+    def daily_key(self):
+        return self.key('daily:%s' % datetime.utcnow().date().isoformat())
+
+    def wait_time(self, reserve=0, calls=1):
+        """ Number of seconds until +calls+ calls are allowed, without using up any quota.
+        See +acquire+ for +reserve+. """
+        waits = [self.storage.take(self.key('bucket'), self.rate, self.burst, tokens=min(calls, self.burst),
+                                   peek=True, reserve=self.burst * reserve)]
+
+        blocked_until = self.storage.get(self.key('blocked'))
+        if blocked_until:
+            waits.append(float(blocked_until) - time.time())
+
+        if self.daily is not None and int(self.storage.get(self.daily_key()) or 0) + calls > self.daily * (1 - reserve):
+            waits.append(seconds_until_tomorrow())
+
+        return max(0, max(waits))
+
+    def check(self, reserve=0, calls=1):
+        """ Raise RateLimitExceeded if +calls+ calls aren't allowed right now. """
+        wait = self.wait_time(reserve, calls)
+        if wait > 0:
+            raise RateLimitExceeded(self.name, wait)
+
+    def acquire(self, reserve=0):
+        """ Use up quota for one call, or raise RateLimitExceeded if we must wait.
+
+        +reserve+ is the fraction of the burst and daily quota that this call
+        may not use, so that it's kept for more important calls.
+        """
+        blocked_until = self.storage.get(self.key('blocked'))
+        if blocked_until and float(blocked_until) > time.time():
+            raise RateLimitExceeded(self.name, float(blocked_until) - time.time())
+
+        if reserve and self.daily is not None and int(self.storage.get(self.daily_key()) or 0) >= self.daily * (1 - reserve):
+            raise RateLimitExceeded(self.name, seconds_until_tomorrow())
+
+        wait = self.storage.take(self.key('bucket'), self.rate, self.burst, reserve=self.burst * reserve)
+        if wait > 0:
+            raise RateLimitExceeded(self.name, wait)
+
+        if self.daily is not None:
+            used = self.storage.incr(self.daily_key(), 2 * 24 * 60 * 60)
+            if used > self.daily:
+                self.exhausted()
+                raise RateLimitExceeded(self.name, seconds_until_tomorrow())
+
+    def backoff(self, seconds=None):
+        """ Don't allow calls for +seconds+. """
+        seconds = seconds or self.DEFAULT_BACKOFF
+        log.info("Backing off %s for %d seconds" % (self.name, seconds))
+        self.storage.set(self.key('blocked'), time.time() + seconds, seconds)
+
+    def exhausted(self):
+        """ The daily quota for this service has been used up. """
+        log.info("Daily quota for %s has been used up" % self.name)
+        self.backoff(seconds_until_tomorrow())
+
+    def throttle(self, response):
+        """ Inspect a +requests+ response and back off, raising RateLimitExceeded,
+        if the service is telling us to slow down. """
+        retry_after = parse_retry_after(response.headers.get('retry-after'))
+
+        if response.status_code == 429 or (retry_after and response.status_code == 503):
+            self.backoff(retry_after)
+            raise RateLimitExceeded(self.name, retry_after or self.DEFAULT_BACKOFF)
+
+
+class KeyPool(object):
+    """ A pool of API keys for an external service. Each key has its own
+    RateLimiter, with the service's limits, so throughput grows with the number
+    of keys. Calls are spread across keys in turn.
+
+    Background calls may not use the last +reserve+ fraction of each key's
+    burst and daily quota, which is kept for interactive calls made while
+    handling a web request, such as reprocessing an article.
+    """
+    def __init__(self, service, keys, reserve=0.2, storage=None, **limits):
+        if not keys:
+            raise ValueError("No API keys configured for %s" % service)
+
+        self.service = service
+        self.keys = list(keys)
+        self.reserve = reserve
+        self.next = 0
+
+        self.limiters = []
+        for key in self.keys:
+            # don't put the actual key in storage
+            name = '%s:%s' % (service, hashlib.md5(key).hexdigest()[:8])
+            rate_limiter = RateLimiter(name, storage=storage, **limits)
+            rate_limiter.api_key = key
+            self.limiters.append(rate_limiter)
+
+    def reserve_for(self, interactive=None):
+        if interactive is None:
+            interactive = has_request_context()
+        return 0 if interactive else self.reserve
+
+    def wait_time(self, interactive=None, calls=1):
+        """ Number of seconds until any key allows +calls+ calls. """
+        reserve = self.reserve_for(interactive)
+        return min(lim.wait_time(reserve, calls) for lim in self.limiters)
+
+    def check(self, interactive=None, calls=1):
+        """ Raise RateLimitExceeded if no key allows +calls+ calls right now. """
+        wait = self.wait_time(interactive, calls)
+        if wait > 0:
+            raise RateLimitExceeded(self.service, wait)
+
+    def acquire(self, interactive=None):
+        """ Use up quota for one call on the next key that allows it, and return
+        that key's RateLimiter. Its +api_key+ attribute is the key to use.
+        Raises RateLimitExceeded if no key allows a call right now.
+
+        Calls are interactive if +interactive+ is True, or if it's None and
+        we're handling a web request.
+        """
+        reserve = self.reserve_for(interactive)
+        waits = []
+
+        for i in xrange(len(self.limiters)):
+            rate_limiter = self.limiters[(self.next + i) % len(self.limiters)]
+            try:
+                rate_limiter.acquire(reserve)
+                self.next = (self.next + i + 1) % len(self.limiters)
+                return rate_limiter
+            except RateLimitExceeded as e:
+                waits.append(e.retry_after)
+
+        raise RateLimitExceeded(self.service, min(waits))
+
+
+def seconds_until_tomorrow():
+    """ Seconds until midnight UTC, when daily quotas reset. """
+    now = datetime.utcnow()
+    tomorrow = datetime(now.year, now.month, now.day) + timedelta(days=1)
+    return (tomorrow - now).total_seconds()
+
+
+def parse_retry_after(value):
+    """ Parse the value of a Retry-After header, which is either a number of
+    seconds or an HTTP date, into a number of seconds. """
+    if not value:
+        return None
+
+    try:
+        return max(0, int(value))
+    except ValueError:
+        pass
+
+    parsed = parsedate_tz(value)
+    if parsed:
+        return max(0, mktime_tz(parsed) - time.time())
+
+    return None
+
+
+# default limits for the services we use, which can be overridden
+# with the RATE_LIMITS config setting
+DEFAULT_LIMITS = {
+    'alchemy': {'rate': 1, 'burst': 5, 'daily': 1000},
+    'calais': {'rate': 1, 'burst': 4, 'daily': 5000},
+    'newstools': {'rate': 10 / 60, 'burst': 10},
+}
+
+# services with keys, whose limits are per key
+KEYED_SERVICES = ['alchemy', 'calais']
+
+limits = dict(DEFAULT_LIMITS)
+storage = LocalStorage()
+limiters = {}
+pools = {}
+api_keys = {}
+
+
+def configure(config):
+    """ Configure rate limits, storage and API keys from the app config.
+
+    The keys for a service are taken from SERVICE_API_KEYS, a list or a
+    comma-separated string, or SERVICE_API_KEY and SERVICE_API_KEY2.
+    """
+    global storage
+
+    if config.get('RATE_LIMIT_REDIS_URL'):
+        storage = RedisStorage(config['RATE_LIMIT_REDIS_URL'])
+
+    for name, settings in (config.get('RATE_LIMITS') or {}).iteritems():
+        limits[name] = dict(limits.get(name, {}), **settings)
+
+    for service in KEYED_SERVICES:
+        prefix = service.upper()
+        keys = config.get('%s_API_KEYS' % prefix) or [
+            config.get('%s_API_KEY' % prefix),
+            config.get('%s_API_KEY2' % prefix)]
+        if isinstance(keys, basestring):
+            keys = keys.split(',')
+        api_keys[service] = [k.strip() for k in keys if k and k.strip()]
+
+    limiters.clear()
+    pools.clear()
+
+
+def limiter(name):
+    """ Get the shared RateLimiter for the service +name+. """
+    if name not in limiters:
+        limiters[name] = RateLimiter(name, storage=storage, **limits[name])
+    return limiters[name]
+
+
+def key_pool(service, default_keys=None):
+    """ Get the shared KeyPool for the service +service+, using the configured
+    keys or, if there are none, +default_keys+. """
+    keys = tuple(k for k in (api_keys.get(service) or default_keys or []) if k)
+
+    if (service, keys) not in pools:
+        pools[(service, keys)] = KeyPool(service, keys, storage=storage, **limits[service])
+    return pools[(service, keys)]
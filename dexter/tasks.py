@@ -5,7 +5,10 @@ from datetime import date, timedelta
 from dateutil.parser import parse
 
 from dexter.app import celery_app as app
-from dexter.processing import DocumentProcessor
+from dexter.processing import DocumentProcessor, RateLimitExceeded
+from dexter.models import db, TopicClustering, ReportJob, stale
+from dexter.analysis import TopicAnalyser
+from dexter.analysis import topic_model
 
 # force configs for API keys to be set
 import dexter.core
@@ -17,9 +20,12 @@ log = logging.getLogger(__name__)
 
 @app.task
 def fetch_yesterdays_feeds():
-    """ Enqueue a task to fetch yesterday's feeds. """
-    yesterday = date.today() - timedelta(days=1)
-    fetch_daily_feeds.delay(yesterday.isoformat())
+    """ Enqueue tasks to fetch yesterday's feeds, and the day before's again
+    to pick up items that were skipped because we'd run out of quota. Items
+    that have already been processed are ignored. """
+    for days_ago in (1, 2):
+        day = date.today() - timedelta(days=days_ago)
+        fetch_daily_feeds.delay(day.isoformat())
 
 
 # retry after 30 minutes, retry for up to 7 days
@@ -44,13 +50,24 @@ def fetch_daily_feeds(self, day):
         self.retry()
 
 
-# retry every minute, for up to 24 hours.
-@app.task(bind=True, rate_limit="10/m", default_retry_delay=60, max_retries=10)
+# retry every minute, for up to 10 times. Rate limiting is handled
+# by the services' rate limiters, not by Celery.
+@app.task(bind=True, default_retry_delay=60, max_retries=10)
 def get_feed_item(self, item):
     """ Fetch and process a document feed item. """
     try:
         dp = DocumentProcessor()
-        dp.process_feed_item(item)
+        doc = dp.process_feed_item(item)
+        if doc:
+            assign_document_topics.delay(doc.id)
+    except RateLimitExceeded as e:
+        # not an error, try again as soon as there's quota
+        if e.retry_after <= 60 * 60:
+            log.info("Rate limited processing feed item, retrying in %d seconds: %s" % (e.retry_after, item))
+            get_feed_item.apply_async((item,), countdown=e.retry_after)
+        else:
+            # the next feed poll will pick it up again
+            log.info("Quota exhausted processing feed item, skipping: %s: %s" % (e.message, item))
     except Exception as e:
         log.error("Error processing feed item: %s" % item, exc_info=e)
         self.retry()
@@ -62,5 +79,125 @@ def backfill_taxonomies():
     try:
         dp = DocumentProcessor()
         dp.backfill_taxonomies()
+    except RateLimitExceeded as e:
+        if e.retry_after <= 60 * 60:
+            log.info("Rate limited backfilling taxonomies, continuing in %d seconds" % e.retry_after)
+            backfill_taxonomies.apply_async(countdown=e.retry_after)
+        else:
+            # we'll be run again tomorrow
+            log.info("Quota exhausted backfilling taxonomies, stopping: %s" % e.message)
     except Exception as e:
         log.error("Error backfilling taxonomies: %s" % e.message, exc_info=e)
+
+
+@app.task
+def recrawl_recent_documents(days=2):
+    """ Re-crawl recently published documents, to pick up changes. """
+    try:
+        dp = DocumentProcessor()
+        dp.recrawl_recent(days)
+    except Exception as e:
+        log.error("Error re-crawling documents: %s" % e.message, exc_info=e)
+
+
+@app.task
+def refresh_stale():
+    """ Recalculate the daily summaries of recently changed documents. """
+    try:
+        stale.refresh_stale()
+    except Exception as e:
+        log.error("Error refreshing stale days: %s" % e.message, exc_info=e)
+
+
+@app.task
+def cluster_topics(clustering_id):
+    """ Find the topics for a pending TopicClustering. """
+    clustering = TopicClustering.query.get(clustering_id)
+    if clustering is None or clustering.is_done():
+        return
+
+    clustering.status = TopicClustering.RUNNING
+    db.session.commit()
+
+    try:
+        ta = TopicAnalyser(doc_ids=clustering.document_ids)
+        ta.find_topics()
+        ta.save()
+        db.session.flush()
+
+        clustering.topic_data = ta.dump_topics()
+        clustering.status = TopicClustering.DONE
+        db.session.commit()
+    except Exception as e:
+        log.error("Error clustering topics for %s: %s" % (clustering, e.message), exc_info=e)
+        db.session.rollback()
+
+        clustering = TopicClustering.query.get(clustering_id)
+        clustering.status = TopicClustering.FAILED
+        db.session.commit()
+
+
+@app.task
+def update_topic_model():
+    """ Update the topic model with yesterday's documents. """
+    try:
+        topic_model.update_topic_model()
+    except Exception as e:
+        log.error("Error updating topic model: %s" % e.message, exc_info=e)
+
+
+@app.task
+def assign_document_topics(doc_id):
+    """ Assign topics to a newly added document, using the current topic model. """
+    try:
+        topic_model.assign_topics([doc_id])
+        db.session.commit()
+    except Exception as e:
+        log.error("Error assigning topics to document %s: %s" % (doc_id, e.message), exc_info=e)
+        db.session.rollback()
+
+
+@app.task
+def build_report(job_id):
+    """ Build the file for a pending ReportJob and put it in the attachment store. """
+    from dexter.dashboard import build_report
+
+    job = ReportJob.query.get(job_id)
+    if job is None or job.is_done():
+        return
+
+    job.status = ReportJob.RUNNING
+    job.progress = 0
+    db.session.commit()
+
+    try:
+        output = build_report(job, progress=lambda p: ReportJob.set_progress(job_id, p))
+
+        try:
+            # building the report tears down the session
+            job = ReportJob.query.get(job_id)
+            job.put_file(output)
+        finally:
+            output.close()
+
+        job.status = ReportJob.DONE
+        job.progress = 100
+        db.session.commit()
+    except Exception as e:
+        log.error("Error building report %s: %s" % (job_id, e.message), exc_info=e)
+        db.session.rollback()
+
+        job = ReportJob.query.get(job_id)
+        job.status = ReportJob.FAILED
+        db.session.commit()
+
+
+@app.task
+def delete_old_reports():
+    """ Delete old reports from the attachment store. """
+    try:
+        ReportJob.delete_old()
+        db.session.commit()
+    except Exception as e:
+        log.error("Error deleting old reports: %s" % e.message, exc_info=e)
+        db.session.rollback()
@@ -78,7 +78,6 @@ def levenshtein(first, second):
     return (lensum - ldist) / lensum
 
 
-# TODO: use flask-cache or something and do server-side caching too.
 def client_cache_for(**duration):
     def wrapper(f):
         @wraps(f)
@@ -0,0 +1,40 @@
+"""separate cluster fingerprint ids
+
+Revision ID: c3d5e7f9a1b2
+Revises: af7d1b4c6059
+Create Date: 2016-07-06 10:12:48.271930
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c3d5e7f9a1b2'
+down_revision = 'af7d1b4c6059'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def refingerprint(separator):
+    # clusters can have more ids than fit in the default limit of 1024 characters
+    op.execute("SET SESSION group_concat_max_len = 4294967295")
+    op.execute("""
+        UPDATE clusters c
+        INNER JOIN (
+          SELECT cluster_id, md5(concat(group_concat(doc_id ORDER BY doc_id SEPARATOR '%(sep)s'), '%(sep)s')) AS fingerprint
+          FROM clustered_documents
+          GROUP BY cluster_id
+        ) f ON f.cluster_id = c.id
+        SET c.fingerprint = f.fingerprint
+        """ % {'sep': separator})
+
+    # topic clusterings are keyed by the old fingerprints, and are found again when needed
+    op.execute("DELETE FROM topic_clusterings")
+
+
+def upgrade():
+    # ids are followed by a comma, so that [1, 23] and [12, 3] differ
+    refingerprint(',')
+
+
+def downgrade():
+    refingerprint('')
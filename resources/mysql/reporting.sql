@@ -0,0 +1,58 @@
+-- Reporting tables materialise the views in views.sql, with the same columns
+-- and indexes for the way they're queried. Create the views first, then run
+-- this script, then fill the tables with:
+--
+--   python app.py rebuild_reporting_tables
+--
+-- and set REPORTING_TABLES = True. Dexter keeps the rows for each document up
+-- to date as documents are changed.
+
+create table if not exists documents_report (
+  primary key (document_id),
+  index (published_at),
+  index (country, published_at),
+  index (medium_group),
+  index (topic),
+  index (origin)
+) select * from documents_view limit 0;
+
+create table if not exists document_sources_report (
+  index (document_id),
+  index (document_source_id),
+  index (affiliation_group)
+) select * from document_sources_view limit 0;
+
+create table if not exists person_utterances_report (
+  index (document_id),
+  index (person_id)
+) select * from person_utterances_view limit 0;
+
+create table if not exists documents_fairness_report (
+  index (document_id)
+) select * from documents_fairness_view limit 0;
+
+create table if not exists documents_keywords_report (
+  index (document_id)
+) select * from documents_keywords_view limit 0;
+
+create table if not exists documents_places_report (
+  index (document_id),
+  index (province_code),
+  index (municipality_code)
+) select * from documents_places_view limit 0;
+
+create table if not exists documents_principles_report (
+  index (document_id)
+) select * from documents_principles_view limit 0;
+
+create table if not exists documents_children_report (
+  index (document_id)
+) select * from documents_children_view limit 0;
+
+create table if not exists documents_issues_report (
+  index (document_id)
+) select * from documents_issues_view limit 0;
+
+create table if not exists documents_taxonomies_report (
+  index (document_id)
+) select * from documents_taxonomies_view limit 0;
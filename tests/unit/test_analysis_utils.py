@@ -1,6 +1,8 @@
+import math
 import unittest
 
-from dexter.analysis.utils import calculate_entropy
+from dexter.analysis.utils import calculate_entropy, column_entropy
+from dexter.analysis.base import moving_weighted_avg_zscore, moving_weighted_avg_zscores, daily_shares, top_k, DailyCounts
 
 class TestUser(unittest.TestCase):
     def test_entropy_none(self):
@@ -62,3 +64,54 @@ class TestUser(unittest.TestCase):
         self.assertAlmostEqual(0.93, entropies['Sowetan'], 2)
         self.assertAlmostEqual(0.76, entropies['BD'], 2)
         self.assertAlmostEqual(0.9, entropies['Citizen'], 2)
+
+    def test_column_entropy(self):
+        # columns spread evenly over all the rows have the maximum entropy,
+        # which is normalised to 1
+        first, second = column_entropy([
+            [2, 4],
+            [2, 4],
+            [2, 4],
+        ])
+        self.assertAlmostEqual(1.0, first)
+        self.assertAlmostEqual(1.0, second)
+
+        # a column entirely in one row has none, a column split evenly
+        # over two of the three rows has log(2) / log(3), and an empty
+        # column has none
+        constant, split, empty = column_entropy([
+            [0, 5, 0],
+            [0, 5, 0],
+            [10, 0, 0],
+        ])
+        self.assertAlmostEqual(0.0, constant)
+        self.assertAlmostEqual(math.log(2) / math.log(3), split)
+        self.assertAlmostEqual(0.0, empty)
+
+    def test_zscores(self):
+        series = [
+            [1, 2, 3, 4, 10],
+            [0, 0, 0, 0, 0],
+            [5, 1, 0, 3, 2],
+        ]
+        zscores = moving_weighted_avg_zscores(series, 0.8)
+
+        for obs, z in zip(series, zscores):
+            self.assertAlmostEqual(moving_weighted_avg_zscore(obs, 0.8), z)
+
+    def test_daily_shares(self):
+        shares = daily_shares([[1, 0, 3], [3, 0, 1]])
+        self.assertEqual([[25, 0, 75], [75, 0, 25]], shares.tolist())
+
+    def test_top_k(self):
+        self.assertEqual([1, 2], top_k([1, 5, 3, 0], 2).tolist())
+        self.assertEqual([0], top_k([1], 3).tolist())
+
+    def test_daily_counts(self):
+        counts = DailyCounts([5, 3], 3)
+        # unknown ids and days outside the period are ignored
+        counts.add([(3, 0, 2), (5, 2, 1), (3, 0, 1), (7, 1, 4), (5, 3, 1)])
+
+        self.assertEqual([3, 5], counts.ids.tolist())
+        self.assertEqual([[3, 0, 0], [0, 0, 1]], counts.counts.tolist())
+        self.assertEqual([3, 1], counts.totals().tolist())
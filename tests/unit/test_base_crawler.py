@@ -1,7 +1,10 @@
 import unittest
 
+from mock import patch, MagicMock
+
 from dexter.models import Document, db
 from dexter.models.seeds import seed_db
+from dexter.processing import NotModified
 from dexter.processing.crawlers.base import BaseCrawler
 
 class TestBaseCrawler(unittest.TestCase):
@@ -28,3 +31,27 @@ class TestBaseCrawler(unittest.TestCase):
 
         doc.url = 'http://www.iol.co.za/news/politics/nkandla-job-not-finished-madonsela-1.1669787#.UzvP7K2SxWs'
         self.assertEquals(self.crawler.identify_medium(doc).name, 'IOL')
+
+    def test_conditional_fetch(self):
+        doc = Document()
+        doc.etag = '"abc"'
+        doc.last_modified = 'Wed, 18 May 2016 10:00:00 GMT'
+
+        with patch('requests.get') as get:
+            get.return_value = MagicMock(status_code=304)
+            self.assertRaises(NotModified, self.crawler.fetch, 'http://example.com/foo', doc)
+
+            headers = get.call_args[1]['headers']
+            self.assertEqual('"abc"', headers['If-None-Match'])
+            self.assertEqual('Wed, 18 May 2016 10:00:00 GMT', headers['If-Modified-Since'])
+
+    def test_fetch_updates_validators(self):
+        doc = Document()
+
+        with patch('requests.get') as get:
+            get.return_value = MagicMock(status_code=200, text=u'<html></html>', headers={'etag': '"def"'})
+            self.assertEqual(u'<html></html>', self.crawler.fetch('http://example.com/foo', doc))
+
+            self.assertEqual({}, get.call_args[1]['headers'])
+            self.assertEqual('"def"', doc.etag)
+            self.assertIsNone(doc.last_modified)
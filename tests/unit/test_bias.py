@@ -0,0 +1,43 @@
+import unittest
+
+from dexter.models import Document, DocumentFairness, DocumentSource, DocumentSet, Fairness, Affiliation, Medium, db
+from dexter.models.seeds import seed_db
+from dexter.analysis import BiasCalculator
+
+from tests.fixtures import dbfixture, DocumentData
+
+
+class TestBiasCalculator(unittest.TestCase):
+    def setUp(self):
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+        seed_db(db)
+
+        self.fx = dbfixture.data(DocumentData)
+        self.fx.setup()
+
+    def tearDown(self):
+        self.db.session.remove()
+
+        self.fx.teardown()
+        self.db.drop_all()
+
+    def test_grouped_scores_match(self):
+        party = Affiliation.query.filter(Affiliation.code.like('4.%')).first()
+        unfair = Fairness.query.filter(Fairness.name != 'Fair').first()
+
+        doc = Document.query.get(self.fx.DocumentData.simple.id)
+        doc.fairness.append(DocumentFairness(fairness=unfair, bias_favour=party))
+        doc.sources.append(DocumentSource(source_type='person', name='Joe', affiliation=party))
+        db.session.commit()
+
+        calc = BiasCalculator()
+        docs = calc.get_query().all()
+        expected = calc.calculate_bias_scores(docs, key=lambda d: d.medium.group_name())
+
+        doc_set = DocumentSet(db.session.query(Document.id))
+        scores = calc.calculate_grouped_bias_scores(doc_set, [Medium.group_name_column()])
+
+        self.assertEqual([s.group for s in expected], [s.group for s in scores])
+        self.assertEqual([s.asdict() for s in expected], [s.asdict() for s in scores])
@@ -0,0 +1,55 @@
+import unittest
+import gzip
+import json
+from datetime import datetime
+from StringIO import StringIO
+
+from mock import MagicMock, patch
+from sqlalchemy.types import Integer, String, DateTime
+
+from dexter.analysis.bulk_export import BulkExportBuilder, Column, csv_lines, ndjson_lines
+
+
+class TestBulkExport(unittest.TestCase):
+    def test_csv_lines(self):
+        lines = list(csv_lines(['id', 'title'], [(1, u'caf\xe9'), (2, None)]))
+        self.assertEqual(['id,title\r\n', '1,caf\xc3\xa9\r\n', '2,\r\n'], lines)
+
+    def test_ndjson_lines(self):
+        lines = list(ndjson_lines(['id', 'published_at'], [(1, datetime(2016, 1, 2, 3, 4))]))
+        self.assertEqual('{"id": 1, "published_at": "2016-01-02T03:04:00"}\n', lines[0])
+
+    def test_stream(self):
+        builder = BulkExportBuilder(MagicMock(), 'everything')
+        builder.CHUNK_SIZE = 10
+        builder.query = MagicMock()
+        builder.query.return_value.column_descriptions = [{'name': 'id'}, {'name': 'title'}]
+
+        rows = [(i, 'Title %d' % i) for i in xrange(100)]
+        with patch('dexter.analysis.bulk_export.stream_rows', return_value=iter(rows)):
+            data = ''.join(builder.stream('ndjson'))
+
+        lines = gzip.GzipFile(fileobj=StringIO(data)).read().splitlines()
+        self.assertEqual(100, len(lines))
+        self.assertEqual({'id': 99, 'title': 'Title 99'}, json.loads(lines[-1]))
+
+    def test_columns(self):
+        col = Column('medium', String())
+        for v in ['Mail', None, 'Star', 'Mail']:
+            col.append(v)
+        arrays = col.arrays()
+        self.assertEqual([0, -1, 1, 0], arrays['medium.codes'].tolist())
+        self.assertEqual([u'Mail', u'Star'], arrays['medium.labels'].tolist())
+
+        col = Column('id', Integer())
+        for v in [1, 2]:
+            col.append(v)
+        self.assertEqual('int64', str(col.arrays()['id'].dtype))
+
+        col.append(None)
+        self.assertEqual('float64', str(col.arrays()['id'].dtype))
+
+        col = Column('published_at', DateTime())
+        col.append(datetime(2016, 1, 2))
+        col.append(None)
+        self.assertEqual(['2016-01-02T00:00:00', 'NaT'], [str(v) for v in col.arrays()['published_at']])
@@ -0,0 +1,47 @@
+import unittest
+
+from mock import MagicMock
+
+import dexter.cache
+from dexter.cache import LocalCache, cached
+
+
+class TestLocalCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = LocalCache(max_entries=2)
+
+    def test_lru(self):
+        self.cache.set('a', 1, 60)
+        self.cache.set('b', 2, 60)
+        self.assertEqual(1, self.cache.get('a'))
+
+        # b is least recently used
+        self.cache.set('c', 3, 60)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertEqual(3, self.cache.get('c'))
+
+    def test_ttl(self):
+        self.cache.set('a', 1, -1)
+        self.assertIsNone(self.cache.get('a'))
+
+
+class TestCached(unittest.TestCase):
+    def setUp(self):
+        self.old = dexter.cache.cache, dexter.cache.enabled
+        dexter.cache.cache = LocalCache()
+        dexter.cache.enabled = True
+
+    def tearDown(self):
+        dexter.cache.cache, dexter.cache.enabled = self.old
+
+    def test_data_version(self):
+        func = MagicMock(return_value=[1, 2])
+
+        self.assertEqual([1, 2], cached('key', func))
+        self.assertEqual([1, 2], cached('key', func))
+        self.assertEqual(1, func.call_count)
+
+        dexter.cache.cache.bump_version()
+        self.assertEqual([1, 2], cached('key', func))
+        self.assertEqual(2, func.call_count)
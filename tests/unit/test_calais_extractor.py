@@ -0,0 +1,46 @@
+import unittest
+
+from mock import MagicMock, patch
+
+from dexter.processing import RateLimitExceeded
+from dexter.processing.extractors import CalaisExtractor
+from dexter.processing.ratelimit import KeyPool, LocalStorage, seconds_until_tomorrow
+
+
+DAILY_LIMIT = 'You exceeded the maximum number of requests per day'
+
+
+class TestCalaisExtractor(unittest.TestCase):
+    def setUp(self):
+        CalaisExtractor.API_KEY = 'fake'
+        self.ex = CalaisExtractor()
+        self.pool = KeyPool('calais', ['key1', 'key2'], rate=1, burst=4, daily=5000, storage=LocalStorage())
+        self.ex.key_pool = MagicMock(return_value=self.pool)
+
+        self.doc = MagicMock(raw_calais=None, text=u'Some text')
+
+    @patch('dexter.processing.extractors.calais.requests')
+    def test_daily_limit_uses_next_key(self, requests):
+        requests.post.side_effect = [
+            MagicMock(status_code=429, text=DAILY_LIMIT, headers={}),
+            MagicMock(status_code=200, text='{}', headers={}, json=MagicMock(return_value={})),
+        ]
+
+        self.assertEqual({}, self.ex.fetch_data(self.doc))
+        self.assertEqual(['key1', 'key2'],
+                         [c[1]['headers']['x-ag-access-token'] for c in requests.post.call_args_list])
+
+        # the first key is done for the day
+        self.assertGreater(self.pool.limiters[0].wait_time(), 0)
+        self.assertEqual(0, self.pool.limiters[1].wait_time())
+
+    @patch('dexter.processing.extractors.calais.requests')
+    def test_daily_limit_waits_until_tomorrow(self, requests):
+        self.pool = KeyPool('calais', ['key1'], rate=1, burst=4, daily=5000, storage=LocalStorage())
+        self.ex.key_pool.return_value = self.pool
+        requests.post.return_value = MagicMock(status_code=429, text=DAILY_LIMIT, headers={})
+
+        with self.assertRaises(RateLimitExceeded) as cm:
+            self.ex.fetch_data(self.doc)
+        # not the default short backoff
+        self.assertAlmostEqual(seconds_until_tomorrow(), cm.exception.retry_after, delta=5)
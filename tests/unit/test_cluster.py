@@ -1,7 +1,7 @@
 import unittest
 import datetime
 
-from dexter.models import Document, Cluster, db, Author, Medium, Country
+from dexter.models import Document, Cluster, TopicClustering, db, Author, Medium, Country
 from dexter.models.seeds import seed_db
 
 from tests.fixtures import dbfixture, AuthorData
@@ -45,7 +45,7 @@ class TestCluster(unittest.TestCase):
         docs = self.make_docs()
 
         cluster = Cluster.find_or_create(docs=docs)
-        self.assertEqual(cluster.fingerprint, '202cb962ac59075b964b07152d234b70')
+        self.assertEqual(cluster.fingerprint, '5755510604b6be7f9f748461c6c8d1f6')
         self.assertEqual(sorted(cluster.documents), sorted(docs))
 
         db.session.add(cluster)
@@ -55,6 +55,9 @@ class TestCluster(unittest.TestCase):
         self.assertIsNotNone(cluster2.id)
         self.assertEqual(cluster.id, cluster2.id)
 
+    def test_fingerprint_separates_ids(self):
+        self.assertNotEqual(Cluster.make_fingerprint([1, 23]), Cluster.make_fingerprint([12, 3]))
+
     def test_delete_cascades(self):
         docs = self.make_docs()
 
@@ -71,3 +74,48 @@ class TestCluster(unittest.TestCase):
 
         cluster = db.session.query(Cluster).filter(Cluster.id == cluster.id).one()
         self.assertEqual(sorted(rest), sorted(cluster.documents))
+
+    def test_topic_clustering_fingerprint(self):
+        params = {'n_iter': 200, 'random_state': 1}
+
+        fp = TopicClustering.make_fingerprint([3, 1, 2], params)
+        self.assertEqual(fp, TopicClustering.make_fingerprint([1, 2, 3], dict(params)))
+        self.assertNotEqual(fp, TopicClustering.make_fingerprint([1, 2], params))
+        self.assertNotEqual(fp, TopicClustering.make_fingerprint([1, 2, 3], {'n_iter': 100, 'random_state': 1}))
+
+    def test_topic_clustering_find_or_create(self):
+        docs = self.make_docs()
+        ids = [d.id for d in docs]
+        params = {'n_iter': 200}
+
+        clustering, created = TopicClustering.find_or_create(ids, params)
+        self.assertTrue(created)
+        self.assertIsNotNone(clustering.id)
+        self.assertEqual(TopicClustering.PENDING, clustering.status)
+        self.assertEqual(sorted(ids), clustering.document_ids)
+
+        clustering.topic_data = [{'cluster_id': 1, 'score': 0.8}]
+        clustering.status = TopicClustering.DONE
+        db.session.flush()
+
+        clustering2, created = TopicClustering.find_or_create(reversed(ids), params)
+        self.assertFalse(created)
+        self.assertEqual(clustering.id, clustering2.id)
+        self.assertTrue(clustering2.is_done())
+        self.assertFalse(clustering2.is_stale())
+        self.assertEqual([{'cluster_id': 1, 'score': 0.8}], clustering2.topic_data)
+
+    def test_topic_clustering_created_concurrently(self):
+        ids = [d.id for d in self.make_docs()]
+        params = {'n_iter': 200}
+
+        # start our transaction's snapshot, then have someone else create it
+        TopicClustering.query.count()
+        db.engine.execute(TopicClustering.__table__.insert().values(
+            fingerprint=TopicClustering.make_fingerprint(ids, params),
+            status=TopicClustering.RUNNING,
+            doc_ids=','.join(str(i) for i in ids)))
+
+        clustering, created = TopicClustering.find_or_create(ids, params)
+        self.assertFalse(created)
+        self.assertEqual(TopicClustering.RUNNING, clustering.status)
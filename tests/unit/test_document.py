@@ -25,6 +25,21 @@ class TestDocument(unittest.TestCase):
         self.fx.teardown()
         self.db.drop_all()
 
+    def test_text_hash(self):
+        doc = Document()
+        self.assertIsNone(doc.text_hash)
+
+        doc.text = u'Hello there\n\nFred.'
+        h = doc.text_hash
+        self.assertIsNotNone(h)
+
+        # whitespace doesn't matter
+        doc.text = u' Hello  there\nFred. '
+        self.assertEqual(h, doc.text_hash)
+
+        doc.text = u'Hello there, Fred.'
+        self.assertNotEqual(h, doc.text_hash)
+
     def test_add_keyword_no_dups(self):
         doc = self.doc
 
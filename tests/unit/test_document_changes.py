@@ -0,0 +1,68 @@
+import unittest
+import datetime
+
+from mock import MagicMock
+
+from dexter.models import Document, DocumentKeyword, db, documents_committing, documents_committed
+from dexter.models.document_changes import changed_days
+from dexter.models.seeds import seed_db
+
+from tests.fixtures import dbfixture, DocumentData
+
+
+class TestDocumentChanges(unittest.TestCase):
+    def setUp(self):
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+        seed_db(db)
+
+        self.fx = dbfixture.data(DocumentData)
+        self.fx.setup()
+
+        self.committing = MagicMock()
+        self.committed = MagicMock()
+        documents_committing.connect(self.committing, weak=False)
+        documents_committed.connect(self.committed, weak=False)
+
+    def tearDown(self):
+        documents_committing.disconnect(self.committing)
+        documents_committed.disconnect(self.committed)
+
+        self.db.session.remove()
+
+        self.fx.teardown()
+        self.db.drop_all()
+
+    def test_child_change(self):
+        doc = Document.query.get(self.fx.DocumentData.simple.id)
+        doc.keywords.append(DocumentKeyword(keyword='foo', relevance=0.5))
+        db.session.commit()
+
+        self.committing.assert_called_once_with(db.session(), doc_ids=set([doc.id]), person_ids=set())
+        self.committed.assert_called_once_with(db.session(), doc_ids=set([doc.id]), person_ids=set())
+
+    def test_rollback(self):
+        doc = Document.query.get(self.fx.DocumentData.simple.id)
+        doc.title = 'changed'
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+
+        self.assertFalse(self.committed.called)
+
+    def test_changed_days(self):
+        doc = Document.query.get(self.fx.DocumentData.simple.id)
+        doc.published_at = datetime.datetime(2012, 2, 2)
+        db.session.flush()
+
+        days = set([(datetime.date(2012, 1, 1), 1), (datetime.date(2012, 2, 2), 1)])
+        self.assertEqual(days, changed_days(db.session(), [doc.id]))
+
+    def test_deleted_days(self):
+        doc = Document.query.get(self.fx.DocumentData.simple2.id)
+        doc_id = doc.id
+        db.session.delete(doc)
+        db.session.flush()
+
+        self.assertEqual(set([(datetime.date(2012, 3, 3), 1)]), changed_days(db.session(), [doc_id]))
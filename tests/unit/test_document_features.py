@@ -0,0 +1,57 @@
+import unittest
+
+from dexter.models import Document, Entity, DocumentEntity, DocumentKeyword, DocumentSet, Feature, DocumentFeatures, db
+from dexter.models.seeds import seed_db
+
+from tests.fixtures import dbfixture, EntityData, DocumentData
+
+
+class TestDocumentFeatures(unittest.TestCase):
+    def setUp(self):
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+        seed_db(db)
+
+        self.fx = dbfixture.data(DocumentData, EntityData)
+        self.fx.setup()
+
+    def tearDown(self):
+        self.db.session.rollback()
+        self.fx.teardown()
+        self.db.session.remove()
+        self.db.drop_all()
+
+    def test_pack(self):
+        packed = DocumentFeatures.pack([1, 5, 70000], [2.0, 1.0, 0.5])
+        self.assertEqual(24, len(packed))
+
+        ids, weights = DocumentFeatures.unpack(packed)
+        self.assertEqual([1, 5, 70000], ids.tolist())
+        self.assertEqual([2.0, 1.0, 0.5], weights.tolist())
+
+    def test_stored_on_commit(self):
+        doc = Document.query.get(self.fx.DocumentData.simple.id)
+
+        de = DocumentEntity()
+        de.entity = Entity.query.get(self.fx.EntityData.zuma.id)
+        de.relevance = 1.0
+        de.count = 2
+        doc.entities.append(de)
+        doc.keywords.append(DocumentKeyword(keyword='elections', relevance=0.5))
+        self.db.session.commit()
+
+        zuma = Feature.query.filter(Feature.entity_id == self.fx.EntityData.zuma.id).one()
+        elections = Feature.query.filter(Feature.keyword == 'elections').one()
+
+        ids, weights = DocumentFeatures.unpack(DocumentFeatures.query.get(doc.id).vector)
+        self.assertEqual({zuma.id: 2.0, elections.id: 0.5}, dict(zip(ids.tolist(), weights.tolist())))
+
+        # changing entities changes the vector
+        doc.entities[0].count = 3
+        self.db.session.commit()
+
+        doc_ids, feature_ids, matrix = DocumentFeatures.matrix(DocumentSet(ids=[doc.id]))
+        self.assertEqual([doc.id], doc_ids.tolist())
+        self.assertEqual(sorted([zuma.id, elections.id]), feature_ids.tolist())
+        self.assertEqual(3.0, matrix[0, feature_ids.tolist().index(zuma.id)])
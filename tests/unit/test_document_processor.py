@@ -6,11 +6,13 @@ from mock import MagicMock
 
 from datetime import date
 
-from dexter.models import db
+from dexter.models import Document, db
 from dexter.models.seeds import seed_db
 from dexter.processing import DocumentProcessor
 from dexter.processing.extractors import AlchemyExtractor
 
+from tests.fixtures import dbfixture, DocumentData
+
 
 class TestDocumentProcessor(unittest.TestCase):
     def setUp(self):
@@ -26,6 +28,38 @@ class TestDocumentProcessor(unittest.TestCase):
         self.db.session.remove()
         self.db.drop_all()
 
+    def test_recrawl_checked(self):
+        fx = dbfixture.data(DocumentData)
+        fx.setup()
+        try:
+            doc = Document.query.get(fx.DocumentData.simple.id)
+            doc.checked_by_user_id = doc.created_by_user_id
+            def crawl(d):
+                d.text = u'Something else entirely.'
+                d.title = u'A new title'
+                d.etag = u'"abc"'
+            self.dp.crawl = MagicMock(side_effect=crawl)
+
+            # checked documents keep their text, and everything else the crawl changed
+            self.assertFalse(self.dp.recrawl(doc))
+            self.assertEqual('Today, we do fun things.', doc.text)
+            self.assertEqual('Title', doc.title)
+            self.assertIsNone(doc.etag)
+        finally:
+            self.db.session.rollback()
+            fx.teardown()
+
+    def test_recrawl_recent_continues_after_errors(self):
+        fx = dbfixture.data(DocumentData)
+        fx.setup()
+        try:
+            self.dp.recrawl = MagicMock(side_effect=[ValueError('boom'), False])
+            self.dp.recrawl_recent(days=365 * 100)
+            self.assertEqual(2, self.dp.recrawl.call_count)
+        finally:
+            self.db.session.rollback()
+            fx.teardown()
+
     def test_fetch_daily_feed_items(self):
         xml = """<?xml version="1.0" encoding="utf-8"?>
 <rss version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:sy="http://purl.org/rss/1.0/modules/syndication/" xmlns:admin="http://webns.net/mvcb/" xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns:content="http://purl.org/rss/1.0/modules/content/">
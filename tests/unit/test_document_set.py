@@ -0,0 +1,69 @@
+import unittest
+import datetime
+
+from dexter.models import Document, DocumentSet, db
+from dexter.models.seeds import seed_db
+
+from tests.fixtures import dbfixture, DocumentData
+
+
+class TestDocumentSet(unittest.TestCase):
+    def setUp(self):
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+        seed_db(db)
+
+        self.fx = dbfixture.data(DocumentData)
+        self.fx.setup()
+
+        self.simple = self.fx.DocumentData.simple.id
+        self.simple2 = self.fx.DocumentData.simple2.id
+
+    def tearDown(self):
+        self.db.session.remove()
+
+        self.fx.teardown()
+        self.db.drop_all()
+
+    def filtered(self, docs):
+        return sorted(d.id for d in Document.query.filter(docs.contains(Document.id)))
+
+    def query_set(self):
+        return DocumentSet(db.session.query(Document.id)
+                           .filter(Document.published_at < datetime.datetime(2012, 2, 1)))
+
+    def test_query(self):
+        docs = self.query_set()
+        self.assertEqual(1, len(docs))
+        self.assertEqual([self.simple], docs.ids())
+        self.assertEqual([self.simple], self.filtered(docs))
+
+    def test_ids(self):
+        docs = DocumentSet.coerce([self.simple, self.simple2])
+        self.assertEqual(2, len(docs))
+        self.assertEqual([self.simple, self.simple2], self.filtered(docs))
+
+    def test_materialise(self):
+        with self.query_set().materialise() as docs:
+            self.assertIsNotNone(docs.table)
+            self.assertEqual(1, len(docs))
+            self.assertEqual([self.simple], self.filtered(docs))
+
+        self.assertIsNone(docs.table)
+
+    def test_copy_to(self):
+        with self.query_set().materialise() as docs:
+            self.assertEqual([self.simple], docs.read_ids())
+
+            conn = db.engine.connect()
+            try:
+                docs.copy_to(conn, docs.read_ids())
+                self.assertEqual([self.simple], [r[0] for r in conn.execute(docs.select())])
+                docs.drop(conn)
+            finally:
+                conn.close()
+
+            # still filtered by the table
+            self.assertIsNotNone(docs.table)
+            self.assertEqual([self.simple], self.filtered(docs))
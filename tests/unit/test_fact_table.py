@@ -0,0 +1,44 @@
+import unittest
+
+from dexter.analysis.facts import FactTable
+
+
+class TestFactTable(unittest.TestCase):
+    def setUp(self):
+        self.facts = FactTable(['doc_id', 'medium', 'gender'], [
+            (1, 'Mail', 'Male'),
+            (1, 'Mail', 'Female'),
+            (2, 'Mail', None),
+            (3, 'Star', 'Male'),
+            (3, 'Star', 'Male'),
+        ])
+
+    def test_labels(self):
+        self.assertEqual(5, len(self.facts))
+        self.assertEqual(['Male', 'Female', None], self.facts.labels['gender'])
+        self.assertEqual([0, 1, 2, 0, 0], self.facts.codes['gender'].tolist())
+
+    def test_count(self):
+        self.assertEqual([('Mail', 3), ('Star', 2)], self.facts.count(['medium']))
+        self.assertEqual([
+            ('Mail', 'Male', 1),
+            ('Mail', 'Female', 1),
+            ('Star', 'Male', 2),
+        ], self.facts.count(['medium', 'gender']))
+
+    def test_count_nulls(self):
+        self.assertIn(('Mail', None, 1), self.facts.count(['medium', 'gender'], nulls=True))
+
+    def test_count_where(self):
+        self.assertEqual([('Mail', 1), ('Star', 2)], self.facts.count(['medium'], where=self.facts.eq('gender', 'Male')))
+        self.assertEqual([], self.facts.count(['medium'], where=self.facts.isin('gender', ['Other'])))
+
+    def test_count_distinct(self):
+        self.assertEqual([('Mail', 2), ('Star', 1)], self.facts.count(['medium'], distinct='doc_id'))
+        self.assertEqual([('Mail', 1), ('Star', 1)], self.facts.count(['medium'], where=self.facts.eq('gender', 'Male'), distinct='doc_id'))
+
+    def test_empty(self):
+        facts = FactTable(['medium', 'gender'], [])
+        self.assertEqual(0, len(facts))
+        self.assertEqual([], facts.count(['medium', 'gender']))
+        self.assertEqual([], facts.count(['medium'], distinct='gender'))
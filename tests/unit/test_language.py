@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from dexter.processing.language import LanguageIdentifier
+
+
+class TestLanguageIdentifier(unittest.TestCase):
+    def setUp(self):
+        self.li = LanguageIdentifier()
+
+    def test_identify(self):
+        self.assertEqual('en', self.li.identify(
+            u"The Minister of Health said the hospital would reopen next month after repairs to the roof were completed."))
+        self.assertEqual('af', self.li.identify(
+            u"Die leerders van die hoërskool in Kaapstad sê hulle het hulp van die regering nodig nadat hul skool afgebrand het."))
+        self.assertEqual('zu', self.li.identify(
+            u"Abafundi besikole samabanga aphezulu eThekwini bathi badinga usizo lukahulumeni ngemuva kokuthi isikole sabo sishiswe."))
+
+    def test_identify_nothing(self):
+        self.assertIsNone(self.li.identify(None))
+        self.assertIsNone(self.li.identify(u'ba'))
+        self.assertIsNone(self.li.identify(u'1234 5678 !!! ?? 2015/01/02 12:33 xzq qqq'))
+
+    def test_identify_unsupported(self):
+        self.assertIsNone(self.li.identify(
+            u"Le ministre de la Santé a déclaré que l'hôpital rouvrirait le mois prochain après la réparation du toit."))
+        self.assertIsNone(self.li.identify(
+            u"Ka kii te Minita Hauora ka whakatuwheratia ano te hohipera a tera marama i muri i te whakatikatika o te tuanui."))
+
+    def test_identify_short(self):
+        self.assertIsNone(self.li.identify(u"SPORT: Bafana 2 Ghana 1 (Mokoena 23, Zuma 67)"))
+        self.assertIsNone(self.li.identify(u"Zuma visits flood victims in Durban"))
+        self.assertEqual('en', self.li.identify(u"Police arrest three suspects after Soweto shooting"))
@@ -0,0 +1,37 @@
+import unittest
+
+from dexter.minhash import MinHasher, LSHIndex, shingles, similarity
+
+
+class TestMinHash(unittest.TestCase):
+    def setUp(self):
+        self.hasher = MinHasher()
+        self.text = u"""The minister said on Tuesday that the budget for schools would be cut by ten
+        percent across all provinces, and that rural schools would be hit hardest by the
+        changes announced in Parliament by the finance department."""
+
+    def test_shingles(self):
+        self.assertEqual(set(['hello there']), shingles(u'Hello, there!'))
+        self.assertEqual(set(['a b c', 'b c d']), shingles(u'a b c d', 3))
+        self.assertEqual(set(), shingles(u'...'))
+
+    def test_similarity(self):
+        sig = self.hasher.text_signature(self.text)
+        self.assertEqual(1.0, similarity(sig, self.hasher.text_signature(self.text.upper())))
+
+        near = self.hasher.text_signature(self.text.replace('Tuesday', 'Wednesday'))
+        self.assertGreater(similarity(sig, near), 0.6)
+
+        other = self.hasher.text_signature(u"The Sharks beat the Stormers in a thrilling rugby match in Durban.")
+        self.assertLess(similarity(sig, other), 0.2)
+
+    def test_pack(self):
+        sig = self.hasher.text_signature(self.text)
+        self.assertEqual(list(sig), list(self.hasher.unpack(self.hasher.pack(sig))))
+
+    def test_lsh_index(self):
+        index = LSHIndex()
+        index.add(1, self.hasher.text_signature(self.text))
+        index.add(2, self.hasher.text_signature(u"The Sharks beat the Stormers in a thrilling rugby match in Durban."))
+
+        self.assertEqual([1], index.query(self.hasher.text_signature(self.text + u' More to follow.')))
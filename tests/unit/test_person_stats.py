@@ -0,0 +1,101 @@
+import unittest
+import datetime
+
+from dexter.models import Document, DocumentSource, DocumentEntity, Entity, Person, PersonDailyStats, db
+from dexter.models.seeds import seed_db
+from dexter.models.stale import refresh_stale
+from dexter.analysis import analyse_person_sources
+
+from tests.fixtures import dbfixture, DocumentData
+
+
+class TestPersonDailyStats(unittest.TestCase):
+    def setUp(self):
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+        seed_db(db)
+
+        self.fx = dbfixture.data(DocumentData)
+        self.fx.setup()
+
+    def tearDown(self):
+        self.db.session.remove()
+
+        self.fx.teardown()
+        self.db.drop_all()
+
+    def test_source_stats(self):
+        person = Person(name='Joe Bloggs')
+        doc = Document.query.get(self.fx.DocumentData.simple.id)
+        doc.sources.append(DocumentSource(source_type='person', person=person))
+        db.session.commit()
+
+        # the stats are refreshed in the background
+        self.assertEqual([], PersonDailyStats.query.filter(PersonDailyStats.person_id == person.id).all())
+        refresh_stale()
+
+        stats = PersonDailyStats.query.filter(PersonDailyStats.person_id == person.id).all()
+        self.assertEqual(1, len(stats))
+        self.assertEqual(datetime.date(2012, 1, 1), stats[0].date)
+        self.assertEqual(1, stats[0].source_count)
+
+        src = analyse_person_sources(person, datetime.date(2011, 12, 25), datetime.date(2012, 1, 1))
+        self.assertEqual(1, src.source_counts_total)
+        self.assertEqual(100.0, src.source_counts[-1])
+
+        # moving the document moves the stats
+        doc.published_at = datetime.datetime(2012, 2, 2)
+        db.session.commit()
+        refresh_stale()
+
+        stats = PersonDailyStats.query.filter(PersonDailyStats.person_id == person.id).all()
+        self.assertEqual([datetime.date(2012, 2, 2)], [s.date for s in stats])
+        self.assertIsNone(analyse_person_sources(person, datetime.date(2011, 12, 25), datetime.date(2012, 1, 1)))
+
+    def test_merge(self):
+        joe = Person(name='Joe Bloggs')
+        joseph = Person(name='Joseph Bloggs')
+
+        doc = Document.query.get(self.fx.DocumentData.simple.id)
+        doc.sources.append(DocumentSource(source_type='person', person=joe))
+        doc2 = Document.query.get(self.fx.DocumentData.simple2.id)
+        doc2.sources.append(DocumentSource(source_type='person', person=joseph))
+        doc2.entities.append(DocumentEntity(entity=Entity(group='person', name='Joe Bloggs', person=joe), relevance=0.5, count=1))
+        db.session.commit()
+
+        refresh_stale()
+
+        joe_id = joe.id
+        joe.merge_into(joseph)
+        db.session.commit()
+        refresh_stale()
+
+        self.assertEqual([], PersonDailyStats.query.filter(PersonDailyStats.person_id == joe_id).all())
+
+        stats = PersonDailyStats.query\
+            .filter(PersonDailyStats.person_id == joseph.id)\
+            .order_by(PersonDailyStats.date)\
+            .all()
+        self.assertEqual([datetime.date(2012, 1, 1), datetime.date(2012, 3, 3)], [s.date for s in stats])
+        self.assertEqual([1, 1], [s.source_count for s in stats])
+        self.assertEqual([0, 1], [s.mention_count for s in stats])
+
+    def test_relink_entity(self):
+        joe = Person(name='Joe Bloggs')
+        joseph = Person(name='Joseph Bloggs')
+        entity = Entity(group='person', name='Joe Bloggs', person=joe)
+
+        doc = Document.query.get(self.fx.DocumentData.simple.id)
+        doc.entities.append(DocumentEntity(entity=entity, relevance=0.5, count=1))
+        db.session.add(joseph)
+        db.session.commit()
+        refresh_stale()
+
+        entity.person = joseph
+        db.session.commit()
+        refresh_stale()
+
+        self.assertEqual([], PersonDailyStats.query.filter(PersonDailyStats.person_id == joe.id).all())
+        stats = PersonDailyStats.query.filter(PersonDailyStats.person_id == joseph.id).all()
+        self.assertEqual([1], [s.mention_count for s in stats])
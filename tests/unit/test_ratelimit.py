@@ -0,0 +1,86 @@
+import unittest
+
+from mock import MagicMock
+
+from dexter.processing import RateLimitExceeded
+from dexter.processing.ratelimit import RateLimiter, KeyPool, LocalStorage, parse_retry_after
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.limiter = RateLimiter('test', rate=1, burst=2, storage=LocalStorage())
+
+    def test_burst(self):
+        self.limiter.acquire()
+        self.limiter.acquire()
+
+        with self.assertRaises(RateLimitExceeded) as cm:
+            self.limiter.acquire()
+        self.assertGreater(cm.exception.retry_after, 0)
+        self.assertLessEqual(cm.exception.retry_after, 1)
+
+    def test_check_calls(self):
+        self.limiter.acquire()
+        self.limiter.check()
+        self.assertRaises(RateLimitExceeded, self.limiter.check, calls=2)
+
+    def test_check_daily_calls(self):
+        limiter = RateLimiter('test', rate=1, burst=10, daily=3, storage=LocalStorage())
+        limiter.acquire()
+        limiter.check(calls=2)
+        self.assertRaises(RateLimitExceeded, limiter.check, calls=3)
+
+    def test_check_doesnt_use_quota(self):
+        self.limiter.check()
+        self.limiter.check()
+        self.limiter.check()
+        self.assertEqual(0, self.limiter.wait_time())
+
+    def test_daily(self):
+        self.limiter.daily = 1
+        self.limiter.acquire()
+
+        self.assertRaises(RateLimitExceeded, self.limiter.acquire)
+        self.assertGreater(self.limiter.wait_time(), 1)
+
+    def test_throttle(self):
+        response = MagicMock(status_code=429, headers={'retry-after': '120'})
+
+        with self.assertRaises(RateLimitExceeded) as cm:
+            self.limiter.throttle(response)
+        self.assertEqual(120, cm.exception.retry_after)
+        self.assertGreater(self.limiter.wait_time(), 100)
+        self.assertRaises(RateLimitExceeded, self.limiter.acquire)
+
+    def test_throttle_ok(self):
+        self.limiter.throttle(MagicMock(status_code=200, headers={}))
+        self.assertEqual(0, self.limiter.wait_time())
+
+    def test_parse_retry_after(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertEqual(30, parse_retry_after('30'))
+        self.assertEqual(0, parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'))
+
+
+class TestKeyPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = KeyPool('test', ['key1', 'key2'], reserve=0.5, rate=0.001, burst=2, daily=10,
+                            storage=LocalStorage())
+
+    def test_rotates_keys(self):
+        keys = [self.pool.acquire(interactive=True).api_key for _ in xrange(4)]
+        self.assertEqual(['key1', 'key2', 'key1', 'key2'], keys)
+
+        with self.assertRaises(RateLimitExceeded):
+            self.pool.acquire(interactive=True)
+
+    def test_reserve_for_interactive(self):
+        # background calls may only use half of each key's burst
+        self.pool.acquire(interactive=False)
+        self.pool.acquire(interactive=False)
+        with self.assertRaises(RateLimitExceeded):
+            self.pool.acquire(interactive=False)
+
+        self.pool.check(interactive=True)
+        self.pool.acquire(interactive=True)
+        self.pool.acquire(interactive=True)
@@ -0,0 +1,74 @@
+import unittest
+import datetime
+
+from werkzeug.datastructures import MultiDict
+
+from dexter.models import ReportJob, db
+from dexter.models.seeds import seed_db
+
+
+class TestReportJob(unittest.TestCase):
+    def setUp(self):
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+        seed_db(db)
+
+    def tearDown(self):
+        self.db.session.rollback()
+        self.db.session.remove()
+        self.db.drop_all()
+
+    def create(self, report, args):
+        job = ReportJob.find_or_create(report, args)
+        job.filename = 'documents.xlsx'
+        job.mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        db.session.add(job)
+        db.session.flush()
+        return job
+
+    def test_fingerprint(self):
+        args = [('medium_id', '2'), ('medium_id', '1'), ('published_at', '2016/01/01 - 2016/02/01')]
+
+        fp = ReportJob.make_fingerprint('xlsx', args)
+        self.assertEqual(fp, ReportJob.make_fingerprint('xlsx', MultiDict(list(reversed(args)))))
+        self.assertNotEqual(fp, ReportJob.make_fingerprint('children-ratings.xlsx', args))
+        self.assertNotEqual(fp, ReportJob.make_fingerprint('xlsx', args[1:]))
+
+    def test_find_or_create(self):
+        args = [('medium_id', '1'), ('published_at', '2016/01/01 - 2016/02/01')]
+
+        job = self.create('xlsx', args)
+        self.assertEqual(ReportJob.PENDING, job.status)
+        self.assertEqual(args, job.form_args.items(multi=True))
+
+        # identical requests share a job
+        job.status = ReportJob.DONE
+        db.session.flush()
+        self.assertEqual(job.id, ReportJob.find_or_create('xlsx', list(reversed(args))).id)
+
+        # failed jobs aren't reused
+        job.status = ReportJob.FAILED
+        db.session.flush()
+        self.assertIsNone(ReportJob.find_or_create('xlsx', args).id)
+
+        # nor are old ones
+        job.status = ReportJob.DONE
+        job.created_at = datetime.datetime.utcnow() - ReportJob.REUSE_FOR - datetime.timedelta(minutes=1)
+        db.session.flush()
+        self.assertIsNone(ReportJob.find_or_create('xlsx', args).id)
+
+    def test_is_stale(self):
+        job = self.create('xlsx', [])
+        self.assertFalse(job.is_stale())
+
+        # timestamps are in UTC, whatever the database's timezone
+        now = datetime.datetime.utcnow()
+        self.assertLess(abs(now - job.created_at.replace(tzinfo=None)), datetime.timedelta(minutes=1))
+        self.assertLess(abs(now - job.updated_at.replace(tzinfo=None)), datetime.timedelta(minutes=1))
+
+        job.updated_at = datetime.datetime.utcnow() - ReportJob.STALE_AFTER - datetime.timedelta(minutes=1)
+        self.assertTrue(job.is_stale())
+
+        job.status = ReportJob.DONE
+        self.assertFalse(job.is_stale())
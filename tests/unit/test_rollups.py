@@ -0,0 +1,106 @@
+import os
+import unittest
+import datetime
+
+from mock import patch
+from sqlalchemy.sql import text
+
+from dexter.app import app
+from dexter.api import get_origins_feed, get_sources_feed
+from dexter.models import Country, Document, DocumentSource, Person, StaleDay, db
+from dexter.models.seeds import seed_db
+from dexter.models.stale import refresh_stale
+
+from tests.fixtures import dbfixture, DocumentData
+
+VIEWS_SQL = os.path.join(os.path.dirname(__file__), '..', '..', 'resources', 'mysql', 'views.sql')
+
+
+class TestRollups(unittest.TestCase):
+    def setUp(self):
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+        seed_db(db)
+
+        # the rollups are filled from the views
+        with open(VIEWS_SQL) as f:
+            for sql in f.read().split(';'):
+                sql = '\n'.join(l for l in sql.splitlines() if not l.strip().startswith('--')).strip()
+                if sql:
+                    db.engine.execute(text(sql))
+
+        self.fx = dbfixture.data(DocumentData)
+        self.fx.setup()
+
+        self.country = Country.query.get(1)
+        self.start_date = '2011/12/01 00:00:00'
+        self.end_date = '2012/12/31 23:59:59'
+
+        # add some sources, so they're in the feeds
+        doc = Document.query.get(self.fx.DocumentData.simple.id)
+        doc.sources.append(DocumentSource(source_type='person', person=Person(name='Joe Bloggs')))
+        doc.sources.append(DocumentSource(source_type='person', person=Person(name='Sue Bloggs')))
+        doc2 = Document.query.get(self.fx.DocumentData.simple2.id)
+        doc2.sources.append(DocumentSource(source_type='person', person=Person.query.filter(Person.name == 'Joe Bloggs').first()))
+        db.session.commit()
+
+        with patch('dexter.models.rollups.ENABLED', True):
+            refresh_stale()
+
+    def tearDown(self):
+        self.db.session.remove()
+
+        self.fx.teardown()
+        self.db.drop_all()
+
+    def feed(self, f, *args, **kwargs):
+        with app.test_request_context('/?country=%s' % self.country.code):
+            cells = f(self.start_date, self.end_date, *args, **kwargs)['cells']
+        return sorted(tuple(sorted(c.items())) for c in cells)
+
+    def view_query(self, sql):
+        rows = db.session.execute(text(sql), {
+            'start': self.start_date,
+            'end': self.end_date,
+            'country': self.country.name,
+        })
+        return sorted(tuple(sorted(r.items())) for r in rows)
+
+    def test_stale_days_refreshed(self):
+        self.assertEqual(0, StaleDay.query.count())
+
+        doc = Document.query.get(self.fx.DocumentData.simple.id)
+        doc.published_at = datetime.datetime(2012, 2, 2)
+        db.session.commit()
+
+        self.assertEqual(set([(datetime.date(2012, 1, 1), 1), (datetime.date(2012, 2, 2), 1)]),
+                         set((s.date, s.country_id) for s in StaleDay.query.all()))
+
+        with patch('dexter.models.rollups.ENABLED', True):
+            refresh_stale()
+        self.assertEqual(0, StaleDay.query.count())
+
+    def test_origins_feed(self):
+        feed = self.feed(get_origins_feed)
+        self.assertEqual(2, sum(dict(c)['record_count'] for c in feed))
+
+        self.assertEqual(self.view_query("""
+            select cast(count(document_id) as signed) as record_count, origin, medium_group, medium_type
+            from documents_view
+            where published_at >= :start and published_at <= :end and country = :country
+            group by origin, medium_group, medium_type
+            """), feed)
+
+    def test_sources_feed(self):
+        feed = self.feed(get_sources_feed, ['source_name', 'medium_group'])
+        self.assertEqual([('Joe Bloggs', 2)], [(dict(c)['source_name'], dict(c)['record_count']) for c in feed])
+
+        self.assertEqual(self.view_query("""
+            select cast(count(sv.document_id) as signed) as record_count, sv.source_name, dv.medium_group
+            from document_sources_view sv
+              inner join documents_view dv on dv.document_id = sv.document_id
+            where dv.published_at >= :start and dv.published_at <= :end and dv.country = :country
+            group by sv.source_name, dv.medium_group
+            having count(sv.document_id) > 1
+            """), feed)
@@ -0,0 +1,82 @@
+import unittest
+import datetime
+
+import numpy
+
+from dexter.models import DocumentFeatures, db
+from dexter.models.seeds import seed_db
+from dexter.analysis.similarity import IndexPart, SimilarityIndex
+
+from tests.fixtures import dbfixture, DocumentData
+
+
+class TestIndexPart(unittest.TestCase):
+    def row(self, doc_id, day, medium_id, features):
+        ids = sorted(features)
+        vector = DocumentFeatures.pack(ids, [features[i] for i in ids])
+        return (doc_id, datetime.date(2016, 1, day), 1, medium_id, vector, datetime.datetime(2016, 1, day))
+
+    def setUp(self):
+        self.part = IndexPart([
+            self.row(1, 1, 1, {1: 2.0, 2: 1.0, 3: 1.0}),
+            self.row(2, 2, 1, {1: 2.0, 2: 1.0}),
+            self.row(3, 3, 2, {2: 1.0, 4: 3.0}),
+            self.row(4, 4, 2, {5: 1.0}),
+        ])
+
+    def query(self, features):
+        ids = numpy.array(sorted(features))
+        weights = self.part.tfidf(ids, numpy.array([features[i] for i in ids]))
+        return self.part.scores(ids, weights)
+
+    def test_scores(self):
+        scores = self.query({1: 2.0, 2: 1.0, 3: 1.0})
+
+        # identical to itself
+        self.assertAlmostEqual(1.0, scores[0])
+        # most like the document sharing the most features
+        self.assertEqual([0, 1, 2, 3], numpy.argsort(-scores, kind='mergesort').tolist())
+        self.assertEqual(0.0, scores[3])
+
+    def test_unknown_features(self):
+        scores = self.query({100: 1.0})
+        self.assertEqual([0.0] * 4, scores.tolist())
+
+    def test_filter(self):
+        self.assertEqual([False, True, True, False],
+                         self.part.filter(start_date=datetime.date(2016, 1, 2), end_date=datetime.date(2016, 1, 3)).tolist())
+        self.assertEqual([False, False, True, True], self.part.filter(medium_ids=[2]).tolist())
+        self.assertEqual([False] * 4, self.part.filter(country_id=2).tolist())
+
+
+class TestSimilarityIndex(unittest.TestCase):
+    def setUp(self):
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+        seed_db(db)
+
+        self.fx = dbfixture.data(DocumentData)
+        self.fx.setup()
+        DocumentFeatures.query.delete()
+
+    def tearDown(self):
+        self.db.session.remove()
+        self.fx.teardown()
+        self.db.drop_all()
+
+    def add_vector(self, doc_id, updated_at):
+        db.session.add(DocumentFeatures(doc_id=doc_id, vector=DocumentFeatures.pack([1], [1.0]), updated_at=updated_at))
+        db.session.commit()
+
+    def test_refresh_late_commits(self):
+        self.add_vector(self.fx.DocumentData.simple.id, datetime.datetime(2016, 1, 1, 12, 0))
+
+        index = SimilarityIndex()
+        index.build()
+        self.assertEqual(1, index.main.n_docs)
+
+        # written before the index was updated, but committed after
+        self.add_vector(self.fx.DocumentData.simple2.id, datetime.datetime(2016, 1, 1, 11, 59))
+        index.refresh()
+        self.assertEqual([self.fx.DocumentData.simple2.id], index.recent.doc_ids.tolist())
@@ -5,6 +5,7 @@ from mock import MagicMock
 
 from dexter.models import Person
 from dexter.analysis import SourceAnalyser
+from dexter.analysis.base import DailyCounts
 
 
 class TestSourceAnalyser(unittest.TestCase):
@@ -23,11 +24,14 @@ class TestSourceAnalyser(unittest.TestCase):
             1: 10,
             2: 4,
         })
-        self.sa.source_frequencies = MagicMock(return_value={
-            1: [0, 0, 0, 1, 2],
-            2: [1, 2, 3, 0, 0],
-            3: [0, 0, 9, 0, 0],
-        })
+        # (person_id, day, count) rows, as source_frequencies queries them
+        freqs = DailyCounts([1, 2, 3], self.sa.days+1)
+        freqs.add([
+            (1, 3, 1), (1, 4, 2),
+            (2, 0, 1), (2, 1, 2), (2, 2, 3),
+            (3, 2, 9),
+        ])
+        self.sa.source_frequencies = MagicMock(return_value=freqs)
         self.sa.analyse()
 
         self.assertEqual(self.sa.analysed_people[1].source_counts, [0, 0, 0, 100.0, 100.0])
@@ -42,3 +46,27 @@ class TestSourceAnalyser(unittest.TestCase):
 
         self.assertEqual([s.person.id for s in self.sa.people_trending_up], [1])
         self.assertEqual([s.person.id for s in self.sa.people_trending_down], [2])
+
+    def utterance(self, quote, medium):
+        u = MagicMock()
+        u.quote = quote
+        u.document.medium = medium
+        return u
+
+    def test_group_utterances(self):
+        quote = u"We will build a million new houses for the poor by the end of next year, the President said."
+        utterances = [
+            self.utterance(quote, 'Star'),
+            # exact, ignoring case and punctuation
+            self.utterance(quote.upper().replace(',', ''), 'Beeld'),
+            # reworded
+            self.utterance(quote.replace('million', 'million more'), 'Sowetan'),
+            self.utterance(u"Crime is down in all provinces.", 'Star'),
+        ]
+
+        grouped = SourceAnalyser.group_utterances(utterances)
+
+        self.assertEqual(2, len(grouped))
+        self.assertEqual(3, grouped[0].count)
+        self.assertEqual(['Star', 'Beeld', 'Sowetan'], [u.document.medium for u in grouped[0].utterances])
+        self.assertEqual(1, grouped[1].count)
@@ -0,0 +1,88 @@
+import unittest
+import datetime
+import json
+
+from dexter.models import Document, Entity, DocumentEntity, TopicModel, DocumentTopic, db
+from dexter.models.seeds import seed_db
+from dexter.analysis import TopicAnalyser
+
+from tests.fixtures import dbfixture, EntityData, DocumentData
+
+
+class TestTopicAnalyser(unittest.TestCase):
+    def setUp(self):
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+        seed_db(db)
+
+        self.fx = dbfixture.data(DocumentData, EntityData)
+        self.fx.setup()
+
+    def tearDown(self):
+        self.db.session.rollback()
+        self.fx.teardown()
+        self.db.session.remove()
+        self.db.drop_all()
+
+    def mention(self, doc_id, entity_id, count):
+        de = DocumentEntity()
+        de.document = Document.query.get(doc_id)
+        de.entity = Entity.query.get(entity_id)
+        de.relevance = 1.0
+        de.count = count
+        self.db.session.add(de)
+
+    def test_entity_matrix(self):
+        simple = self.fx.DocumentData.simple.id
+        simple2 = self.fx.DocumentData.simple2.id
+        zuma = self.fx.EntityData.zuma.id
+        sue = self.fx.EntityData.sue_no_gender.id
+
+        self.mention(simple, zuma, 3)
+        self.mention(simple, sue, 0)
+        self.mention(simple2, zuma, 1)
+        # stores the feature vectors
+        self.db.session.commit()
+
+        ta = TopicAnalyser(doc_ids=[simple2, simple])
+        doc_ids, entity_ids, matrix = ta.entity_matrix()
+
+        self.assertEqual(sorted([simple, simple2]), doc_ids.tolist())
+        self.assertEqual(sorted([zuma, sue]), entity_ids.tolist())
+        self.assertEqual('i', matrix.dtype.kind)
+
+        counts = dict(((doc_ids[d], entity_ids[e]), matrix[d, e])
+                      for d, e in zip(*matrix.nonzero()))
+        # a zero count is counted once
+        self.assertEqual({
+            (simple, zuma): 3,
+            (simple, sue): 1,
+            (simple2, zuma): 1,
+        }, counts)
+
+    def test_clustering_params(self):
+        self.assertEqual('lda', TopicAnalyser.clustering_params()['model'])
+        self.assertIn(TopicAnalyser.clustering_model(), TopicAnalyser.TOPIC_MODELS)
+
+    def test_find_stored_topics(self):
+        simple = self.fx.DocumentData.simple.id
+        simple2 = self.fx.DocumentData.simple2.id
+        zuma = self.fx.EntityData.zuma.id
+
+        topic_model = TopicModel(n_topics=4, n_documents=2, trained_until=datetime.datetime.utcnow())
+        topic_model.features = json.dumps([[], [], [], [[zuma, 0.5]]])
+        self.db.session.add(topic_model)
+        self.db.session.flush()
+
+        for doc_id, topic, weight in [(simple, 3, 0.9), (simple, 1, 0.1), (simple2, 3, 0.8), (simple2, 2, 0.2)]:
+            self.db.session.add(DocumentTopic(doc_id=doc_id, topic_model_id=topic_model.id, topic=topic, weight=weight))
+        self.db.session.flush()
+
+        ta = TopicAnalyser(doc_ids=[simple, simple2])
+        ta.find_stored_topics()
+
+        self.assertEqual(1, len(ta.clustered_topics))
+        cluster = ta.clustered_topics[0]
+        self.assertEqual([simple, simple2], [d.id for d in cluster.documents])
+        self.assertEqual([('person-Jacob Zuma', 0.5)], cluster.features)
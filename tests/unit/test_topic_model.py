@@ -0,0 +1,54 @@
+import unittest
+
+import numpy
+from scipy.sparse import csr_matrix
+
+from dexter.analysis.topic_model import OnlineLDA
+
+
+class TestOnlineLDA(unittest.TestCase):
+    def setUp(self):
+        # two clear topics: entities 10 to 14, and 20 to 24
+        random = numpy.random.RandomState(0)
+        self.ids = numpy.array([10, 11, 12, 13, 14, 20, 21, 22, 23, 24])
+        self.docs = numpy.zeros((200, 10), dtype=int)
+        self.docs[::2, 0:5] = random.poisson(3, (100, 5))
+        self.docs[1::2, 5:10] = random.poisson(3, (100, 5))
+
+    def fit(self):
+        lda = OnlineLDA(n_topics=2)
+        for epoch in xrange(2):
+            for i in xrange(0, 200, 50):
+                lda.partial_fit(csr_matrix(self.docs[i:i + 50]), self.ids, 200)
+        return lda
+
+    def test_finds_topics(self):
+        lda = self.fit()
+        self.assertEqual(self.ids.tolist(), lda.vocab.tolist())
+
+        # each topic is about one block of entities
+        components = lda.components_
+        blocks = sorted(components[:, 0:5].sum(axis=1) > 0.5)
+        self.assertEqual([False, True], blocks)
+
+        weights = lda.transform(csr_matrix([[3, 3, 3, 0, 0, 0, 0, 0, 0, 0, 5],
+                                            [0, 0, 0, 0, 0, 4, 4, 4, 0, 0, 0]]),
+                                numpy.append(self.ids, 99))
+        self.assertNotEqual(weights[0].argmax(), weights[1].argmax())
+        self.assertGreater(weights.max(axis=1).min(), 0.9)
+
+    def test_vocab_grows(self):
+        lda = self.fit()
+        lda.partial_fit(csr_matrix([[2, 2]]), numpy.array([5, 30]), 200)
+
+        self.assertEqual([5, 10, 11, 12, 13, 14, 20, 21, 22, 23, 24, 30], lda.vocab.tolist())
+        self.assertEqual((2, 12), lda.lambda_.shape)
+
+    def test_dumps_and_loads(self):
+        lda = self.fit()
+        loaded = OnlineLDA.loads(lda.dumps())
+
+        self.assertEqual(lda.n_topics, loaded.n_topics)
+        self.assertEqual(lda.updates, loaded.updates)
+        self.assertEqual(lda.vocab.tolist(), loaded.vocab.tolist())
+        numpy.testing.assert_array_equal(lda.lambda_, loaded.lambda_)
@@ -0,0 +1,88 @@
+import unittest
+
+from mock import MagicMock, call
+
+from dexter.models import Document, DocumentSet, db
+from dexter.models.seeds import seed_db
+from dexter.analysis.xlsx_export import XLSXExportBuilder, QueryResult, stream_rows
+
+from tests.fixtures import dbfixture, DocumentData
+
+
+class TestXLSXExport(unittest.TestCase):
+    def setUp(self):
+        self.db = db
+        self.db.drop_all()
+        self.db.create_all()
+        seed_db(db)
+
+        self.fx = dbfixture.data(DocumentData)
+        self.fx.setup()
+
+        self.simple = self.fx.DocumentData.simple.id
+        self.simple2 = self.fx.DocumentData.simple2.id
+
+        form = MagicMock()
+        form.document_set.return_value = DocumentSet(db.session.query(Document.id))
+        self.builder = XLSXExportBuilder(form)
+        self.builder.formats['bold'] = 'bold'
+
+    def tearDown(self):
+        self.db.session.remove()
+
+        self.fx.teardown()
+        self.db.drop_all()
+
+    def test_stream_rows(self):
+        query = db.session.query(Document.id, Document.title).order_by(Document.id)
+        rows = [tuple(r) for r in stream_rows(query, batch_size=1)]
+
+        self.assertEqual([(self.simple, 'Title'), (self.simple2, 'Another title')], rows)
+
+    def test_stream_rows_materialised(self):
+        with self.builder.docs.materialise():
+            query = self.builder.filter(db.session.query(Document.id)).order_by(Document.id)
+            self.assertEqual([self.simple, self.simple2], [r[0] for r in stream_rows(query)])
+
+    def test_query_result(self):
+        result = QueryResult(db.session.query(Document.id, Document.title.label('headline')).order_by(Document.id))
+        self.assertEqual(['id', 'headline'], result.keys)
+
+        result.fetch()
+        self.assertEqual(2, result.count)
+        self.assertEqual([(self.simple, 'Title'), (self.simple2, 'Another title')], result.all())
+
+    def test_gather(self):
+        with self.builder.docs.materialise():
+            results = [QueryResult(self.builder.filter(db.session.query(Document.id)).order_by(Document.id))
+                       for i in xrange(3)]
+            progress = MagicMock()
+            self.builder.gather(results, progress)
+
+            for result in results:
+                self.assertEqual([(self.simple,), (self.simple2,)], result.all())
+            self.assertEqual([call(1), call(2), call(3)], progress.call_args_list)
+
+    def test_write_table_query(self):
+        ws = MagicMock()
+        result = QueryResult(db.session.query(Document.id, Document.title.label('headline')).order_by(Document.id))
+        result.fetch()
+
+        self.assertEqual(3, self.builder.write_table(ws, result, rownum=0))
+        self.assertEqual([
+            call(0, 0, ['id', 'headline'], 'bold'),
+            call(1, 0, [self.simple, 'Title']),
+            call(2, 0, [self.simple2, 'Another title']),
+        ], ws.write_row.call_args_list)
+        ws.autofilter.assert_called_once_with(0, 0, 2, 1)
+
+    def test_write_table_list(self):
+        ws = MagicMock()
+
+        self.assertEqual(2, self.builder.write_table(ws, [['a', 1]], keys=['', 'count'], rownum=5))
+        self.assertEqual([
+            call(5, 0, ['', 'count'], 'bold'),
+            call(6, 0, ['a', 1]),
+        ], ws.write_row.call_args_list)
+        # only the first table on a worksheet is filtered
+        self.assertFalse(ws.autofilter.called)